@@ -0,0 +1,258 @@
+"""
+Self-tuning Kafka producer with backpressure, and its metrics endpoint.
+
+payments.py used to hardcode linger.ms=10 and call produce() bare: once
+librdkafka's local queue filled up, produce() raised BufferError and the
+worker died, and poll(0) once per batch never gave delivery reports enough
+time to drain the queue. AdaptiveProducer wraps confluent_kafka.Producer:
+
+- produce() never drops: on BufferError it serves delivery reports with
+  short poll() calls until the queue has room, and counts how often and
+  how long it was blocked. Blocking is the backpressure -- the stream
+  loop's TokenBucket then catches up within its burst allowance.
+- batching is sized from backpressure. The producer starts in the
+  PRODUCER_TIERS row for the expected rate. Every RETUNE_SECONDS it steps
+  up a tier if produce() had to wait for queue space or stats_cb saw the
+  local queue over QUEUE_HIGH_WATER. It steps down once the queue has
+  stayed nearly empty at a rate the lower tier covers. (The achieved rate
+  alone can't drive a step up: the caller's TokenBucket caps it at the
+  target.) librdkafka can't change linger.ms, batch.num.messages or
+  compression on a live handle, so moving to another tier flushes the
+  current producer and opens a new one. That happens in maybe_retune(),
+  which the produce loop calls between batches, never inside poll(), and
+  only once everything in flight is delivered, which keeps per-key order
+  intact.
+- librdkafka's statistics (stats_cb) -- queue depth, broker RTT, batch
+  sizes -- go into a MetricsBoard row. The parent process serves every
+  worker's row in Prometheus text format over HTTP.
+"""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from confluent_kafka import Producer
+
+# (up to msgs/sec, linger.ms, batch.num.messages, compression.type, queue.buffering.max.messages)
+# Low rates favour latency, and compressing tiny batches only costs CPU.
+# Higher rates wait a little longer to fill large, compressed batches.
+PRODUCER_TIERS = (
+    (1_000, 5, 1_000, "none", 100_000),
+    (10_000, 20, 10_000, "lz4", 200_000),
+    (float("inf"), 50, 100_000, "lz4", 1_000_000),
+)
+RETUNE_SECONDS = 60.0
+# Step up once the local queue was this full in any stats report of the window;
+# step down only if it never got past QUEUE_LOW_WATER.
+QUEUE_HIGH_WATER = 0.5
+QUEUE_LOW_WATER = 0.05
+# Only step down a tier once the rate is well inside it, so a rate hovering
+# at a boundary doesn't rebuild the producer every RETUNE_SECONDS.
+RETUNE_DOWN_MARGIN = 0.8
+# Longest a retune waits for in-flight messages before giving up on it
+RETUNE_FLUSH_SECONDS = 10.0
+STATS_INTERVAL_MS = 5000
+BACKPRESSURE_POLL_SECONDS = 0.05
+BACKPRESSURE_WARN_SECONDS = 30.0
+
+METRIC_NAMES = (
+    "queue_messages",
+    "queue_bytes",
+    "rtt_avg_ms",
+    "rtt_p99_ms",
+    "batch_size_avg_bytes",
+    "batch_messages_avg",
+    "backpressure_waits_total",
+    "backpressure_seconds_total",
+    "linger_ms",
+    "retunes_total",
+)
+
+
+def tier_for(rate):
+    for tier in PRODUCER_TIERS:
+        if rate <= tier[0]:
+            return tier
+    return PRODUCER_TIERS[-1]
+
+
+class WorkerGauges:
+    """One worker's row of a MetricsBoard."""
+
+    def __init__(self, values, offset):
+        self._values = values
+        self._offset = offset
+
+    def set(self, name, value):
+        self._values[self._offset + METRIC_NAMES.index(name)] = value
+
+    def add(self, name, amount):
+        self._values[self._offset + METRIC_NAMES.index(name)] += amount
+
+
+class MetricsBoard:
+    """
+    Producer gauges for every worker process in one shared-memory array.
+    Each worker writes only its own row, and the parent renders them all.
+    """
+
+    def __init__(self, ctx, num_workers):
+        self.num_workers = num_workers
+        self.values = ctx.Array('d', num_workers * len(METRIC_NAMES), lock=False)
+
+    def row(self, worker_id):
+        return WorkerGauges(self.values, worker_id * len(METRIC_NAMES))
+
+    def render(self, extra=()):
+        """Prometheus text format; extra is [(name, type, {worker_id: value})] for caller-owned series."""
+        lines = []
+        for index, name in enumerate(METRIC_NAMES):
+            lines.append(f"# TYPE payments_producer_{name} {'counter' if name.endswith('_total') else 'gauge'}")
+            for worker_id in range(self.num_workers):
+                value = self.values[worker_id * len(METRIC_NAMES) + index]
+                lines.append(f'payments_producer_{name}{{worker="{worker_id}"}} {value:g}')
+        for name, kind, per_worker in extra:
+            lines.append(f"# TYPE {name} {kind}")
+            for worker_id, value in per_worker.items():
+                lines.append(f'{name}{{worker="{worker_id}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, extra=lambda: ()):
+        """Serves render() at http://0.0.0.0:<port>/metrics from a daemon thread."""
+        board = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = board.render(extra()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Serving producer metrics on :{port}/metrics")
+        return server
+
+
+class AdaptiveProducer:
+    def __init__(self, base_config, expected_rate, gauges=None):
+        self.base_config = dict(base_config)
+        self.gauges = gauges
+        self.tier = tier_for(expected_rate)
+        self.produced = 0
+        self._window_start = time.monotonic()
+        self._window_produced = 0
+        self._window_waits = 0          # produce() calls that hit a full queue
+        self._window_peak_fill = 0.0    # highest queue fill seen by stats_cb
+        self.producer = self._create()
+
+    def _create(self):
+        _max_rate, linger_ms, batch_messages, compression, queue_messages = self.tier
+        config = dict(self.base_config)
+        config.update({
+            "linger.ms": linger_ms,
+            "batch.num.messages": batch_messages,
+            "compression.type": compression,
+            "queue.buffering.max.messages": queue_messages,
+            "statistics.interval.ms": STATS_INTERVAL_MS,
+            "stats_cb": self._on_stats,
+        })
+        if self.gauges is not None:
+            self.gauges.set("linger_ms", linger_ms)
+        return Producer(config)
+
+    def produce(self, topic, key=None, value=None, **kwargs):
+        """Producer.produce that waits for queue space instead of raising BufferError."""
+        try:
+            self.producer.produce(topic=topic, key=key, value=value, **kwargs)
+        except BufferError:
+            self._produce_with_backpressure(topic, key, value, kwargs)
+        self.produced += 1
+
+    def _produce_with_backpressure(self, topic, key, value, kwargs):
+        started = time.monotonic()
+        warned = False
+        while True:
+            self.producer.poll(BACKPRESSURE_POLL_SECONDS)
+            try:
+                self.producer.produce(topic=topic, key=key, value=value, **kwargs)
+                break
+            except BufferError:
+                if not warned and time.monotonic() - started > BACKPRESSURE_WARN_SECONDS:
+                    print(f"[Producer] Local queue still full after {BACKPRESSURE_WARN_SECONDS:.0f}s; "
+                          "is the cluster reachable?")
+                    warned = True
+        self._window_waits += 1
+        if self.gauges is not None:
+            self.gauges.add("backpressure_waits_total", 1)
+            self.gauges.add("backpressure_seconds_total", time.monotonic() - started)
+
+    def poll(self, timeout=0):
+        return self.producer.poll(timeout)
+
+    def flush(self, timeout=None):
+        return self.producer.flush() if timeout is None else self.producer.flush(timeout)
+
+    def maybe_retune(self):
+        """
+        Moves to the next tier up or down if the last RETUNE_SECONDS call for it
+        (see the module docstring). Blocks for up to RETUNE_FLUSH_SECONDS while
+        it does, so call it between batches, not from a wait.
+        """
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < RETUNE_SECONDS:
+            return
+        rate = (self.produced - self._window_produced) / elapsed
+        waits, peak_fill = self._window_waits, self._window_peak_fill
+        self._window_start, self._window_produced = now, self.produced
+        self._window_waits, self._window_peak_fill = 0, 0.0
+
+        index = PRODUCER_TIERS.index(self.tier)
+        if (waits or peak_fill > QUEUE_HIGH_WATER) and index + 1 < len(PRODUCER_TIERS):
+            tier = PRODUCER_TIERS[index + 1]
+            reason = f"Backpressure ({waits} blocked produce calls, queue peaked at {peak_fill:.0%} full)"
+        elif (index > 0 and not waits and peak_fill < QUEUE_LOW_WATER
+              and rate < RETUNE_DOWN_MARGIN * PRODUCER_TIERS[index - 1][0]):
+            tier = PRODUCER_TIERS[index - 1]
+            reason = f"Queue idle at {rate:,.0f} msgs/s"
+        else:
+            return
+        remaining = self.producer.flush(RETUNE_FLUSH_SECONDS)
+        if remaining:
+            print(f"[Producer] {reason}, but {remaining} messages are still undelivered; not retuning.")
+            return
+        print(f"[Producer] {reason}; retuning to linger.ms={tier[1]}, "
+              f"batch.num.messages={tier[2]}, compression={tier[3]}.")
+        self.tier = tier
+        self.producer = self._create()
+        if self.gauges is not None:
+            self.gauges.add("retunes_total", 1)
+
+    def _on_stats(self, stats_json):
+        stats = json.loads(stats_json)
+        self._window_peak_fill = max(self._window_peak_fill, stats.get("msg_cnt", 0) / self.tier[4])
+        if self.gauges is None:
+            return
+        gauges = self.gauges
+        gauges.set("queue_messages", stats.get("msg_cnt", 0))
+        gauges.set("queue_bytes", stats.get("msg_size", 0))
+
+        # Broker RTTs are in microseconds; bootstrap placeholders (nodeid -1) have none.
+        rtts = [b["rtt"] for b in stats.get("brokers", {}).values()
+                if b.get("nodeid", -1) >= 0 and b.get("rtt", {}).get("cnt")]
+        if rtts:
+            gauges.set("rtt_avg_ms", sum(r["avg"] for r in rtts) / len(rtts) / 1000.0)
+            gauges.set("rtt_p99_ms", max(r["p99"] for r in rtts) / 1000.0)
+        batches = [t for t in stats.get("topics", {}).values() if t.get("batchcnt", {}).get("cnt")]
+        if batches:
+            gauges.set("batch_size_avg_bytes", sum(t["batchsize"]["avg"] for t in batches) / len(batches))
+            gauges.set("batch_messages_avg", sum(t["batchcnt"]["avg"] for t in batches) / len(batches))
@@ -0,0 +1,385 @@
+"""
+Time-compressed historical backfill for the payments generator.
+
+payments.py stamps every event with the wall clock, so a month of history
+takes a month to produce. This mode generates the same events -- same user
+pool, same fraud scenarios and ground-truth labels -- over a historical
+range on a virtual clock, as fast as the CPUs allow:
+
+- volume follows a diurnal curve (HOURLY_PROFILE, interpolated between UTC
+  hours) times a weekly one (WEEKLY_PROFILE). The requested total is split
+  over one-minute chunks in proportion to the curve, and each chunk's events
+  get sorted random millisecond timestamps inside it. Scenario steps fall
+  due on that virtual clock, so bursts and takeovers keep their shape.
+- workers are forked like the live generator's. Each owns a payer slice of
+  the pool and walks the whole range forward in time, so every user_id is
+  written by exactly one worker with strictly ordered timestamps, in a file
+  or on a Kafka partition.
+- sinks: partitioned Avro files (fastavro), partitioned Parquet files
+  (pyarrow, optional), or Kafka (Confluent-framed Avro via PaymentEncoder,
+  keyed by user_id). Files land in <output>/date=YYYY-MM-DD[/hour=HH]/ as
+  part-<worker>.<ext>, with labels in <output>/fraud_labels/.
+
+The pool is rebuilt in memory from the identity pools, so user_0001..N match
+the profiles the live generator seeds in Postgres; nothing is written there.
+
+    python backfill.py --start 2026-09-01 --end 2026-10-01 --events 100000000
+"""
+import os
+import time
+import random
+import argparse
+import configparser
+import multiprocessing
+from datetime import datetime, timezone
+
+import numpy as np
+from fastavro.write import Writer
+
+from fraud_scenarios import FraudScenarioEngine, LabelSink
+from payment_encoder import PARSED_SCHEMA, PaymentEncoder
+from payments import REGIONS, USER_POOL, ensure_kafka_topic, load_user_pool, payment_record
+
+# Relative volume per UTC hour of day (00:00 .. 23:00): quiet overnight, a
+# late-morning plateau and an evening peak.
+HOURLY_PROFILE = (
+    0.35, 0.25, 0.18, 0.15, 0.15, 0.20, 0.35, 0.60, 0.85, 1.00, 1.10, 1.20,
+    1.30, 1.25, 1.15, 1.10, 1.15, 1.25, 1.40, 1.50, 1.40, 1.15, 0.85, 0.55,
+)
+# Relative volume per weekday, Monday .. Sunday.
+WEEKLY_PROFILE = (0.95, 0.95, 1.00, 1.00, 1.15, 1.20, 0.80)
+
+CHUNK_SECONDS = 60
+PARTITION_FORMATS = {"day": "date=%Y-%m-%d", "hour": "date=%Y-%m-%d/hour=%H"}
+PARQUET_ROW_GROUP_ROWS = 250_000
+REPORT_SECONDS = 5
+
+
+def volume_curve(start_s, end_s, hourly=HOURLY_PROFILE, weekly=WEEKLY_PROFILE):
+    """(chunk start times in epoch seconds, relative volume of each chunk) over [start_s, end_s)."""
+    starts = np.arange(start_s, end_s, CHUNK_SECONDS, dtype=np.int64)
+    mid = starts + CHUNK_SECONDS / 2
+    hour_of_day = (mid % 86400) / 3600
+    # Linear between hour marks, wrapping 23:00 back round to 00:00.
+    by_hour = np.interp(hour_of_day, np.arange(25), list(hourly) + [hourly[0]])
+    weekday = (starts // 86400 + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+    return starts, by_hour * np.asarray(weekly)[weekday]
+
+
+def split_counts(weights, total):
+    """Integer counts proportional to weights that sum to exactly total (cumulative rounding)."""
+    edges = np.floor(np.cumsum(weights) / weights.sum() * total + 0.5).astype(np.int64)
+    return np.diff(edges, prepend=0)
+
+
+class BackfillClock:
+    """Stands in for payment_record with the timestamp taken from the virtual clock."""
+
+    def __init__(self):
+        self.ms = 0
+
+    def payment(self, *args, **kwargs):
+        record = payment_record(*args, **kwargs)
+        record["timestamp"] = self.ms
+        return record
+
+
+# --- sinks ----------------------------------------------------------------
+
+class AvroFileSink:
+    def __init__(self, root, worker_id, codec, sync_marker=b""):
+        self.root = root
+        self.name = f"part-{worker_id:03d}.avro"
+        self.codec = codec or "null"
+        self.sync_marker = sync_marker  # fastavro draws a random one if empty
+        self._file = self._writer = None
+
+    def roll(self, partition):
+        self.close()
+        directory = os.path.join(self.root, partition)
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(os.path.join(directory, self.name), "wb")
+        self._writer = Writer(self._file, PARSED_SCHEMA, codec=self.codec, sync_marker=self.sync_marker)
+
+    def write(self, payments):
+        write = self._writer.write
+        for payment in payments:
+            write(payment)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.flush()
+            self._file.close()
+            self._file = self._writer = None
+
+
+def _arrow_type(pa, avro_type):
+    kind = avro_type["type"] if isinstance(avro_type, dict) else avro_type
+    if kind == "record":
+        return pa.struct([(f["name"], _arrow_type(pa, f["type"])) for f in avro_type["fields"]])
+    return {"string": pa.string(), "double": pa.float64(), "float": pa.float32(),
+            "long": pa.int64(), "int": pa.int32(), "boolean": pa.bool_()}[kind]
+
+
+class ParquetFileSink:
+    def __init__(self, root, worker_id, codec):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("--sink parquet needs pyarrow (pip install pyarrow).")
+        self.pa, self.pq = pa, pq
+        self.schema = pa.schema(list(_arrow_type(pa, PARSED_SCHEMA)))
+        self.root = root
+        self.name = f"part-{worker_id:03d}.parquet"
+        self.codec = codec or "snappy"
+        self._path = self._writer = None
+        self._rows = []
+
+    def roll(self, partition):
+        self.close()
+        directory = os.path.join(self.root, partition)
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, self.name)
+
+    def write(self, payments):
+        self._rows.extend(payments)
+        if len(self._rows) >= PARQUET_ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        if self._writer is None:
+            self._writer = self.pq.ParquetWriter(self._path, self.schema, compression=self.codec)
+        self._writer.write_table(self.pa.Table.from_pylist(self._rows, schema=self.schema))
+        self._rows = []
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class KafkaSink:
+    """
+    Keyed by user_id, so each user's events share a partition; with one
+    idempotent producer per worker and each user in one worker, they land
+    there in timestamp order. The AdaptiveProducer blocks on a full queue,
+    which paces the worker to what the cluster accepts. The Kafka message timestamp is left at produce
+    time -- stamping history into it would let retention delete it at once.
+    """
+
+    def __init__(self, producer, encoder, topic):
+        self.producer = producer
+        self.encoder = encoder
+        self.topic = topic
+
+    def roll(self, partition):
+        pass
+
+    def write(self, payments):
+        produce, topic = self.producer.produce, self.topic
+        for payment, value in zip(payments, self.encoder.encode_batch(payments)):
+            produce(topic=topic, key=payment["user_id"], value=value)
+        self.producer.poll(0)
+        self.producer.maybe_retune()
+
+    def close(self):
+        self.producer.flush()
+
+
+# --- workers --------------------------------------------------------------
+
+def backfill_worker(worker_id, num_workers, options, produced_counts):
+    """
+    Generates this worker's share of every chunk for the payer slice [lo, hi)
+    of the fork-inherited USER_POOL, oldest chunk first.
+    """
+    seed = options["seed"]
+    random.seed(None if seed is None else seed * 1000 + worker_id)
+    ts_rng = np.random.default_rng(None if seed is None else (seed, worker_id))
+
+    user_pool = USER_POOL
+    lo = worker_id * len(user_pool) // num_workers
+    hi = (worker_id + 1) * len(user_pool) // num_workers
+    clock = BackfillClock()
+    engine = FraudScenarioEngine(user_pool, lo, hi, options["fraud_share"], clock.payment, REGIONS)
+
+    starts, weights = volume_curve(options["start"], options["end"], options["hourly"], options["weekly"])
+    total = options["events"]
+    counts = split_counts(weights, total * (worker_id + 1) // num_workers - total * worker_id // num_workers)
+
+    if options["sink"] == "kafka":
+        from confluent_kafka.schema_registry import SchemaRegistryClient
+        from adaptive_producer import AdaptiveProducer
+
+        # No rate limit here, so start in the high-throughput tier.
+        producer = AdaptiveProducer(options["producer_config"], float("inf"))
+        encoder = PaymentEncoder(SchemaRegistryClient(options["schema_registry_config"]), options["topic"])
+        sink = KafkaSink(producer, encoder, options["topic"])
+        labels = LabelSink(producer=producer, topic=options["label_topic"] if options["labels"] else None)
+    else:
+        if options["sink"] == "avro":
+            sink = AvroFileSink(options["output"], worker_id, options["codec"], sync_marker=ts_rng.bytes(16))
+        else:
+            sink = ParquetFileSink(options["output"], worker_id, options["codec"])
+        label_path = None
+        if options["labels"]:
+            label_dir = os.path.join(options["output"], "fraud_labels")
+            os.makedirs(label_dir, exist_ok=True)
+            label_path = os.path.join(label_dir, f"part-{worker_id:03d}.jsonl")
+        labels = LabelSink(path=label_path, mode="w")
+
+    partition_format = PARTITION_FORMATS[options["partition_by"]]
+    partition = None
+    chunk_ms = CHUNK_SECONDS * 1000
+    try:
+        for chunk_start, count in zip(starts.tolist(), counts.tolist()):
+            if count == 0:
+                continue
+            chunk_partition = time.strftime(partition_format, time.gmtime(chunk_start))
+            if chunk_partition != partition:
+                sink.roll(chunk_partition)
+                partition = chunk_partition
+
+            timestamps = np.sort(ts_rng.integers(0, chunk_ms, count)) + chunk_start * 1000
+            payments, chunk_labels = [], []
+            for ts in timestamps.tolist():
+                clock.ms = ts
+                payment, label = engine.next_batch(1, now=ts / 1000.0)[0]
+                payments.append(payment)
+                chunk_labels.append(label)
+            sink.write(payments)
+            labels.write(chunk_labels)
+            produced_counts[worker_id] += count
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        labels.close()
+
+
+def parse_time(value):
+    """ISO date or datetime, UTC unless it says otherwise, truncated to the minute."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) // CHUNK_SECONDS * CHUNK_SECONDS
+
+
+def parse_profile(value, length, name):
+    weights = tuple(float(w) for w in value.split(","))
+    if len(weights) != length or min(weights) < 0 or not any(weights):
+        raise argparse.ArgumentTypeError(f"{name} needs {length} non-negative weights, not all zero")
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate historical payments on a virtual clock.")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--start", required=True, help="Range start, ISO date/datetime (UTC by default)")
+    parser.add_argument("--end", required=True, help="Range end (exclusive)")
+    parser.add_argument("--events", type=int, required=True, help="Total payments to generate")
+    parser.add_argument("--sink", choices=["avro", "parquet", "kafka"], default="avro")
+    parser.add_argument("--output", default="backfill", help="Root directory for the avro/parquet sinks")
+    parser.add_argument("--partition-by", choices=sorted(PARTITION_FORMATS), default="day")
+    parser.add_argument("--codec", help="File compression (default: null for avro, snappy for parquet)")
+    parser.add_argument("--topic", help="Kafka sink topic (default: <topic.name>-backfill)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--users", type=int, help="Pool size (default: [simulation] user_pool_size)")
+    parser.add_argument("--hourly-profile", type=lambda v: parse_profile(v, 24, "--hourly-profile"),
+                        default=HOURLY_PROFILE, help="24 comma-separated weights, UTC 00:00..23:00")
+    parser.add_argument("--weekly-profile", type=lambda v: parse_profile(v, 7, "--weekly-profile"),
+                        default=WEEKLY_PROFILE, help="7 comma-separated weights, Monday..Sunday")
+    parser.add_argument("--seed", type=int,
+                        help="Makes the run reproducible: same events, ids, labels and (Avro) file bytes")
+    parser.add_argument("--no-labels", action="store_true", help="Skip the ground-truth fraud labels")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+
+    start, end = parse_time(args.start), parse_time(args.end)
+    if end <= start:
+        parser.error("--end must be at least a minute after --start")
+
+    users = args.users or config.getint('simulation', 'user_pool_size')
+    valid_percentage = config.getfloat('simulation', 'valid_transaction_percentage', fallback=95.0)
+
+    options = {
+        "start": start,
+        "end": end,
+        "events": args.events,
+        "hourly": args.hourly_profile,
+        "weekly": args.weekly_profile,
+        "fraud_share": 1.0 - valid_percentage / 100.0,
+        "sink": args.sink,
+        "output": args.output,
+        "partition_by": args.partition_by,
+        "codec": args.codec,
+        "labels": not args.no_labels,
+        "seed": args.seed,
+    }
+    if args.sink == "kafka":
+        producer_config = dict(config['kafka'])
+        topic_name = producer_config.pop('topic.name')
+        options["topic"] = args.topic or f"{topic_name}-backfill"
+        options["label_topic"] = f"{options['topic']}-fraud-labels"
+        ensure_kafka_topic(producer_config, options["topic"])
+        if options["labels"]:
+            ensure_kafka_topic(producer_config, options["label_topic"])
+        # Idempotence so retries can't reorder a partition; batching is AdaptiveProducer's.
+        producer_config["enable.idempotence"] = True
+        options["producer_config"] = producer_config
+        options["schema_registry_config"] = dict(config['schema_registry'])
+
+    print(f"Building a pool of {users:,} users in memory...")
+    load_user_pool(users, config)
+    num_workers = max(1, min(args.workers, len(USER_POOL)))
+
+    # fork, as in payments.py: workers inherit the pool instead of rebuilding it.
+    ctx = multiprocessing.get_context("fork")
+    produced_counts = ctx.Array('q', num_workers, lock=False)
+    workers = [
+        ctx.Process(target=backfill_worker, args=(i, num_workers, options, produced_counts), daemon=True)
+        for i in range(num_workers)
+    ]
+
+    span = datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc)
+    print(f"Backfilling {args.events:,} events from {span[0]:%Y-%m-%d %H:%M} to {span[1]:%Y-%m-%d %H:%M} UTC "
+          f"into {args.sink} across {num_workers} worker process(es)...")
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+
+    try:
+        next_report = started + REPORT_SECONDS
+        while True:
+            alive = [worker for worker in workers if worker.is_alive()]
+            if not alive:
+                break
+            # Returns as soon as that worker finishes, so the run ends with the last one
+            alive[0].join(timeout=max(0.0, next_report - time.monotonic()))
+            if time.monotonic() >= next_report:
+                next_report += REPORT_SECONDS
+                total = sum(produced_counts)
+                elapsed = time.monotonic() - started
+                print(f"[Backfill] {total:,} / {args.events:,} events ({total / max(args.events, 1):.0%}), "
+                      f"{total / elapsed:,.0f} events/s")
+    except KeyboardInterrupt:
+        print("\nStopping backfill...")
+    finally:
+        for worker in workers:
+            worker.join(timeout=60)
+
+    total = sum(produced_counts)
+    elapsed = time.monotonic() - started
+    print(f"Backfill finished: {total:,} events in {elapsed:.1f}s ({total / elapsed:,.0f} events/s).")
+    if any(worker.exitcode for worker in workers):
+        raise SystemExit("[ERROR] A backfill worker exited with an error.")
+
+
+if __name__ == "__main__":
+    main()
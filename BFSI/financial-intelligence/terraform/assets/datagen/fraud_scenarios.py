@@ -0,0 +1,292 @@
+"""
+Stateful fraud-scenario engine for the payments generator.
+
+Instead of one independent coin flip per event, fraud arrives as multi-event
+scenarios that unfold over seconds to minutes of real time, interleaved with
+ordinary traffic -- the shape detection pipelines actually have to catch:
+
+- VELOCITY_BURST: one user fires 8-20 payments a few seconds apart, at
+  amounts in line with their own recent history.
+- CARD_TESTING: 5-15 sub-$2 card payments from an unknown device to
+  scattered merchants, then one large charge once a card "works".
+- ACCOUNT_TAKEOVER: a new device in a foreign region sends one or two small
+  probes, then drains the account to a single mule account in 2-4 large
+  transfers (trips the impossible-travel, device-switch and amount-anomaly
+  alerts in the Flink pipeline).
+- MULE_RING: several victims pay into a mule, which layers the money along
+  a chain of 3-6 mule accounts, skimming a little at each hop.
+
+Each worker keeps the last RING_SIZE payment amounts of every user in its
+payer slice in one fixed-size ring array, so scenario amounts follow each
+user's own recent spend while memory stays flat.
+Every scenario event carries a ground-truth label -- scenario type, id and
+step -- which LabelSink writes to a side topic or a JSONL file for
+precision/recall benchmarking. Transactions without a label are legitimate.
+"""
+import heapq
+import itertools
+import json
+import random
+import time
+import uuid
+
+import numpy as np
+
+RING_SIZE = 8
+
+# Share of scenarios by type, and the mean number of events each produces --
+# used to turn the configured fraud share of *events* into a per-event start
+# probability.
+SCENARIO_WEIGHTS = {
+    "VELOCITY_BURST": 0.35,
+    "CARD_TESTING": 0.25,
+    "ACCOUNT_TAKEOVER": 0.25,
+    "MULE_RING": 0.15,
+}
+EXPECTED_EVENTS = {
+    "VELOCITY_BURST": 14.0,
+    "CARD_TESTING": 11.0,
+    "ACCOUNT_TAKEOVER": 4.5,
+    "MULE_RING": 7.0,
+}
+
+class UserHistory:
+    """Last RING_SIZE payment amounts per user in one fixed array."""
+
+    def __init__(self, num_users, size=RING_SIZE):
+        self.size = size
+        self.amounts = np.zeros((num_users, size), dtype=np.float32)
+        self.heads = np.zeros(num_users, dtype=np.int64)  # total payments recorded per user
+
+    def grow(self, num_users):
+        extra = num_users - len(self.heads)
+        if extra > 0:
+            self.amounts = np.vstack((self.amounts, np.zeros((extra, self.size), dtype=np.float32)))
+            self.heads = np.concatenate((self.heads, np.zeros(extra, dtype=np.int64)))
+
+    def record(self, i, amount):
+        self.amounts[i, self.heads[i] % self.size] = amount
+        self.heads[i] += 1
+
+    def recent_amounts(self, i):
+        return self.amounts[i, :min(self.heads[i], self.size)]
+
+
+class FraudScenarioEngine:
+    """
+    Produces the worker's event stream: due steps of running scenarios first,
+    then ordinary payments, occasionally starting a new scenario in place of
+    one. Payers (mules included) are drawn from [lo, hi); payees from the whole pool.
+    """
+
+    def __init__(self, user_pool, lo, hi, fraud_share, make_payment, regions, rng=random):
+        self.pool = user_pool
+        self.lo, self.hi = lo, hi
+        self.make_payment = make_payment
+        self.regions = regions
+        self.region_names = list(regions)
+        self.rng = rng
+        self.history = UserHistory(hi - lo)
+
+        # A mule ring needs at least one victim in the slice besides its mules.
+        kinds = [kind for kind in SCENARIO_WEIGHTS if kind != "MULE_RING" or hi - lo >= 2]
+        weights = [SCENARIO_WEIGHTS[k] for k in kinds]
+        mean_events = sum(SCENARIO_WEIGHTS[k] * EXPECTED_EVENTS[k] for k in kinds) / sum(weights)
+        self.start_probability = min(1.0, max(0.0, fraud_share) / mean_events)
+        self._kinds, self._weights = kinds, weights
+        self._scenarios = {
+            "VELOCITY_BURST": self._velocity_burst,
+            "CARD_TESTING": self._card_testing,
+            "ACCOUNT_TAKEOVER": self._account_takeover,
+            "MULE_RING": self._mule_ring,
+        }
+
+        self._pending = []  # heap of (due, seq, scenario_id, kind, step, generator, event)
+        self._seq = itertools.count()
+
+    def next_batch(self, count, now=None):
+        """Up to `count` events due now, as [(payment, label or None), ...]."""
+        now = time.time() if now is None else now
+        out = []
+        pending = self._pending
+        while len(out) < count and pending and pending[0][0] <= now:
+            _due, _seq, scenario_id, kind, step, steps, event = heapq.heappop(pending)
+            out.append(self._emit(event, kind, scenario_id, step))
+            self._schedule(now, scenario_id, kind, step + 1, steps)
+
+        rng = self.rng
+        while len(out) < count:
+            if rng.random() < self.start_probability:
+                kind = rng.choices(self._kinds, self._weights)[0]
+                scenario_id = f"{kind.lower()}-{rng.getrandbits(48):012x}"
+                steps = self._scenarios[kind]()
+                _delay, event = next(steps)
+                out.append(self._emit(event, kind, scenario_id, 0))
+                self._schedule(now, scenario_id, kind, 1, steps)
+            else:
+                out.append(self._emit(self._ordinary(), None, None, None))
+        return out
+
+    def extend(self, hi):
+        """Widens the payer slice to [lo, hi), for users appended to the pool."""
+        self.history.grow(hi - self.lo)
+        self.hi = hi
+
+    def active_scenarios(self):
+        return len(self._pending)
+
+    def _schedule(self, now, scenario_id, kind, step, steps):
+        step_event = next(steps, None)
+        if step_event is not None:
+            delay, event = step_event
+            heapq.heappush(self._pending, (now + delay, next(self._seq), scenario_id, kind, step, steps, event))
+
+    def _emit(self, event, kind, scenario_id, step):
+        payer_idx, payee_account, amount, location, device_id, method, category = event
+        payment = self.make_payment(
+            self.pool, payer_idx, payee_account, amount, location,
+            device_id=device_id, payment_method=method, category=category,
+        )
+        if self.lo <= payer_idx < self.hi:
+            self.history.record(payer_idx - self.lo, amount)
+        if kind is None:
+            return payment, None
+        return payment, {
+            "transaction_id": payment["transaction_id"],
+            "user_id": payment["user_id"],
+            "scenario": kind,
+            "scenario_id": scenario_id,
+            "step": step,
+            "timestamp": payment["timestamp"],
+        }
+
+    # --- building blocks -------------------------------------------------
+
+    def _payer(self):
+        return self.rng.randrange(self.lo, self.hi)
+
+    def _payee_account(self, payer_idx):
+        return self.rng.choice(self.pool.accounts[self.pool.random_payee(payer_idx)])
+
+    def _home(self, user_idx):
+        return self.pool.home_location(user_idx)
+
+    def _foreign(self, user_idx):
+        # Any region but home: offset the home index by 1..len-1, wrapping around
+        offset = self.rng.randrange(1, len(self.region_names))
+        region = self.region_names[(self.pool.home_regions[user_idx] + offset) % len(self.region_names)]
+        return self.rng.choice(self.regions[region])
+
+    def _new_device(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _typical_amount(self, payer_idx):
+        """Around the payer's own recent spend, or the ordinary range with no history yet."""
+        if self.lo <= payer_idx < self.hi:
+            recent = self.history.recent_amounts(payer_idx - self.lo)
+            if len(recent):
+                return round(float(recent.mean()) * self.rng.uniform(0.5, 1.5), 2)
+        return float(self.rng.randint(5, 1000))
+
+    def _ordinary(self):
+        payer_idx = self._payer()
+        return (payer_idx, self._payee_account(payer_idx), float(self.rng.randint(5, 1000)),
+                self._home(payer_idx), None, None, None)
+
+    # --- scenarios: generators of (delay_seconds, event) -----------------
+
+    def _velocity_burst(self):
+        rng = self.rng
+        payer_idx = self._payer()
+        for i in range(rng.randint(8, 20)):
+            yield (0.0 if i == 0 else rng.uniform(1, 6)), (
+                payer_idx, self._payee_account(payer_idx), self._typical_amount(payer_idx),
+                self._home(payer_idx), None, None, None,
+            )
+
+    def _card_testing(self):
+        rng = self.rng
+        payer_idx = self._payer()
+        device = self._new_device()
+        location = self._home(payer_idx)
+        for i in range(rng.randint(5, 15)):
+            yield (0.0 if i == 0 else rng.uniform(0.5, 3)), (
+                payer_idx, self._payee_account(payer_idx), round(rng.uniform(0.5, 2.0), 2),
+                location, device, "CREDIT CARD", "shopping",
+            )
+        yield rng.uniform(5, 30), (
+            payer_idx, self._payee_account(payer_idx), float(rng.randint(2500, 15000)),
+            location, device, "CREDIT CARD", "shopping",
+        )
+
+    def _account_takeover(self):
+        rng = self.rng
+        payer_idx = self._payer()
+        device = self._new_device()
+        location = self._foreign(payer_idx)
+        mule_account = self._payee_account(payer_idx)
+        probes = rng.randint(1, 2)
+        for i in range(probes):
+            yield (0.0 if i == 0 else rng.uniform(10, 60)), (
+                payer_idx, self._payee_account(payer_idx), float(rng.randint(1, 20)),
+                location, device, None, None,
+            )
+        recent = self.history.recent_amounts(payer_idx - self.lo)
+        floor = max(2500.0, 3.0 * float(recent.max())) if len(recent) else 2500.0
+        for _ in range(rng.randint(2, 4)):
+            yield rng.uniform(20, 120), (
+                payer_idx, mule_account, float(rng.randint(int(floor), max(int(floor), 15000))),
+                location, device, "NET BANKING", "payment",
+            )
+
+    def _mule_ring(self):
+        rng = self.rng
+        pool = self.pool
+        # Mules come from this worker's own slice, like every other payer here,
+        # so each user_id is only ever emitted by one worker (in time order).
+        mules = rng.sample(range(self.lo, self.hi), min(self.hi - self.lo - 1, rng.randint(3, 6)))
+        collected = 0.0
+        for i in range(rng.randint(2, 5)):
+            victim = self._payer()
+            while victim in mules:
+                victim = self._payer()
+            amount = float(rng.randint(500, 3000))
+            collected += amount
+            yield (0.0 if i == 0 else rng.uniform(5, 60)), (
+                victim, rng.choice(pool.accounts[mules[0]]), amount,
+                self._home(victim), None, None, None,
+            )
+        for sender, receiver in zip(mules, mules[1:]):
+            collected = round(collected * rng.uniform(0.9, 0.98), 2)
+            yield rng.uniform(30, 180), (
+                sender, rng.choice(pool.accounts[receiver]), collected,
+                self._home(sender), None, rng.choice(["SWIFT", "NET BANKING"]), "payment",
+            )
+
+
+class LabelSink:
+    """
+    Where ground-truth labels go: a Kafka side topic (JSON, keyed by user_id,
+    through the worker's own producer), a per-worker JSONL file, or nowhere.
+    The live generator appends to the file; a backfill passes mode="w" so a
+    rerun replaces its labels along with its part files.
+    """
+
+    def __init__(self, producer=None, topic=None, path=None, mode="a"):
+        self.producer = producer
+        self.topic = topic
+        self._file = open(path, mode, buffering=1 << 16) if path else None
+
+    def write(self, labels):
+        for label in labels:
+            if label is None:
+                continue
+            line = json.dumps(label)
+            if self.topic is not None:
+                self.producer.produce(topic=self.topic, key=label["user_id"], value=line)
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
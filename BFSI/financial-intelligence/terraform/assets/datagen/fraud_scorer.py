@@ -0,0 +1,474 @@
+"""
+Local reference fraud scorer for Payment events.
+
+Reads payments from the Kafka topic (Confluent-framed Avro, decoded with the
+same parsed schema payment_encoder.py writes with) or from Avro/JSONL files,
+keeps sliding-window features per user, and scores every event with a
+small fixed logistic model. It is a baseline to measure detection latency,
+throughput and -- against the generator's fraud labels -- precision/recall
+locally, not a production model.
+
+Features per user, as of each event:
+- payment count and amount sum over the last minute and the last hour;
+- distinct cities paid from in the last hour;
+- whether this payment's device differs from the user's previous one, and
+  how many such device changes happened in the last hour;
+- whether the payment's country lies outside the user's home region in
+  user_profiles (looked up through profile_cache.ProfileCache).
+
+Feature state lives in flat typed arrays, one fixed-width row per user (under
+500 bytes): each window is a ring of time buckets (6 x 10 s for the minute,
+12 x 5 min for the hour), with running totals alongside. When a user's next payment moves the window
+forward, only the buckets that fell out are subtracted and cleared, so
+eviction is amortized O(1) per event no matter how much history has passed.
+
+    python fraud_scorer.py --source kafka --labels-topic payments-fraud-labels
+    python fraud_scorer.py --source file --files 'backfill/date=*/part-*.avro' \
+        --labels 'backfill/fraud_labels/part-*.jsonl'
+"""
+import argparse
+import configparser
+import glob
+import io
+import json
+import math
+import time
+from array import array
+from collections import OrderedDict, deque
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from fastavro import reader as avro_reader, schemaless_reader
+
+from payment_encoder import PARSED_SCHEMA
+from payments import REGIONS
+from profile_cache import ProfileCache
+
+# Logistic model: score = sigmoid(BIAS + sum(weight * feature term)).
+BIAS = -4.0
+WEIGHTS = {
+    "burst_1m": 0.6,           # per payment in the last minute beyond max(3, 3x the hourly per-minute rate)
+    "extra_cities_1h": 0.5,    # per distinct city beyond the first in the last hour
+    "new_device": 2.0,         # this payment's device differs from the user's previous one
+    "device_changes_1h": 0.4,  # per device change in the last hour (capped at 3)
+    "region_mismatch": 1.5,
+    "large_amount": 1.2,       # >= 2500
+    "micro_card_burst": 2.5,   # sub-$2 payment with 3+ payments in the last minute
+    "above_hourly_mean": 0.8,  # amount > 3x this user's mean over the last hour
+}
+DEFAULT_THRESHOLD = 0.5
+# How long a streamed label and its payment may arrive apart (in either order)
+# and still be matched.
+DEFAULT_LABEL_WINDOW_SECONDS = 30.0
+
+COUNTRY_REGION = {loc["country"]: region for region, locations in REGIONS.items() for loc in locations}
+_NEVER = -(1 << 62)  # last_epoch of a row that has never seen a payment
+
+
+class BucketWindow:
+    """
+    Per-user ring of `num_buckets` time buckets of `width` seconds -- payment
+    count, amount sum, a bitmask of cities seen and a device-change count --
+    plus running totals over the whole ring, all in flat typed arrays (row r's
+    buckets at [r * num_buckets, (r + 1) * num_buckets)). Moving a row forward
+    in time subtracts and clears only the buckets that fell out of the window,
+    so reading the totals is O(1) apart from OR-ing the city masks.
+    """
+
+    def __init__(self, capacity, num_buckets, width):
+        self.num_buckets = num_buckets
+        self.width = width
+        self.last_epoch = array('q')
+        self.counts = array('I')
+        self.sums = array('d')
+        self.cities = array('Q')
+        self.changes = array('H')
+        self.total_counts = array('q')
+        self.total_sums = array('d')
+        self.total_changes = array('q')
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        extra = capacity - len(self.last_epoch)
+        self.last_epoch.extend(array('q', [_NEVER]) * extra)
+        for arr in (self.counts, self.sums, self.cities, self.changes):
+            arr.extend(array(arr.typecode, [0]) * (extra * self.num_buckets))
+        for arr in (self.total_counts, self.total_sums, self.total_changes):
+            arr.extend(array(arr.typecode, [0]) * extra)
+
+    def _advance(self, row, epoch):
+        last = self.last_epoch[row]
+        if epoch <= last:
+            return
+        counts, sums, cities, changes = self.counts, self.sums, self.cities, self.changes
+        base = row * self.num_buckets
+        if epoch - last >= self.num_buckets:
+            stale = range(base, base + self.num_buckets)
+        else:
+            stale = [base + e % self.num_buckets for e in range(last + 1, epoch + 1)]
+        dropped_count = dropped_sum = dropped_changes = 0
+        for i in stale:
+            dropped_count += counts[i]
+            dropped_sum += sums[i]
+            dropped_changes += changes[i]
+            counts[i] = 0
+            sums[i] = 0.0
+            cities[i] = 0
+            changes[i] = 0
+        self.total_counts[row] -= dropped_count
+        self.total_sums[row] -= dropped_sum
+        self.total_changes[row] -= dropped_changes
+        self.last_epoch[row] = epoch
+
+    def add(self, row, ts, amount, city_bit, device_changed):
+        epoch = int(ts // self.width)
+        self._advance(row, epoch)
+        # A late event lands in the newest bucket rather than reopening an old one.
+        i = row * self.num_buckets + min(epoch, self.last_epoch[row]) % self.num_buckets
+        self.counts[i] += 1
+        self.sums[i] += amount
+        self.cities[i] |= city_bit
+        self.changes[i] += device_changed
+        self.total_counts[row] += 1
+        self.total_sums[row] += amount
+        self.total_changes[row] += device_changed
+
+    def totals(self, row):
+        """(count, sum, city bitmask, device changes) over the window ending at the row's latest event."""
+        base = row * self.num_buckets
+        return (
+            self.total_counts[row],
+            self.total_sums[row],
+            reduce(or_, self.cities[base:base + self.num_buckets]),
+            self.total_changes[row],
+        )
+
+
+class UserFeatureStore:
+    def __init__(self, profiles=None, capacity=1024):
+        self.profiles = profiles  # ProfileCache, or None to skip the home-region feature
+        self.slots = {}
+        self.capacity = capacity
+        self.minute = BucketWindow(capacity, 6, 10.0)
+        self.hour = BucketWindow(capacity, 12, 300.0)
+        self.last_device = [None] * capacity
+        self.city_bits = {}
+
+    def _slot(self, user_id):
+        slot = self.slots.get(user_id)
+        if slot is None:
+            slot = self.slots[user_id] = len(self.slots)
+            if slot >= self.capacity:
+                self.capacity *= 2
+                self.minute.grow(self.capacity)
+                self.hour.grow(self.capacity)
+                self.last_device.extend([None] * (self.capacity - len(self.last_device)))
+        return slot
+
+    def _city_bit(self, city):
+        bit = self.city_bits.get(city)
+        if bit is None:
+            # Beyond 64 cities the mask saturates on the last bit -- an undercount, never a crash.
+            bit = self.city_bits[city] = 1 << min(len(self.city_bits), 63)
+        return bit
+
+    def update(self, payment, ts):
+        """Folds one payment into the user's windows and returns the features as of it."""
+        user_id = payment["user_id"]
+        row = self._slot(user_id)
+        amount = payment["amount"]
+        address = payment["address"]
+
+        previous = self.last_device[row]
+        device_changed = int(previous is not None and previous != payment["device_id"])
+        self.last_device[row] = payment["device_id"]
+
+        city_bit = self._city_bit(address["city"])
+        self.minute.add(row, ts, amount, city_bit, device_changed)
+        self.hour.add(row, ts, amount, city_bit, device_changed)
+        count_1m, sum_1m, _, _ = self.minute.totals(row)
+        count_1h, sum_1h, cities_1h, changes_1h = self.hour.totals(row)
+
+        profile = self.profiles.get(user_id) if self.profiles is not None else None
+        home = profile.home_region if profile is not None else None
+        country_region = COUNTRY_REGION.get(address["country"])
+        return {
+            "amount": amount,
+            "count_1m": count_1m,
+            "sum_1m": sum_1m,
+            "count_1h": count_1h,
+            "sum_1h": sum_1h,
+            "distinct_cities_1h": bin(cities_1h).count("1"),
+            "new_device": device_changed,
+            "device_changes_1h": changes_1h,
+            "region_mismatch": int(home is not None and country_region is not None and home != country_region),
+        }
+
+
+def score(features):
+    count_1m = features["count_1m"]
+    amount = features["amount"]
+    prior_mean = (features["sum_1h"] - amount) / (features["count_1h"] - 1) if features["count_1h"] > 1 else None
+    z = BIAS
+    z += WEIGHTS["burst_1m"] * max(0, count_1m - max(3, 3 * features["count_1h"] / 60))
+    z += WEIGHTS["extra_cities_1h"] * max(0, features["distinct_cities_1h"] - 1)
+    z += WEIGHTS["new_device"] * features["new_device"]
+    z += WEIGHTS["device_changes_1h"] * min(features["device_changes_1h"], 3)
+    z += WEIGHTS["region_mismatch"] * features["region_mismatch"]
+    z += WEIGHTS["large_amount"] * (amount >= 2500)
+    z += WEIGHTS["micro_card_burst"] * (amount < 2 and count_1m >= 3)
+    z += WEIGHTS["above_hourly_mean"] * (prior_mean is not None and amount > 3 * prior_mean)
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class LatencyRecorder:
+    """The most recent `capacity` samples in a ring, for percentile reporting."""
+
+    def __init__(self, capacity=100_000):
+        self.samples = np.zeros(capacity)
+        self.count = 0
+
+    def add(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def percentiles(self, qs=(50, 95, 99)):
+        if self.count == 0:
+            return {q: float("nan") for q in qs}
+        values = np.percentile(self.samples[:min(self.count, len(self.samples))], qs)
+        return dict(zip(qs, values.tolist()))
+
+
+def kafka_source(config, label_topic=None):
+    """Yields (payment or None, label or None, event_time_seconds) from the live topics."""
+    from confluent_kafka import Consumer
+
+    consumer_config = dict(config['kafka'])
+    topic_name = consumer_config.pop('topic.name')
+    consumer_config.update({
+        "group.id": "payments-reference-fraud-scorer",
+        "auto.offset.reset": "latest",
+        "enable.auto.commit": False,
+    })
+    consumer = Consumer(consumer_config)
+    consumer.subscribe([topic_name] + ([label_topic] if label_topic else []))
+    try:
+        while True:
+            for msg in consumer.consume(num_messages=500, timeout=1.0):
+                if msg.error():
+                    print(f"[Consumer] {msg.error()}")
+                    continue
+                if msg.topic() == label_topic:
+                    yield None, json.loads(msg.value()), None
+                else:
+                    # Skip the 5-byte Confluent header (magic byte + schema id).
+                    payment = schemaless_reader(io.BytesIO(msg.value()[5:]), PARSED_SCHEMA)
+                    yield payment, None, payment["timestamp"] / 1000.0
+    finally:
+        consumer.close()
+
+
+def file_source(patterns):
+    """Yields (payment, None, event_time_seconds) from Avro container or JSONL files, in order."""
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, "rb") as f:
+                if path.endswith(".avro"):
+                    records = avro_reader(f)
+                else:
+                    records = (json.loads(line) for line in f if line.strip())
+                for payment in records:
+                    yield payment, None, payment["timestamp"] / 1000.0
+
+
+def load_labels(patterns):
+    labels = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        label = json.loads(line)
+                        labels[label["transaction_id"]] = label["scenario"]
+    return labels
+
+
+class Benchmark:
+    """
+    Throughput, latency percentiles and (with labels) precision/recall for one run.
+
+    Accuracy is kept as running true/false-positive and false-negative counts.
+    Labels loaded from files are looked up (and dropped) as their payments are
+    scored. Labels streamed from the topic can arrive before or after their
+    payment, so each side waits up to `label_window` seconds for the other: a
+    payment still unmatched by then counts as legitimate, and a label whose
+    payment was never scored is dropped. Memory stays bounded by what arrives
+    within one window.
+    """
+
+    def __init__(self, threshold, labels=None, streamed_labels=False, label_window=DEFAULT_LABEL_WINDOW_SECONDS):
+        self.threshold = threshold
+        self.labels = dict(labels) if labels else {}  # transaction_id -> scenario, awaiting its payment
+        self.track_accuracy = labels is not None or streamed_labels
+        self.streamed_labels = streamed_labels
+        self.label_window = label_window
+        self.true_positives = self.false_positives = self.false_negatives = 0
+        self._label_expiry = deque()            # (expires_at, transaction_id) of streamed labels
+        self._awaiting_label = OrderedDict()    # transaction_id -> (expires_at, flagged)
+        self.events = 0
+        self.end_to_end = LatencyRecorder()
+        self.processing = LatencyRecorder()
+        self.started = time.monotonic()
+
+    def record(self, transaction_id, value, end_to_end_ms, processing_us):
+        self.events += 1
+        if end_to_end_ms is not None:
+            self.end_to_end.add(end_to_end_ms)
+        self.processing.add(processing_us)
+        if self.track_accuracy:
+            flagged = value >= self.threshold
+            if self.labels.pop(transaction_id, None) is not None:
+                self._count(True, flagged)
+            elif self.streamed_labels:
+                now = time.monotonic()
+                self._expire(now)
+                self._awaiting_label[transaction_id] = (now + self.label_window, flagged)
+            else:
+                self._count(False, flagged)
+
+    def add_label(self, label):
+        """A label streamed in while scoring."""
+        transaction_id = label["transaction_id"]
+        now = time.monotonic()
+        self._expire(now)
+        awaiting = self._awaiting_label.pop(transaction_id, None)
+        if awaiting is not None:
+            self._count(True, awaiting[1])
+        else:
+            self.labels[transaction_id] = label["scenario"]
+            self._label_expiry.append((now + self.label_window, transaction_id))
+
+    def _count(self, fraud, flagged):
+        if fraud and flagged:
+            self.true_positives += 1
+        elif fraud:
+            self.false_negatives += 1
+        elif flagged:
+            self.false_positives += 1
+
+    def _expire(self, now):
+        awaiting = self._awaiting_label
+        while awaiting:
+            transaction_id, (expires_at, flagged) = next(iter(awaiting.items()))
+            if expires_at > now:
+                break
+            del awaiting[transaction_id]
+            self._count(False, flagged)
+        expiry = self._label_expiry
+        while expiry and expiry[0][0] <= now:
+            self.labels.pop(expiry.popleft()[1], None)
+
+    def finish(self):
+        """Settles every payment still waiting for a label, before the final report."""
+        self._expire(math.inf)
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        proc = self.processing.percentiles()
+        line = f"[Scorer] {self.events:,} events, {self.events / max(elapsed, 1e-9):,.0f}/s | "
+        if self.end_to_end.count:
+            e2e = self.end_to_end.percentiles()
+            line += f"end-to-end ms p50={e2e[50]:.1f} p95={e2e[95]:.1f} p99={e2e[99]:.1f} | "
+        line += f"scoring us p50={proc[50]:.1f} p99={proc[99]:.1f}"
+        if self.track_accuracy:
+            hits = self.true_positives
+            flagged = hits + self.false_positives
+            fraud = hits + self.false_negatives
+            precision = hits / flagged if flagged else float("nan")
+            recall = hits / fraud if fraud else float("nan")
+            line += f" | precision={precision:.3f} recall={recall:.3f} ({fraud:,} labelled)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--source", choices=["kafka", "file"], default="kafka")
+    parser.add_argument("--files", nargs="*", default=[], help="Avro (.avro) or JSONL payment files, for --source file")
+    parser.add_argument("--labels", nargs="*", help="Fraud label JSONL files from the generator")
+    parser.add_argument("--labels-topic", help="Fraud label topic to consume alongside payments (--source kafka)")
+    parser.add_argument("--label-window", type=float, default=DEFAULT_LABEL_WINDOW_SECONDS,
+                        help="Seconds a streamed label and its payment may arrive apart and still be matched")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--output", help="Write every score as JSONL here")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--max-events", type=int, default=0, help="Stop after this many payments (0 = no limit)")
+    parser.add_argument("--no-profiles", action="store_true", help="Skip the user_profiles home-region lookup")
+    parser.add_argument("--profile-refresh", choices=["poll", "cdc"], default="poll",
+                        help="How the profile cache learns about new users: poll created_at, or the CDC topic")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+
+    profiles = None
+    if not args.no_profiles:
+        profiles = ProfileCache.from_config(config)
+        profiles.warm_up()
+        if args.profile_refresh == "cdc":
+            profiles.start_cdc(config['kafka'])
+        else:
+            profiles.start_polling()
+    store = UserFeatureStore(profiles)
+
+    labels = load_labels(args.labels) if args.labels else None
+    streamed_labels = args.source == "kafka" and bool(args.labels_topic)
+    bench = Benchmark(args.threshold, labels, streamed_labels, args.label_window)
+
+    if args.source == "kafka":
+        source = kafka_source(config, args.labels_topic)
+    else:
+        source = file_source(args.files)
+    output = open(args.output, "w") if args.output else None
+
+    last_report = time.monotonic()
+    try:
+        for payment, label, event_time in source:
+            if label is not None:
+                bench.add_label(label)
+                continue
+            started = time.perf_counter()
+            features = store.update(payment, event_time)
+            value = score(features)
+            processing_us = (time.perf_counter() - started) * 1e6
+            end_to_end_ms = (time.time() - event_time) * 1000.0 if args.source == "kafka" else None
+            bench.record(payment["transaction_id"], value, end_to_end_ms, processing_us)
+            if output is not None:
+                output.write(json.dumps({
+                    "transaction_id": payment["transaction_id"],
+                    "user_id": payment["user_id"],
+                    "score": round(value, 4),
+                    "flagged": value >= args.threshold,
+                    "features": features,
+                }) + "\n")
+
+            if time.monotonic() - last_report >= args.report_interval:
+                bench.report()
+                last_report = time.monotonic()
+            if args.max_events and bench.events >= args.max_events:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bench.finish()
+        bench.report()
+        if profiles is not None:
+            print(f"[ProfileCache] {profiles.stats()}")
+            profiles.close()
+        if output is not None:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
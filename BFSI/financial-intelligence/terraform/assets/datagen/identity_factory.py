@@ -0,0 +1,232 @@
+"""
+Batch synthetic-identity factory for the payments generator.
+
+Calling Faker once per field per user (fake.name(), fake.bban(),
+fake.credit_card_number(), fake.unique.email(), ...) costs ~100us+ per user
+and fake.unique keeps an ever-growing dedup set, which is what made seeding
+large user_profiles tables take tens of minutes. Instead, Faker runs only
+once, up front, to fill a few fixed-size value pools (first/last names, email
+domains, phone numbers, SSNs, dates of birth, bank codes, card BINs). Those
+pools are cached on disk as JSON, so later runs skip Faker entirely.
+Users are then assembled a batch at a time with NumPy, purely from their
+user numbers:
+
+- every pick is a splitmix64 hash of (seed, user number), so user N always
+  gets the same identity, on any machine, in any order, with no per-user RNG
+  state;
+- fields that must be unique (email, account numbers) embed the user number
+  itself rather than relying on a dedup set;
+- card numbers keep a real BIN and length and get a valid Luhn check digit,
+  computed across the whole batch at once. Their last CARD_BODY_DIGITS body
+  digits are a seeded permutation of (user number, card slot), so they are
+  unique without looking sequential.
+
+Only the final string formatting is per user, so a million identities take a
+few seconds.
+"""
+import gc
+import json
+import os
+
+import numpy as np
+from faker import Faker
+
+CACHE_VERSION = 1
+DEFAULT_POOL_SIZE = 5000
+DEFAULT_SEED = 20240601
+
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+# Card bodies end in a permutation of 2 * user number + card slot over this many
+# digits, so card numbers stay unique up to user CARD_BODY_SPACE // 2 - 1.
+# Schemes whose body is shorter than that (13-digit Visa, 15-digit Amex, ...)
+# are left out of the card pool.
+CARD_BODY_DIGITS = 9
+CARD_BODY_SPACE = 10 ** CARD_BODY_DIGITS
+
+
+def _mix(x):
+    """splitmix64 finalizer over a uint64 array (wrapping arithmetic)."""
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _luhn_partial(digits, offset):
+    """Luhn sum of a digit prefix followed by `offset` more payload digits (check digit not included)."""
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = ord(ch) - 48
+        if (i + offset) % 2 == 0:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return total
+
+
+def generate_pools(pool_size=DEFAULT_POOL_SIZE, seed=DEFAULT_SEED):
+    """The only place Faker runs: fixed-size pools of each field's raw values."""
+    fake = Faker()
+    Faker.seed(seed)
+    return {
+        "version": CACHE_VERSION,
+        "pool_size": pool_size,
+        "seed": seed,
+        "first_names": sorted({fake.first_name() for _ in range(pool_size)}),
+        "last_names": sorted({fake.last_name() for _ in range(pool_size)}),
+        "email_domains": sorted({fake.free_email_domain() for _ in range(200)}),
+        "phone_numbers": [fake.phone_number() for _ in range(pool_size)],
+        "ssns": [fake.ssn() for _ in range(pool_size)],
+        "dates_of_birth": [
+            fake.date_of_birth(minimum_age=18, maximum_age=75).strftime('%Y-%m-%d')
+            for _ in range(pool_size)
+        ],
+        # BBANs here are 4 letters + 14 digits; only the bank-code half is pooled.
+        "bank_codes": sorted({fake.bban()[:4] for _ in range(500)}),
+        # (BIN, total length) pairs, so generated cards keep each scheme's real shape.
+        "card_bins": sorted({
+            (number[:6], len(number))
+            for number in (fake.credit_card_number() for _ in range(500))
+        }),
+    }
+
+
+class IdentityFactory:
+    def __init__(self, pools):
+        self.pools = pools
+        self.seed = np.uint64(pools["seed"])
+        self._first = np.array(pools["first_names"], dtype=object)
+        self._last = np.array(pools["last_names"], dtype=object)
+        self._domains = np.array(pools["email_domains"], dtype=object)
+        self._phones = np.array(pools["phone_numbers"], dtype=object)
+        self._ssns = np.array(pools["ssns"], dtype=object)
+        self._dobs = np.array(pools["dates_of_birth"], dtype=object)
+        self._banks = np.array(pools["bank_codes"], dtype=object)
+        card_bins = [(b, length) for b, length in pools["card_bins"] if length - len(b) - 1 >= CARD_BODY_DIGITS]
+        if not card_bins:
+            raise ValueError(f"identity pools have no card scheme with a {CARD_BODY_DIGITS}-digit body")
+        self._bins = np.array([b for b, _length in card_bins], dtype=object)
+        self._body_lengths = np.array([length - len(b) - 1 for b, length in card_bins], dtype=np.int64)
+        # x -> (a * x + b) mod CARD_BODY_SPACE is a bijection when a is coprime to 10.
+        key = int(_mix(np.array([self.seed], dtype=np.uint64))[0])
+        a = (key % CARD_BODY_SPACE) | 1
+        if a % 5 == 0:
+            a += 2
+        self._card_mul = np.uint64(a)
+        self._card_add = np.uint64((key >> 32) % CARD_BODY_SPACE)
+        # A BIN's Luhn contribution only depends on how many body digits follow it.
+        self._bin_luhn = np.array(
+            [_luhn_partial(b, body_len) for b, body_len in zip(self._bins, self._body_lengths)],
+            dtype=np.int64,
+        )
+
+    @classmethod
+    def load_or_generate(cls, cache_path, pool_size=DEFAULT_POOL_SIZE, seed=DEFAULT_SEED):
+        """Loads cached pools if they match (version, size, seed); otherwise runs Faker once and caches."""
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    pools = json.load(f)
+                if (pools.get("version"), pools.get("pool_size"), pools.get("seed")) == (CACHE_VERSION, pool_size, seed):
+                    return cls(pools)
+            except (OSError, ValueError):
+                pass  # unreadable cache -- just regenerate it
+        print(f"Generating synthetic identity pools ({pool_size} values per field)...")
+        pools = generate_pools(pool_size, seed)
+        try:
+            with open(cache_path, "w") as f:
+                json.dump(pools, f)
+        except OSError as e:
+            print(f"Warning: could not cache identity pools at {cache_path}: {e}")
+        return cls(pools)
+
+    def _cards(self, numbers, h2, j):
+        """
+        Card j (0 or 1) for every user: BIN + body + Luhn check digit. The body's
+        low CARD_BODY_DIGITS digits permute (user number, j); any digits above
+        those come from the hash.
+        """
+        idx = ((h2 >> np.uint64(16 + 8 * j)) % np.uint64(len(self._bins))).astype(np.int64)
+        body_len = self._body_lengths[idx]
+        slot = numbers * np.uint64(2) + np.uint64(j)
+        body = ((slot * self._card_mul + self._card_add) % np.uint64(CARD_BODY_SPACE)).astype(np.int64)
+        high = 10 ** (body_len - CARD_BODY_DIGITS)
+        body += ((h2 >> np.uint64(8)) % high.astype(np.uint64)).astype(np.int64) * CARD_BODY_SPACE
+
+        total = self._bin_luhn[idx].copy()
+        rest = body.copy()
+        for k in range(int(body_len.max(initial=0))):
+            d = rest % 10
+            rest //= 10
+            if k % 2 == 0:
+                d = d * 2
+                d -= 9 * (d > 9)
+            total += d * (k < body_len)
+        check = (10 - total % 10) % 10
+
+        return [
+            f"{b}{v:0{bl}d}{c}"
+            for b, v, bl, c in zip(self._bins[idx].tolist(), body.tolist(), body_len.tolist(), check.tolist())
+        ]
+
+    def identities(self, user_numbers):
+        """
+        [(full_name, accounts, device_id, credit_cards, email, phone, ssn, dob), ...]
+        for a batch of user numbers, in order -- the same tuple every time for
+        the same user number.
+        """
+        numbers = np.asarray(user_numbers, dtype=np.uint64).reshape(-1)
+        if numbers.size and int(numbers.max()) >= CARD_BODY_SPACE // 2:
+            raise ValueError(f"user numbers must be below {CARD_BODY_SPACE // 2:,} to keep card numbers unique")
+        h = _mix(self.seed ^ (numbers * _FNV_PRIME))
+        h2 = _mix(h)
+
+        def pick(pool, bits, shift):
+            return pool[((bits >> np.uint64(shift)) % np.uint64(len(pool))).astype(np.int64)].tolist()
+
+        firsts = pick(self._first, h, 0)
+        lasts = pick(self._last, h, 16)
+        domains = pick(self._domains, h, 32)
+        phones = pick(self._phones, h2, 32)
+        ssns = pick(self._ssns, h2, 40)
+        dobs = pick(self._dobs, h2, 48)
+        accounts = [
+            [f"{bank}{n:014d}" for bank, n in zip(pick(self._banks, h2, 8 * j), (numbers * np.uint64(4) + np.uint64(j)).tolist())]
+            for j in range(3)
+        ]
+        num_accounts = (1 + (h >> np.uint64(48)) % np.uint64(3)).tolist()
+        num_cards = (1 + (h >> np.uint64(56)) % np.uint64(2)).tolist()
+        cards = [self._cards(numbers, h2, j) for j in range(2)]
+        if len(set(cards[0]).union(cards[1])) != 2 * len(numbers):
+            raise AssertionError("generated card numbers are not unique")
+
+        # UUID version 4 layout: version nibble in the high half, RFC 4122
+        # variant bits at the top of the low half.
+        hi = ((h & ~np.uint64(0xF000)) | np.uint64(0x4000)).tolist()
+        lo = ((h2 & np.uint64(0x3FFFFFFFFFFFFFFF)) | np.uint64(0x8000000000000000)).tolist()
+
+        # Building a million small tuples/lists would otherwise trigger
+        # hundreds of cyclic-GC passes over objects that can't form cycles.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            result = []
+            for i, n in enumerate(numbers.tolist()):
+                first, last = firsts[i], lasts[i]
+                device = f"{hi[i]:016x}{lo[i]:016x}"
+                result.append((
+                    f"{first} {last}",
+                    [accounts[0][i], accounts[1][i], accounts[2][i]][:num_accounts[i]],
+                    f"{device[:8]}-{device[8:12]}-{device[12:16]}-{device[16:20]}-{device[20:]}",
+                    [cards[0][i], cards[1][i]][:num_cards[i]],
+                    f"{first}.{last}.{n}@{domains[i]}".lower(),
+                    phones[i],
+                    ssns[i],
+                    dobs[i],
+                ))
+            return result
+        finally:
+            if gc_was_enabled:
+                gc.enable()
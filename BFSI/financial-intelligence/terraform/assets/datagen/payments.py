@@ -1,19 +1,21 @@
+import io
+import csv
 import time
 import uuid
 import random
+import threading
 import configparser
-import psycopg2
+import multiprocessing
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2.extras import execute_values
-from psycopg2 import OperationalError, InterfaceError
-from faker import Faker
-from confluent_kafka import Producer
+from psycopg2 import connect, OperationalError, InterfaceError
 from confluent_kafka.admin import AdminClient, NewTopic
 from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.avro import AvroSerializer
-from confluent_kafka.serialization import MessageField, SerializationContext
-
-# Initialize Faker
-fake = Faker()
+from identity_factory import IdentityFactory, DEFAULT_POOL_SIZE, DEFAULT_SEED
+from payment_encoder import PaymentEncoder
+from fraud_scenarios import FraudScenarioEngine, LabelSink
+from adaptive_producer import AdaptiveProducer, MetricsBoard
 
 # Geographically accurate mapping
 REGIONS = {
@@ -34,42 +36,163 @@ REGIONS = {
     ]
 }
 
+REGION_NAMES = list(REGIONS.keys())
+
 CATEGORIES = ["bill", "payment", "shopping", "emi", "insurance", "medical", "entertainment", "travel", "groceries"]
 PAYMENT_METHODS = ["UPI", "SWIFT", "CREDIT CARD", "DEBIT CARD", "WALLET", "NET BANKING"]
 
-# State dictionaries to manage user profiles dynamically (Only for the active pool)
-USER_NAME_MAP = {}
-USER_ACCOUNT_MAP = {}   
-USER_DEVICE_MAP = {}    
-USER_HOME_REGION = {}   
-USER_HOME_LOCATION = {} 
-
-def get_db_connection(config):
-    """Establishes connection to Postgres using configurations with a strict 5-second timeout footprint."""
-    return psycopg2.connect(
-        host=config.get('postgresql', 'host', fallback='localhost'),
-        database=config.get('postgresql', 'database', fallback='payments_db'),
-        user=config.get('postgresql', 'user', fallback='postgres'),
-        password=config.get('postgresql', 'password', fallback='postgres'),
-        port=config.get('postgresql', 'port', fallback='5432'),
-        connect_timeout=5  # Fast failure trigger to let retry handle timeouts smoothly
-    )
+def format_user_id(user_number):
+    return f"user_{str(user_number).zfill(4)}"
+
+class UserPool:
+    """
+    Columnar, index-addressed state for the active transaction pool. Slot i holds
+    user number i + 1 (the pool is always seeded contiguously from user_0001), so
+    ids are derived instead of stored and every lookup is a list/array index.
+    Device ids live as raw 16-byte UUIDs in one bytearray and home region/location
+    as small ints in typed arrays, which keeps the per-user footprint flat enough
+    for pools in the millions.
+    """
+    __slots__ = ("names", "accounts", "device_ids", "home_regions", "home_locations")
+
+    def __init__(self):
+        self.names = []
+        self.accounts = []                # tuple of account numbers per user
+        self.device_ids = bytearray()     # 16 bytes per user
+        self.home_regions = array('B')    # index into REGION_NAMES
+        self.home_locations = array('B')  # index into REGIONS[home region]
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, full_name, accounts, device_id, region_idx, location_idx):
+        self.names.append(full_name)
+        self.accounts.append(tuple(accounts))
+        self.device_ids += uuid.UUID(device_id).bytes
+        self.home_regions.append(region_idx)
+        self.home_locations.append(location_idx)
+
+    def user_id(self, i):
+        return format_user_id(i + 1)
+
+    def device_id(self, i):
+        return str(uuid.UUID(bytes=bytes(self.device_ids[16 * i:16 * i + 16])))
+
+    def home_region(self, i):
+        return REGION_NAMES[self.home_regions[i]]
+
+    def home_location(self, i):
+        return REGIONS[self.home_region(i)][self.home_locations[i]]
+
+    def random_user(self):
+        return random.randrange(len(self.names))
+
+    def random_payee(self, payer_idx):
+        """Uniform pick among everyone but the payer, O(1): draw from n - 1 slots and skip over the payer's."""
+        payee_idx = random.randrange(len(self.names) - 1)
+        return payee_idx + 1 if payee_idx >= payer_idx else payee_idx
+
+# Active transaction pool. Growth users are stored by the parent with
+# update_memory_maps=False and then rebuilt by each worker (see grow_user_pool).
+USER_POOL = UserPool()
+
+class ConnectionPool:
+    """
+    Up to maxconn connections shared between threads. Nothing opens up front;
+    getconn() reuses an idle connection or opens a new one, and blocks while
+    all maxconn are checked out. putconn() keeps the connection for reuse
+    unless the caller marks it broken.
+    """
+    def __init__(self, maxconn, **connect_kwargs):
+        self.maxconn = maxconn
+        self._connect_kwargs = connect_kwargs
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        self._slots.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return connect(**self._connect_kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        try:
+            if close:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+_DB_POOL = None
+_DB_POOL_LOCK = threading.Lock()
+
+def get_db_pool(config):
+    """
+    Process-wide pool of reusable connections, created on first use. Building the
+    pool never touches the network -- connections open lazily inside
+    execute_db_with_retry, where connect failures are retried like any other fault.
+    Each connection has a strict 5-second connect timeout so a dead host fails fast.
+    """
+    global _DB_POOL
+    with _DB_POOL_LOCK:
+        if _DB_POOL is None:
+            max_connections = max(1, config.getint('postgresql', 'max_connections', fallback=4))
+            _DB_POOL = ConnectionPool(
+                max_connections,
+                host=config.get('postgresql', 'host', fallback='localhost'),
+                database=config.get('postgresql', 'database', fallback='payments_db'),
+                user=config.get('postgresql', 'user', fallback='postgres'),
+                password=config.get('postgresql', 'password', fallback='postgres'),
+                port=config.get('postgresql', 'port', fallback='5432'),
+                connect_timeout=5  # Fast failure trigger to let retry handle timeouts smoothly
+            )
+        return _DB_POOL
+
+def close_db_pool():
+    """
+    Closes the process's pooled connections. Called before forking the stream
+    workers, so no child inherits an open socket it would share with the parent;
+    the parent's next get_db_pool() call opens a fresh pool.
+    """
+    global _DB_POOL
+    with _DB_POOL_LOCK:
+        if _DB_POOL is not None:
+            _DB_POOL.closeall()
+            _DB_POOL = None
 
 def execute_db_with_retry(config, db_action_func, *args, max_retries=None, initial_backoff=2):
     """
-    Executes a given database operation context. Retries smoothly using 
-    exponential backoff if an Operational or Interface connection timeout occurs.
+    Executes a given database operation on a pooled connection. Retries smoothly using 
+    exponential backoff if an Operational or Interface connection timeout occurs;
+    the faulty connection is discarded rather than returned to the pool.
     """
+    db_pool = get_db_pool(config)
     retries = 0
     backoff = initial_backoff
     
     while True:
         conn = None
+        broken = False
         try:
-            conn = get_db_connection(config)
+            conn = db_pool.getconn()
             result = db_action_func(conn, *args)
             return result
         except (OperationalError, InterfaceError) as e:
+            broken = True
             retries += 1
             if max_retries is not None and retries > max_retries:
                 print(f"\n[DB ERROR] Maximum execution retries ({max_retries}) reached. Skipping operation batch.")
@@ -81,10 +204,12 @@ def execute_db_with_retry(config, db_action_func, *args, max_retries=None, initi
             backoff = min(backoff * 2, 60)  # Caps max waiting limits to 60s
         except Exception as e:
             print(f"\n[CRITICAL ERROR] Non-transient execution failure (Query/Schema bug): {e}")
+            if conn is not None and not conn.closed:
+                conn.rollback()
             raise e
         finally:
-            if conn:
-                conn.close()
+            if conn is not None:
+                db_pool.putconn(conn, close=broken or bool(conn.closed))
 
 def ensure_postgres_table(config):
     """Checks for the table design footprint and initializes it inside PostgreSQL if missing."""
@@ -118,79 +243,186 @@ def ensure_postgres_table(config):
     # This runs infinitely at startup (max_retries=None) until the database is live and reachable
     execute_db_with_retry(config, run_schema, max_retries=None)
 
-def bulk_create_users(user_ids, config, update_memory_maps=True):
+_IDENTITY_FACTORY = None
+
+def get_identity_factory(config):
+    """Loads (or, on first run, generates and caches) the Faker value pools once per process."""
+    global _IDENTITY_FACTORY
+    if _IDENTITY_FACTORY is None:
+        _IDENTITY_FACTORY = IdentityFactory.load_or_generate(
+            config.get('simulation', 'identity_cache_path', fallback='identity_pools.json'),
+            pool_size=config.getint('simulation', 'identity_pool_size', fallback=DEFAULT_POOL_SIZE),
+            seed=config.getint('simulation', 'identity_seed', fallback=DEFAULT_SEED),
+        )
+    return _IDENTITY_FACTORY
+
+USER_PROFILE_COLUMNS = (
+    "user_id", "full_name", "device_id", "home_region", "home_city", "home_state", "home_country",
+    "associated_accounts", "credit_cards", "email", "phone_number", "ssn_or_tax_id", "date_of_birth"
+)
+
+def _pg_text_array(values):
+    # Account and card numbers are plain alphanumerics, so no element quoting is needed.
+    return "{" + ",".join(values) + "}"
+
+def copy_user_records(conn, records):
+    """
+    Streams one chunk of user rows through COPY FROM STDIN (CSV) into a temp staging
+    table, then moves them over with ON CONFLICT (user_id) DO NOTHING -- COPY alone
+    can't skip existing rows, and a restart re-seeds the same user ids.
     """
-    Generates and bulk-inserts multiple users into PostgreSQL in a single batch.
-    Maps to local memory only if update_memory_maps is True.
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for record in records:
+        row = list(record)
+        row[7] = _pg_text_array(row[7])
+        row[8] = _pg_text_array(row[8])
+        writer.writerow(row)
+    buf.seek(0)
+
+    columns = ", ".join(USER_PROFILE_COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS user_profiles_stage "
+            "(LIKE user_profiles INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;"
+        )
+        cur.copy_expert(f"COPY user_profiles_stage ({columns}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(
+            f"INSERT INTO user_profiles ({columns}) SELECT {columns} FROM user_profiles_stage "
+            "ON CONFLICT (user_id) DO NOTHING;"
+        )
+        conn.commit()
+    return len(records)
+
+def home_of(user_number):
     """
+    (region_idx, location_idx) for a user, derived from the user number rather
+    than drawn, so a restart or a backfill run rebuilding the pool agrees with
+    the home already stored in user_profiles.
+    """
+    h = (user_number * 0x9E3779B1) & 0xFFFFFFFF
+    region_idx = (h >> 8) % len(REGION_NAMES)
+    location_idx = (h >> 16) % len(REGIONS[REGION_NAMES[region_idx]])
+    return region_idx, location_idx
+
+def build_user_records(factory, user_numbers, update_memory_maps=True):
+    """user_profiles rows for a batch of user numbers, adding each to USER_POOL if update_memory_maps."""
     db_records = []
-    
-    for user_id in user_ids:
-        full_name = fake.name()
-        associated_accounts = [fake.bban() for _ in range(random.randint(1, 3))]
-        device_id = str(uuid.uuid4())
-        
-        home_region = random.choice(list(REGIONS.keys()))
-        location = random.choice(REGIONS[home_region])
-        
-        credit_cards = [fake.credit_card_number() for _ in range(random.randint(1, 2))]
-        pii_email = fake.unique.email()
-        pii_phone = fake.phone_number()
-        pii_ssn = fake.ssn()
-        pii_dob = fake.date_of_birth(minimum_age=18, maximum_age=75).strftime('%Y-%m-%d')
+    for user_number, identity in zip(user_numbers, factory.identities(user_numbers)):
+        full_name, associated_accounts, device_id, credit_cards, pii_email, pii_phone, pii_ssn, pii_dob = identity
+
+        region_idx, location_idx = home_of(user_number)
+        home_region = REGION_NAMES[region_idx]
+        location = REGIONS[home_region][location_idx]
 
         if update_memory_maps:
-            USER_NAME_MAP[user_id] = full_name
-            USER_ACCOUNT_MAP[user_id] = associated_accounts
-            USER_DEVICE_MAP[user_id] = device_id
-            USER_HOME_REGION[user_id] = home_region
-            USER_HOME_LOCATION[user_id] = location
+            USER_POOL.add(full_name, associated_accounts, device_id, region_idx, location_idx)
 
         db_records.append((
-            user_id, full_name, device_id, home_region, location["city"],
+            format_user_id(user_number), full_name, device_id, home_region, location["city"],
             location["state"], location["country"], associated_accounts,
             credit_cards, pii_email, pii_phone, pii_ssn, pii_dob
         ))
+    return db_records
+
+def bulk_create_users(user_numbers, config, update_memory_maps=True):
+    """
+    Assembles and bulk-inserts multiple users into PostgreSQL.
+    Identities come from the pre-generated pools (see identity_factory.py), keyed
+    by user number, so no Faker calls happen here.
+    Large batches are COPY-loaded in chunks of `copy_chunk_rows`, fanned out over
+    the connection pool so the next chunk is assembled while earlier ones load;
+    small ones (the growth engine's single users) go through one execute_values.
+    Maps to local memory only if update_memory_maps is True. Returns whether the
+    users were stored.
+    """
+    factory = get_identity_factory(config)
+    user_numbers = list(user_numbers)
+    chunk_rows = max(1, config.getint('simulation', 'copy_chunk_rows', fallback=50000))
+
+    def build_records(numbers):
+        return build_user_records(factory, numbers, update_memory_maps)
     
     def run_insert(conn, records):
         with conn.cursor() as cur:
-            insert_query = """
-                INSERT INTO user_profiles (
-                    user_id, full_name, device_id, home_region, home_city, home_state, home_country, 
-                    associated_accounts, credit_cards, email, phone_number, ssn_or_tax_id, date_of_birth
-                ) VALUES %s
+            insert_query = f"""
+                INSERT INTO user_profiles ({", ".join(USER_PROFILE_COLUMNS)}) VALUES %s
                 ON CONFLICT (user_id) DO NOTHING;
             """
             execute_values(cur, insert_query, records)
             conn.commit()
             print(f"Successfully batch-inserted {len(records)} users into Postgres.")
 
+    # For initial baseline, block until success. For dynamic engine growth, use capped retries.
+    retries_allowed = None if update_memory_maps else 4
+
+    if len(user_numbers) < chunk_rows:
+        try:
+            execute_db_with_retry(config, run_insert, build_records(user_numbers), max_retries=retries_allowed)
+        except Exception:
+            print("Warning: Dynamic worker could not store new profile iteration into database due to network exhaustion.")
+            return False
+        return True
+
+    loaders = get_db_pool(config).maxconn
+    started = time.monotonic()
+    loaded = 0
+    # execute_db_with_retry rolls a failed chunk back and returns (or, if the
+    # connection broke, discards) its connection; here the rest of the load is
+    # cancelled and the failure logged, as on the small-batch path.
+    executor = ThreadPoolExecutor(max_workers=loaders)
+    in_flight = []
     try:
-        # For initial baseline, block until success. For dynamic engine growth, use capped retries.
-        retries_allowed = None if update_memory_maps else 4
-        execute_db_with_retry(config, run_insert, db_records, max_retries=retries_allowed)
-    except Exception:
-        print("Warning: Dynamic worker could not store new profile iteration into database due to network exhaustion.")
+        for start in range(0, len(user_numbers), chunk_rows):
+            records = build_records(user_numbers[start:start + chunk_rows])
+            in_flight.append(executor.submit(
+                execute_db_with_retry, config, copy_user_records, records, max_retries=retries_allowed
+            ))
+            # Bound memory: never hold more assembled chunks than there are loaders.
+            if len(in_flight) >= loaders:
+                loaded += in_flight.pop(0).result()
+        while in_flight:
+            loaded += in_flight.pop(0).result()
+    except Exception as e:
+        print(f"Warning: COPY load of user profiles stopped after {loaded} users: {e}")
+        return False
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    elapsed = time.monotonic() - started
+    print(f"Successfully COPY-loaded {loaded} users into Postgres over {loaders} connection(s) "
+          f"in {elapsed:.1f}s ({loaded / max(elapsed, 1e-9):,.0f} rows/s).")
+    return True
 
 def initialize_user_pool(pool_size, config):
     """Initializes the baseline minimum active user pool on startup using rapid bulk insertion."""
-    user_pool = [f"user_{str(i).zfill(4)}" for i in range(1, pool_size + 1)]
+    if pool_size < 2:
+        raise ValueError("user_pool_size must be at least 2 (every payment needs a distinct payee)")
     print(f"Initializing baseline transaction pool of {pool_size} users...")
     
-    # Bulk insert the entire pool over a single connection session
-    bulk_create_users(user_pool, config, update_memory_maps=True)
+    # COPY-loads the pool in parallel chunks over the connection pool. Streaming
+    # must not start with users in USER_POOL that never reached user_profiles.
+    if not bulk_create_users(range(1, pool_size + 1), config, update_memory_maps=True):
+        raise SystemExit("[ERROR] Could not store the baseline user pool in Postgres; not starting the stream.")
         
     print("Baseline active pool successfully built and saved to Postgres.")
-    return user_pool
-
-def get_transaction_location(user_id, is_anomaly):
-    if is_anomaly:
-        home_region = USER_HOME_REGION[user_id]
-        alternate_regions = [r for r in REGIONS.keys() if r != home_region]
-        target_region = random.choice(alternate_regions)
-        return random.choice(REGIONS[target_region])
-    else:
-        return USER_HOME_LOCATION[user_id]
+    return USER_POOL
+
+def load_user_pool(pool_size, config, chunk_rows=100000):
+    """Builds the same baseline pool in memory only, without touching Postgres (offline backfills)."""
+    if pool_size < 2:
+        raise ValueError("user_pool_size must be at least 2 (every payment needs a distinct payee)")
+    factory = get_identity_factory(config)
+    for start in range(1, pool_size + 1, chunk_rows):
+        build_user_records(factory, range(start, min(start + chunk_rows, pool_size + 1)))
+    return USER_POOL
+
+def grow_user_pool(pool_size, factory):
+    """
+    Appends users len(USER_POOL) + 1 .. pool_size to this process's pool. Identities
+    are derived from the user number, so a worker rebuilds exactly the profiles the
+    parent's growth engine stored, without reading them back from Postgres.
+    """
+    build_user_records(factory, range(len(USER_POOL) + 1, pool_size + 1))
 
 def ensure_kafka_topic(producer_config, topic_name):
     admin_client = AdminClient(producer_config)
@@ -205,38 +437,119 @@ def ensure_kafka_topic(producer_config, topic_name):
     else:
         print(f"Topic '{topic_name}' ready.")
 
-AVRO_SCHEMA_STR = """
-{
-  "type": "record",
-  "name": "Payment",
-  "namespace": "com.example.payments",
-  "fields": [
-    {"name": "transaction_id", "type": "string"},
-    {"name": "user_id", "type": "string"},
-    {"name": "user_name", "type": "string"},
-    {"name": "device_id", "type": "string"},
-    {"name": "payer_account_no", "type": "string"},
-    {"name": "payee_account_no", "type": "string"},
-    {"name": "category", "type": "string"},
-    {"name": "payment_method", "type": "string"},
-    {"name": "amount", "type": "double"},
-    {"name": "currency", "type": "string"},
-    {"name": "timestamp", "type": "long"},
-    {
-      "name": "address",
-      "type": {
-        "type": "record",
-        "name": "AddressRecord",
-        "fields": [
-          {"name": "city", "type": "string"},
-          {"name": "state", "type": "string"},
-          {"name": "country", "type": "string"}
-        ]
-      }
+class TokenBucket:
+    """
+    Rate controller paced against absolute deadlines: token k falls due at
+    start + k / rate, so when an event (or a GC pause, or a slow flush) runs late
+    the following events are released immediately to make up the shortfall,
+    instead of every event sleeping a fixed interval and the loss compounding.
+    Catch-up is capped at `burst` tokens so a long stall doesn't turn into an
+    unbounded spike afterwards. Idle time until the next token is spent in
+    `wait(seconds)` -- the producer's poll, so delivery reports drain while
+    the worker would otherwise sleep.
+    """
+    def __init__(self, rate, burst=None, wait=time.sleep):
+        self.interval = 1.0 / rate
+        self.burst = burst if burst is not None else max(1.0, rate)  # ~1s of backlog
+        self.wait = wait
+        self.next_due = time.monotonic()
+
+    def take(self, max_tokens):
+        """Blocks until at least one token is due, then claims up to max_tokens that are."""
+        now = time.monotonic()
+        earliest = now - self.burst * self.interval
+        if self.next_due < earliest:
+            self.next_due = earliest
+        while self.next_due > now:
+            # poll() returns early once it serves a callback, so keep waiting
+            self.wait(self.next_due - now)
+            now = time.monotonic()
+        due = min(max_tokens, int((now - self.next_due) / self.interval) + 1)
+        self.next_due += due * self.interval
+        return due
+
+def payment_record(user_pool, payer_idx, payee_account, amount, location,
+                   device_id=None, payment_method=None, category=None):
+    """
+    One Payment record (payment_encoder.AVRO_SCHEMA_STR) from the payer's slot.
+    The payer's registered device, a random payment method and a random category
+    are used unless given.
+    """
+    return {
+        # From the (seedable) random module rather than uuid4, so a seeded backfill repeats its ids
+        "transaction_id": str(uuid.UUID(int=random.getrandbits(128), version=4)),
+        "user_id": user_pool.user_id(payer_idx),
+        "user_name": user_pool.names[payer_idx],
+        "device_id": device_id or user_pool.device_id(payer_idx),
+        "payer_account_no": random.choice(user_pool.accounts[payer_idx]),
+        "payee_account_no": payee_account,
+        "category": category or random.choice(CATEGORIES),
+        "payment_method": payment_method or random.choice(PAYMENT_METHODS),
+        "amount": amount,
+        "currency": "USD",
+        "timestamp": int(time.time() * 1000),
+        "address": {
+            "city": location["city"],
+            "state": location["state"],
+            "country": location["country"]
+        }
     }
-  ]
-}
-"""
+
+# Events produced per pacing step: large enough to amortize the token-bucket
+# and poll() overhead at tens of thousands of TPS, small enough that a batch
+# never spans more than a few milliseconds of schedule.
+PRODUCE_BATCH_SIZE = 100
+
+def stream_worker(worker_id, num_workers, producer_config, topic_name, schema_registry_config,
+                  worker_tps, anomaly_threshold, label_config, produced_counts, metrics, stop_event,
+                  pool_size, identity_factory):
+    """
+    One generator process: owns the payer slice [lo, hi) of the fork-inherited
+    USER_POOL, its own AdaptiveProducer (reporting into its row of the
+    MetricsBoard), serializer and FraudScenarioEngine, and
+    1/num_workers of the target rate. Payees are still drawn from the whole pool. Each
+    pacing step's events are Avro-encoded together in one PaymentEncoder batch, and
+    their fraud labels (if enabled) go to the label topic or this worker's label file.
+    When the parent stores growth users it raises pool_size; every worker then adds
+    them to its pool as payees, and the last worker's slice extends over them as payers.
+    """
+    # Forked children inherit the parent's RNG state -- without a reseed every
+    # worker would emit the exact same event sequence.
+    random.seed()
+    user_pool = USER_POOL
+    lo = worker_id * len(user_pool) // num_workers
+    hi = (worker_id + 1) * len(user_pool) // num_workers
+
+    encoder = PaymentEncoder(SchemaRegistryClient(schema_registry_config), topic_name)
+    producer = AdaptiveProducer(producer_config, worker_tps, gauges=metrics.row(worker_id))
+    bucket = TokenBucket(worker_tps, wait=producer.poll)
+    engine = FraudScenarioEngine(user_pool, lo, hi, 1.0 - anomaly_threshold, payment_record, REGIONS)
+    labels = LabelSink(
+        producer=producer,
+        topic=label_config["topic"] if label_config["sink"] == "topic" else None,
+        path=f"{label_config['path']}.{worker_id}.jsonl" if label_config["sink"] == "file" else None,
+    )
+
+    try:
+        while not stop_event.is_set():
+            if pool_size.value > len(user_pool):
+                grow_user_pool(pool_size.value, identity_factory)
+                if worker_id == num_workers - 1:
+                    engine.extend(len(user_pool))
+            due = bucket.take(PRODUCE_BATCH_SIZE)
+            events = engine.next_batch(due)
+            payments = [payment for payment, _label in events]
+            for payment_data, value in zip(payments, encoder.encode_batch(payments)):
+                producer.produce(topic=topic_name, key=payment_data["user_id"], value=value)
+            labels.write(label for _payment, label in events)
+            producer.poll(0)
+            producer.maybe_retune()
+            produced_counts[worker_id] += due
+    except KeyboardInterrupt:
+        pass
+    finally:
+        producer.flush()
+        labels.close()
 
 def main():
     config = configparser.ConfigParser()
@@ -245,6 +558,9 @@ def main():
     target_tps = config.getint('simulation', 'target_tps')
     valid_percentage = config.getfloat('simulation', 'valid_transaction_percentage')
     user_pool_size = config.getint('simulation', 'user_pool_size')
+    num_workers = config.getint('simulation', 'workers', fallback=1)
+    report_interval = config.getfloat('simulation', 'report_interval_seconds', fallback=10.0)
+    metrics_port = config.getint('simulation', 'metrics_port', fallback=8000)
     
     anomaly_threshold = valid_percentage / 100.0
 
@@ -254,97 +570,90 @@ def main():
     # Initialize Baseline Active transaction pool via Bulk Action
     user_pool = initialize_user_pool(user_pool_size, config)
     next_user_index = user_pool_size + 1
-
-    schema_registry_client = SchemaRegistryClient(dict(config['schema_registry']))
-    avro_serializer = AvroSerializer(schema_registry_client, AVRO_SCHEMA_STR)
+    num_workers = max(1, min(num_workers, len(user_pool)))
 
     producer_config = dict(config['kafka'])
     topic_name = producer_config.pop('topic.name') 
     ensure_kafka_topic(producer_config, topic_name)
 
-    producer_config['linger.ms'] = 10 
-    producer = Producer(producer_config)
+    # Ground-truth labels for every fraud-scenario event: "topic", "file" or "none"
+    label_config = {
+        "sink": config.get('simulation', 'fraud_labels', fallback='none'),
+        "topic": config.get('simulation', 'fraud_labels_topic', fallback=f"{topic_name}-fraud-labels"),
+        "path": config.get('simulation', 'fraud_labels_path', fallback='fraud_labels'),
+    }
+    if label_config["sink"] == "topic":
+        ensure_kafka_topic(producer_config, label_config["topic"])
+
+    # fork, not spawn: workers inherit the fully built USER_POOL instead of
+    # re-seeding or pickling it. Each worker opens its own Kafka client after the fork.
+    # Workers never touch Postgres, so the seeding connections are closed first
+    # and only the parent reopens a pool (for the growth engine).
+    close_db_pool()
+    ctx = multiprocessing.get_context("fork")
+    stop_event = ctx.Event()
+    produced_counts = ctx.Array('q', num_workers, lock=False)
+    pool_size = ctx.Value('q', len(user_pool), lock=False)  # users stored so far, growth included
+    metrics = MetricsBoard(ctx, num_workers)
+    workers = [
+        ctx.Process(
+            target=stream_worker,
+            args=(i, num_workers, producer_config, topic_name, dict(config['schema_registry']),
+                  target_tps / num_workers, anomaly_threshold, label_config, produced_counts, metrics, stop_event,
+                  pool_size, get_identity_factory(config)),
+            daemon=True,
+        )
+        for i in range(num_workers)
+    ]
 
-    print(f"Streaming data at {target_tps} TPS...")
-    interval = 1.0 / target_tps
+    print(f"Streaming data at {target_tps} TPS across {num_workers} worker process(es)...")
+    for worker in workers:
+        worker.start()
+    # Only once every worker is forked, so no child inherits the server thread.
+    if metrics_port:
+        metrics.serve(metrics_port, extra=lambda: [
+            ("payments_produced_total", "counter", dict(enumerate(produced_counts))),
+        ])
     
     last_user_addition_time = time.time()
     user_addition_interval = 60.0  # 1 minute
+    last_report_time = time.monotonic()
+    last_report_count = 0
 
     try:
-        while True:
-            start_time = time.time()
+        while all(worker.is_alive() for worker in workers):
+            time.sleep(min(1.0, report_interval))
+            now = time.time()
 
-            # --- DB-ONLY BACKGROUND GROWING ENGINE (1 user / minute) ---
-            if start_time - last_user_addition_time >= user_addition_interval:
-                new_user_id = f"user_{str(next_user_index).zfill(4)}"
-                print(f"\n[DB Growth Only] Writing new registration directly to DB: {new_user_id}")
-                
-                # Wrapped in custom error tolerance behavior so streaming remains real-time
-                bulk_create_users([new_user_id], config, update_memory_maps=False)
+            # --- BACKGROUND GROWING ENGINE (1 user / minute) ---
+            if now - last_user_addition_time >= user_addition_interval:
+                print(f"\n[Growth] Registering new user: {format_user_id(next_user_index)}")
                 
-                next_user_index += 1
-                last_user_addition_time = start_time
-
-            # --- SIMULATION EVENT ENGINE ---
-            payer_id = random.choice(user_pool)
-            payee_id = random.choice([u for u in user_pool if u != payer_id])
-
-            user_name = USER_NAME_MAP[payer_id]
-            payer_account = random.choice(USER_ACCOUNT_MAP[payer_id])
-            payee_account = random.choice(USER_ACCOUNT_MAP[payee_id])
-            device_id = USER_DEVICE_MAP[payer_id] 
-            
-            category = random.choice(CATEGORIES)
-            payment_method = random.choice(PAYMENT_METHODS)
-            
-            is_anomaly = random.random() > anomaly_threshold
-            location = get_transaction_location(payer_id, is_anomaly)
-            
-            if is_anomaly and random.random() > 0.90:
-                device_id = str(uuid.uuid4())
-                amount = float(random.randint(2500, 15000))
-            elif is_anomaly:
-                amount = float(random.randint(2500, 15000))
-            else:
-                amount = float(fake.random_int(min=5, max=1000))
-
-            payment_data = {
-                "transaction_id": str(uuid.uuid4()),
-                "user_id": payer_id,
-                "user_name": user_name,
-                "device_id": device_id,
-                "payer_account_no": payer_account,
-                "payee_account_no": payee_account,
-                "category": category,
-                "payment_method": payment_method,
-                "amount": amount,
-                "currency": "USD",
-                "timestamp": int(time.time() * 1000),
-                "address": {
-                    "city": location["city"],
-                    "state": location["state"],
-                    "country": location["country"]
-                }
-            }
-
-            ctx = SerializationContext(topic_name, MessageField.VALUE)
-            producer.produce(
-                topic=topic_name,
-                key=payment_data["user_id"],
-                value=avro_serializer(payment_data, ctx)
-            )
-            producer.poll(0)
-
-            elapsed = time.time() - start_time
-            sleep_time = interval - elapsed
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+                # Wrapped in custom error tolerance behavior so streaming remains real-time.
+                # Only once the row is stored do the workers start transacting as the user;
+                # a failed insert is retried with the same user number next interval.
+                if bulk_create_users([next_user_index], config, update_memory_maps=False):
+                    pool_size.value = next_user_index
+                    next_user_index += 1
+                last_user_addition_time = now
+
+            # --- THROUGHPUT REPORT ---
+            elapsed = time.monotonic() - last_report_time
+            if elapsed >= report_interval:
+                total = sum(produced_counts)
+                achieved = (total - last_report_count) / elapsed
+                print(f"[Throughput] achieved {achieved:,.0f} TPS vs target {target_tps:,} TPS "
+                      f"({achieved / target_tps:.0%}), {total:,} events total")
+                last_report_time += elapsed
+                last_report_count = total
+        print("\n[ERROR] A stream worker exited unexpectedly; shutting down.")
 
     except KeyboardInterrupt:
         print("\nStopping stream...")
     finally:
-        producer.flush()
+        stop_event.set()
+        for worker in workers:
+            worker.join(timeout=30)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
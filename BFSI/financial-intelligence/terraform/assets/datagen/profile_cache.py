@@ -0,0 +1,294 @@
+"""
+In-memory user_profiles lookups for enrichment consumers (fraud_scorer.py).
+
+Looking a profile up in Postgres per payment is a network round-trip per
+event. ProfileCache keeps the non-PII enrichment columns in an LRU map with a
+TTL instead:
+
+- warm_up() bulk-loads the newest `capacity` profiles with a server-side
+  cursor, so steady-state lookups never touch the database;
+- a miss loads the user from Postgres (get_many() batches misses into one
+  query); users that don't exist yet are cached as None for a short
+  NEGATIVE_TTL_SECONDS, so a flood of events for one unknown user costs one
+  query, not one per event;
+- new and changed profiles arrive either by polling created_at
+  (start_polling) or from the Debezium CDC topic (start_cdc). CDC values are
+  CSFLE-encrypted, so only the message key (the user_id) is used, as a
+  signal to reload that row.
+
+Lookups take one lock around an OrderedDict get and move_to_end, which is
+good for well over 100k lookups/sec in one process.
+
+The generator doesn't use it: its workers derive every profile, growth users
+included, from the user number (see payments.grow_user_pool), so they never
+read user_profiles back.
+"""
+import io
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import psycopg2
+from fastavro import parse_schema, schemaless_reader
+from psycopg2 import OperationalError, InterfaceError
+
+PROFILE_COLUMNS = (
+    "user_id", "full_name", "device_id", "home_region", "home_city", "home_state",
+    "home_country", "associated_accounts", "created_at",
+)
+Profile = namedtuple("Profile", PROFILE_COLUMNS)
+
+DEFAULT_CAPACITY = 1_000_000
+DEFAULT_TTL_SECONDS = 3600
+NEGATIVE_TTL_SECONDS = 30
+# Rows get created_at = their transaction's *start* time but only become
+# visible at commit, so each poll looks back this far past the watermark to
+# catch a slow commit; re-reading a row is harmless. Kept short because every
+# row in the overlap is re-read on every poll.
+REFRESH_OVERLAP_SECONDS = 5
+
+CDC_TOPIC = "psql.public.user_profiles"
+# Debezium's key for user_profiles: a record with the primary key column.
+CDC_KEY_SCHEMA = parse_schema({
+    "type": "record",
+    "name": "Key",
+    "namespace": "psql.public.user_profiles",
+    "fields": [{"name": "user_id", "type": "string"}],
+})
+
+_SELECT = f"SELECT {', '.join(PROFILE_COLUMNS)} FROM user_profiles"
+
+
+class ProfileCache:
+    def __init__(self, connect, capacity=DEFAULT_CAPACITY, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self._connect = connect
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (expires_at, Profile or None)
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.watermark = None  # newest created_at seen
+        self.hits = 0
+        self.misses = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    @classmethod
+    def from_config(cls, config):
+        """Built from config.ini's [postgresql] section plus optional [profile_cache] settings."""
+        def connect():
+            return psycopg2.connect(
+                host=config.get('postgresql', 'host', fallback='localhost'),
+                database=config.get('postgresql', 'database', fallback='payments_db'),
+                user=config.get('postgresql', 'user', fallback='postgres'),
+                password=config.get('postgresql', 'password', fallback='postgres'),
+                port=config.get('postgresql', 'port', fallback='5432'),
+                connect_timeout=5
+            )
+        return cls(
+            connect,
+            capacity=config.getint('profile_cache', 'capacity', fallback=DEFAULT_CAPACITY),
+            ttl_seconds=config.getfloat('profile_cache', 'ttl_seconds', fallback=DEFAULT_TTL_SECONDS),
+        )
+
+    # --- lookups ---------------------------------------------------------
+
+    def get(self, user_id, load=True):
+        """The user's Profile, or None if there is no such user (or load=False and it isn't cached)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        if not load:
+            return None
+        return self._load([user_id]).get(user_id)
+
+    def get_many(self, user_ids):
+        """{user_id: Profile or None}, loading every miss in a single query."""
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    found[user_id] = entry[1]
+                else:
+                    self.misses += 1
+                    missing.append(user_id)
+        if missing:
+            found.update(self._load(missing))
+        return found
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else None,
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+            }
+
+    # --- loading ---------------------------------------------------------
+
+    def warm_up(self, limit=None):
+        """Bulk-loads the newest `limit` (default: capacity) profiles. Returns the number loaded."""
+        limit = self.capacity if limit is None else min(limit, self.capacity)
+
+        def run(conn):
+            loaded = 0
+            with conn.cursor(name="profile_cache_warm_up") as cur:
+                cur.itersize = 50_000
+                cur.execute(f"{_SELECT} ORDER BY created_at DESC LIMIT %s", (limit,))
+                while True:
+                    rows = cur.fetchmany(50_000)
+                    if not rows:
+                        break
+                    self._store([Profile(*row) for row in rows])
+                    loaded += len(rows)
+            conn.commit()
+            return loaded
+
+        started = time.monotonic()
+        loaded = self._with_connection(run)
+        print(f"[ProfileCache] Warmed up {loaded:,} profiles in {time.monotonic() - started:.1f}s.")
+        return loaded
+
+    def refresh(self):
+        """Loads profiles created since the last watermark (minus the overlap). Returns rows read."""
+        def run(conn):
+            with conn.cursor() as cur:
+                if self.watermark is None:
+                    cur.execute(f"{_SELECT} ORDER BY created_at DESC LIMIT %s", (self.capacity,))
+                else:
+                    cur.execute(
+                        f"{_SELECT} WHERE created_at > %s - make_interval(secs => %s) ORDER BY created_at",
+                        (self.watermark, REFRESH_OVERLAP_SECONDS),
+                    )
+                rows = cur.fetchall()
+            conn.commit()
+            return rows
+
+        rows = self._with_connection(run)
+        self._store([Profile(*row) for row in rows])
+        return len(rows)
+
+    def _load(self, user_ids):
+        def run(conn):
+            with conn.cursor() as cur:
+                cur.execute(f"{_SELECT} WHERE user_id = ANY(%s)", (list(user_ids),))
+                rows = cur.fetchall()
+            conn.commit()
+            return rows
+
+        profiles = {row[0]: Profile(*row) for row in self._with_connection(run)}
+        self._store(profiles.values())
+        absent = [user_id for user_id in user_ids if user_id not in profiles]
+        if absent:
+            expires_at = time.monotonic() + NEGATIVE_TTL_SECONDS
+            with self._lock:
+                for user_id in absent:
+                    self._entries[user_id] = (expires_at, None)
+                self._evict()
+        return {user_id: profiles.get(user_id) for user_id in user_ids}
+
+    def _store(self, profiles):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for profile in profiles:
+                self._entries[profile.user_id] = (expires_at, profile)
+                self._entries.move_to_end(profile.user_id)
+                if profile.created_at is not None and (self.watermark is None or profile.created_at > self.watermark):
+                    self.watermark = profile.created_at
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def _with_connection(self, action):
+        """Runs action(conn) on the cache's own connection, reconnecting once if it dropped."""
+        with self._db_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._conn is None or self._conn.closed:
+                        self._conn = self._connect()
+                    return action(self._conn)
+                except (OperationalError, InterfaceError):
+                    if self._conn is not None:
+                        self._conn.close()
+                    self._conn = None
+                    if attempt == 2:
+                        raise
+
+    # --- background refresh ----------------------------------------------
+
+    def start_polling(self, interval_seconds=5.0):
+        """Calls refresh() every interval on a daemon thread."""
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[ProfileCache] Refresh failed, retrying next interval: {e}")
+        self._start_thread(loop, "profile-cache-poll")
+
+    def start_cdc(self, consumer_config, topic=CDC_TOPIC):
+        """Reloads every user_id that shows up in the Debezium topic's message keys."""
+        from confluent_kafka import Consumer
+
+        consumer_config = dict(consumer_config)
+        consumer_config.pop('topic.name', None)
+        consumer_config.setdefault("group.id", "payments-profile-cache")
+        consumer_config.setdefault("auto.offset.reset", "latest")
+        consumer_config.setdefault("enable.auto.commit", False)
+
+        def loop():
+            consumer = Consumer(consumer_config)
+            consumer.subscribe([topic])
+            try:
+                while not self._stop.is_set():
+                    changed, deleted = set(), set()
+                    for msg in consumer.consume(num_messages=1000, timeout=1.0):
+                        if msg.error() or not msg.key():
+                            continue
+                        # Skip the 5-byte Confluent header (magic byte + schema id).
+                        user_id = schemaless_reader(io.BytesIO(msg.key()[5:]), CDC_KEY_SCHEMA)["user_id"]
+                        (deleted if msg.value() is None else changed).add(user_id)
+                    self.invalidate(deleted)
+                    if changed:
+                        try:
+                            self._load(list(changed))
+                        except Exception as e:
+                            print(f"[ProfileCache] CDC reload failed, dropping {len(changed)} entries: {e}")
+                            self.invalidate(changed)
+            finally:
+                consumer.close()
+        self._start_thread(loop, "profile-cache-cdc")
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -523,6 +523,9 @@ port     = ${var.postgres_database_port}
 target_tps                   = 10
 valid_transaction_percentage = 95.0
 user_pool_size               = 100
+workers                      = 1
+fraud_labels                 = topic
+metrics_port                 = 8000
 EOT
   depends_on = [aws_db_instance.postgres_db]
 }
@@ -541,6 +544,12 @@ resource "docker_container" "python_datagen_app_container" {
   name  = "${var.project_name}-datagen-container"
   image = docker_image.python_datagen_app.image_id
 
+  # Producer metrics (Prometheus text) at http://localhost:8000/metrics
+  ports {
+    internal = 8000
+    external = 8000
+  }
+
   depends_on = [
     docker_image.python_datagen_app
   ]
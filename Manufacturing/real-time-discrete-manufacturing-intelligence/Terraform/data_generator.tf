@@ -15,10 +15,19 @@ resource "docker_container" "data_generator_container" {
     "DB_HOST=${aws_db_instance.postgres_db.address}",
     "DB_USER=${var.postgres_user}",
     "DB_PASSWORD=${var.postgres_password}",
-    "DB_NAME=${var.postgres_db_name}"
+    "DB_NAME=${var.postgres_db_name}",
+    "SINK=${var.sensor_events_sink}",
+    "SENSOR_EVENTS_TOPIC=${var.sensor_events_topic}",
+    "EQUIPMENT_HEALTH_ALERTS_TOPIC=${var.equipment_health_alerts_topic}",
+    "KAFKA_BOOTSTRAP_SERVERS=${trimprefix(confluent_kafka_cluster.main.bootstrap_endpoint, "SASL_SSL://")}",
+    "KAFKA_API_KEY=${confluent_api_key.kafka_admin.id}",
+    "KAFKA_API_SECRET=${confluent_api_key.kafka_admin.secret}",
+    "SCHEMA_REGISTRY_URL=${data.confluent_schema_registry_cluster.essentials.rest_endpoint}",
+    "SCHEMA_REGISTRY_API_KEY=${try(confluent_api_key.schema_registry[0].id, "")}",
+    "SCHEMA_REGISTRY_API_SECRET=${try(confluent_api_key.schema_registry[0].secret, "")}"
   ]
   start      = true
   restart    = "on-failure"
   must_run   = true
-  depends_on = [aws_db_instance.postgres_db,null_resource.run_postgres_initial]
+  depends_on = [aws_db_instance.postgres_db,null_resource.run_postgres_initial,confluent_schema.sensor_events_value,confluent_schema.equipment_health_alerts_value]
 }
@@ -1,16 +1,22 @@
 # Steps to run this file
 # python3 -m venv path/to/venv
 # source path/to/venv/bin/activate
-# python3 -m pip install psycopg2-binary faker
+# python3 -m pip install psycopg2-binary faker python-dotenv  (plus "confluent-kafka[avro]" for SINK=kafka)
 # python3 manufacturing_data_simulator.py
 
+import io
+import csv
+import multiprocessing
 import psycopg2
 import random
 import time
-import uuid
+from collections import deque
 from datetime import datetime, timedelta, timezone
 from faker import Faker
-from psycopg2 import sql
+from psycopg2 import sql, OperationalError, InterfaceError
+from psycopg2.extras import execute_values
+from shopfloor_model import ShopFloor
+from equipment_health import EquipmentHealth, format_alert
 from dotenv import load_dotenv
 import os
 
@@ -26,11 +32,46 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD")
 }
 
-TOTAL_EVENTS = 5000
-EVENT_INTERVAL = 0.1  # High speed generation
+TOTAL_EVENTS = int(os.getenv("TOTAL_EVENTS", "5000"))               # 0 = run until stopped
+SIM_SPEED = float(os.getenv("SIM_SPEED", "1"))                    # simulated seconds per wall second; 0 = unpaced
+SIM_SEED = os.getenv("SIM_SEED")                                  # set for a reproducible run
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "500"))                  # events per INSERT/COPY
+FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL_MS", "500")) / 1000  # max age of a buffered event
+WRITE_METHOD = os.getenv("WRITE_METHOD", "copy")                  # "copy" or "values"
+EQUIPMENT_HEALTH = os.getenv("EQUIPMENT_HEALTH", "1") == "1"      # streaming early-warning detector
 faker = Faker()
 
-ROUTING_STAGES = ["Material Receipt", "Pre-Processing", "Fabrication", "Assembly", "Quality Inspection", "Packing"]
+# Where sensor events go: "postgres" (picked up by the CDC connector) or "kafka"
+# (produced straight to SENSOR_EVENTS_TOPIC). Work orders always go to Postgres.
+SINK = os.getenv("SINK", "postgres")
+SENSOR_EVENTS_TOPIC = os.getenv("SENSOR_EVENTS_TOPIC", "sensor_events")
+ALERTS_TOPIC = os.getenv("EQUIPMENT_HEALTH_ALERTS_TOPIC", "equipment_health_alerts")
+COMPRESSION = os.getenv("COMPRESSION", "lz4")
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
+KAFKA_API_KEY = os.getenv("KAFKA_API_KEY")
+KAFKA_API_SECRET = os.getenv("KAFKA_API_SECRET")
+SCHEMA_REGISTRY_URL = os.getenv("SCHEMA_REGISTRY_URL")
+SCHEMA_REGISTRY_API_KEY = os.getenv("SCHEMA_REGISTRY_API_KEY")
+SCHEMA_REGISTRY_API_SECRET = os.getenv("SCHEMA_REGISTRY_API_SECRET")
+SENSOR_EVENT_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensor_event.avsc")
+ALERT_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "equipment_health_alert.avsc")
+
+# Topology: PLANTS x LINES_PER_PLANT lines, each starting with WORK_ORDERS_PER_LINE
+# work orders, split over WORKERS processes. The default is the original single
+# plant with LINE-1..5 and the five sample work orders.
+PLANTS = int(os.getenv("PLANTS", "1"))
+LINES_PER_PLANT = int(os.getenv("LINES_PER_PLANT", "5"))
+WORK_ORDERS_PER_LINE = int(os.getenv("WORK_ORDERS_PER_LINE", "1"))
+WORKERS = int(os.getenv("WORKERS", "1"))
+TAKT_SECONDS = float(os.getenv("TAKT_SECONDS", "3"))               # mean seconds between items per line
+
+PRODUCTS = [("Engine", "PRD-1001"), ("Electrical", "PRD-1002"), ("Chassis", "PRD-1003"),
+            ("Body", "PRD-1004"), ("Paint", "PRD-1005")]
+
+def line_names():
+    if PLANTS == 1:
+        return [f"LINE-{l}" for l in range(1, LINES_PER_PLANT + 1)]
+    return [f"PLANT-{p:02d}-LINE-{l}" for p in range(1, PLANTS + 1) for l in range(1, LINES_PER_PLANT + 1)]
 
 # ---------------------------------------------------------
 # DATABASE SETUP
@@ -49,6 +90,7 @@ def reset_tables():
         # 1. Clear streaming data & metrics
         tables_to_clear = [
             "sensor_events",
+            "equipment_health_alerts",
             "production_metrics_sink",
             "production_metrics_history"
         ]
@@ -88,72 +130,395 @@ def create_sample_work_orders():
     conn.commit()
     cur.close()
     conn.close()
-    return [w[0] for w in work_orders]
+    return [(w[0], w[3]) for w in work_orders]
+
+def generate_work_order(line_name, seq, start):
+    """A work order row for one line, sized to run a few hours at TAKT_SECONDS."""
+    category, code = random.choice(PRODUCTS)
+    planned_quantity = random.randint(30, 60) * 100
+    hours = planned_quantity * TAKT_SECONDS / 3600
+    return (f"WO-{line_name}-{seq:04d}", category, code, planned_quantity, start, start + timedelta(hours=hours * 1.2))
+
+def insert_work_orders(conn, work_orders):
+    with conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO work_orders (workorder_id, product_category, product_code, planned_quantity, start_date, end_date)
+            VALUES %s ON CONFLICT (workorder_id) DO NOTHING;
+        """, work_orders)
+    conn.commit()
+
+def create_work_orders(lines):
+    """{line_number: [(workorder_id, planned_quantity), ...]} for the configured topology."""
+    plan = {line: [] for line in lines}
+    if PLANTS == 1 and LINES_PER_PLANT == 5 and WORK_ORDERS_PER_LINE == 1:
+        for i, work_order in enumerate(create_sample_work_orders()):
+            plan[lines[i % len(lines)]].append(work_order)
+        return plan
+
+    now = datetime.now(timezone.utc)
+    rows = []
+    for line in lines:
+        start = now
+        for seq in range(1, WORK_ORDERS_PER_LINE + 1):
+            row = generate_work_order(line, seq, start)
+            rows.append(row)
+            plan[line].append((row[0], row[3]))
+            start = row[5]
+    conn = get_connection()
+    try:
+        for i in range(0, len(rows), 1000):
+            insert_work_orders(conn, rows[i:i + 1000])
+    finally:
+        conn.close()
+    return plan
 
 # ---------------------------------------------------------
 # GENERATOR LOGIC
 # ---------------------------------------------------------
-def generate_sensor_event(workorder_ids):
-    workorder_id = random.choice(workorder_ids)
-    item_id = str(uuid.uuid4())
-    batch_number = f"BATCH-{random.randint(1,10):02d}"
-    line_number = f"LINE-{random.randint(1,5)}"
-    routing_stage = random.choice(ROUTING_STAGES)
-    operator_id = f"OP{random.randint(100, 120)}"
-
-    # Simulate Physics
-    temperature = round(random.gauss(80, 15), 2)
-    pressure = round(random.gauss(120, 20), 2)
-
-    # Defect Logic
-    is_defective = False
-    defect_reason = None
-
-    if temperature > 110:
-        is_defective = True
-        defect_reason = "Thermal Issue"
-    elif pressure > 160 or pressure < 80:
-        is_defective = True
-        defect_reason = "Pressure Variance"
-    elif random.random() < 0.05:
-        is_defective = True
-        defect_reason = random.choice(["Alignment Error", "Material Fracture", "Software Glitch"])
-
-    event = {
-        "workorder_id": workorder_id,
-        "item_id": item_id,
-        "batch_number": batch_number,
-        "line_number": line_number,
-        "routing_stage": routing_stage,
-        "temperature": temperature,
-        "pressure": pressure,
-        "is_defective": is_defective,
-        "defect_reason": defect_reason,
-        "operator_id": operator_id,
-        "sensor_timestamp": datetime.now(timezone.utc)
-    }
-    return event
-
-def insert_sensor_event(event):
-    conn = get_connection()
-    cur = conn.cursor()
-    # Note: 'event_id' is SERIAL, so we do not insert it manually.
-    insert_query = """
-        INSERT INTO sensor_events (
-            workorder_id, item_id, batch_number, line_number, routing_stage,
-            temperature, pressure, is_defective, defect_reason, operator_id, sensor_timestamp
-        )
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);
+# Note: 'event_id' is SERIAL, so we do not insert it manually.
+SENSOR_EVENT_COLUMNS = (
+    "workorder_id", "item_id", "batch_number", "line_number", "routing_stage",
+    "temperature", "pressure", "is_defective", "defect_reason", "operator_id", "sensor_timestamp"
+)
+# Alerts from equipment_health.py, as stored in equipment_health_alerts ('alert_id' is SERIAL)
+ALERT_COLUMNS = (
+    "kind", "line_number", "routing_stage", "signal", "limit_value", "value", "level",
+    "slope_per_min", "lead_seconds", "sensor_timestamp", "alert_timestamp"
+)
+
+LATENCY_SAMPLES = 10000
+
+class WriteLatency:
     """
-    cur.execute(insert_query, (
-        event["workorder_id"], event["item_id"], event["batch_number"],
-        event["line_number"], event["routing_stage"], event["temperature"],
-        event["pressure"], event["is_defective"], event["defect_reason"],
-        event["operator_id"], event["sensor_timestamp"]
-    ))
-    conn.commit()
-    cur.close()
-    conn.close()
+    Latency from write() until an event is durable -- committed to Postgres, or
+    acknowledged by the Kafka brokers -- over the last LATENCY_SAMPLES events.
+    Both sinks measure the same span, so their numbers can be compared directly.
+    """
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return "latency n/a"
+        ordered = sorted(self.samples)
+        p50 = ordered[len(ordered) // 2] * 1000
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+        return f"latency p50 {p50:,.0f} ms / p99 {p99:,.0f} ms"
+
+class SensorEventWriter:
+    """
+    Streams sensor events into Postgres over one long-lived connection.
+    Events are buffered and written as one micro-batch -- a COPY or a multi-row
+    INSERT in a single transaction -- once BATCH_SIZE events are waiting or the
+    oldest has waited FLUSH_INTERVAL, instead of a connect/insert/commit per event.
+    Equipment-health alerts go into equipment_health_alerts in the same
+    transaction; an alert flushes the batch right away rather than waiting for it.
+    alert_latency is measured from generating the event that raised an alert to
+    the alert's commit.
+    """
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, method=WRITE_METHOD):
+        if method not in ("copy", "values"):
+            raise ValueError(f"WRITE_METHOD must be 'copy' or 'values', not {method!r}")
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.method = method
+        self.conn = None
+        self.buffer = []
+        self.buffered_at = []
+        self.alerts = []
+        self.written = 0
+        self.alerts_written = 0
+        self.latency = WriteLatency()
+        self.alert_latency = WriteLatency()
+
+    def write(self, event):
+        self.buffered_at.append(time.monotonic())
+        self.buffer.append(tuple(event[column] for column in SENSOR_EVENT_COLUMNS))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def write_alert(self, alert, generated):
+        """`generated` is the time.monotonic() at which the alert's sensor event was generated."""
+        self.alerts.append((generated, tuple(alert[column] for column in ALERT_COLUMNS)))
+        self.flush()
+
+    def flush_if_due(self):
+        """Flushes a partial batch once its oldest event has waited flush_interval."""
+        if self.buffer and time.monotonic() - self.buffered_at[0] >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer and not self.alerts:
+            return
+        rows, self.buffer = self.buffer, []
+        buffered_at, self.buffered_at = self.buffered_at, []
+        alerts, self.alerts = self.alerts, []
+        # One reconnect: the connection may have gone stale (RDS failover, idle timeout).
+        for attempt in (1, 2):
+            try:
+                if self.conn is None or self.conn.closed:
+                    self.conn = get_connection()
+                with self.conn.cursor() as cur:
+                    if rows and self.method == "copy":
+                        self._copy(cur, rows)
+                    elif rows:
+                        execute_values(
+                            cur,
+                            f"INSERT INTO sensor_events ({', '.join(SENSOR_EVENT_COLUMNS)}) VALUES %s",
+                            rows,
+                            page_size=len(rows),
+                        )
+                    if alerts:
+                        execute_values(
+                            cur,
+                            f"INSERT INTO equipment_health_alerts ({', '.join(ALERT_COLUMNS)}) VALUES %s",
+                            [row for _generated, row in alerts],
+                        )
+                self.conn.commit()
+                self.written += len(rows)
+                self.alerts_written += len(alerts)
+                committed = time.monotonic()
+                for started in buffered_at:
+                    self.latency.add(committed - started)
+                for generated, _row in alerts:
+                    self.alert_latency.add(committed - generated)
+                return
+            except (OperationalError, InterfaceError):
+                if self.conn is not None:
+                    self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+    def _copy(self, cur, rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            # An empty unquoted CSV field is NULL to COPY (defect_reason of good items)
+            writer.writerow("" if value is None else value for value in row)
+        buf.seek(0)
+        cur.copy_expert(f"COPY sensor_events ({', '.join(SENSOR_EVENT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+    def add_work_orders(self, work_orders):
+        """Inserts work orders right away (not buffered): events may reference them from the next flush on."""
+        if self.conn is None or self.conn.closed:
+            self.conn = get_connection()
+        insert_work_orders(self.conn, work_orders)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+class KafkaSensorEventWriter:
+    """
+    Produces sensor events straight to SENSOR_EVENTS_TOPIC, with the same interface
+    as SensorEventWriter. Sensor events are append-only, so the sensor_events table
+    and the CDC hop only add WAL, index and replication work on the way to Flink.
+    Values are Avro (sensor_event.avsc, registered under <topic>-value); keys are
+    the line_number, so each line's events stay in order on one partition.
+    librdkafka does the batching: up to BATCH_SIZE events per request, lingering
+    at most FLUSH_INTERVAL, compressed with COMPRESSION. Equipment-health alerts
+    go to ALERTS_TOPIC the same way (equipment_health_alert.avsc, keyed by
+    line_number); alert_latency runs from generating the event that raised an
+    alert to the alert's delivery report. Work orders are reference data and are
+    still inserted into Postgres.
+    """
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, topic=SENSOR_EVENTS_TOPIC,
+                 alerts_topic=ALERTS_TOPIC):
+        # Only needed for this sink, so SINK=postgres runs without confluent-kafka installed.
+        from confluent_kafka import Producer
+        from confluent_kafka.schema_registry import SchemaRegistryClient
+        from confluent_kafka.schema_registry.avro import AvroSerializer
+        from confluent_kafka.serialization import SerializationContext, MessageField
+
+        producer_config = {
+            "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
+            "linger.ms": int(flush_interval * 1000),
+            "batch.num.messages": max(1, batch_size),
+            "compression.type": COMPRESSION,
+            "enable.idempotence": True,
+        }
+        if KAFKA_API_KEY:
+            producer_config.update({
+                "security.protocol": "SASL_SSL",
+                "sasl.mechanisms": "PLAIN",
+                "sasl.username": KAFKA_API_KEY,
+                "sasl.password": KAFKA_API_SECRET,
+            })
+        registry_config = {"url": SCHEMA_REGISTRY_URL}
+        if SCHEMA_REGISTRY_API_KEY:
+            registry_config["basic.auth.user.info"] = f"{SCHEMA_REGISTRY_API_KEY}:{SCHEMA_REGISTRY_API_SECRET}"
+        with open(SENSOR_EVENT_SCHEMA) as f:
+            schema = f.read()
+        with open(ALERT_SCHEMA) as f:
+            alert_schema = f.read()
+        registry = SchemaRegistryClient(registry_config)
+
+        self.topic = topic
+        self.serialize = AvroSerializer(registry, schema)
+        self.context = SerializationContext(topic, MessageField.VALUE)
+        self.alerts_topic = alerts_topic
+        self.serialize_alert = AvroSerializer(registry, alert_schema)
+        self.alert_context = SerializationContext(alerts_topic, MessageField.VALUE)
+        self.producer = Producer(producer_config)
+        self.conn = None
+        self.written = 0
+        self.failed = 0
+        self.alerts_written = 0
+        self.alerts_failed = 0
+        self.latency = WriteLatency()
+        self.alert_latency = WriteLatency()
+
+    def write(self, event):
+        value = self.serialize({column: event[column] for column in SENSOR_EVENT_COLUMNS}, self.context)
+        self._produce(self.topic, event["line_number"], value, self._delivered)
+
+    def write_alert(self, alert, generated):
+        """`generated` is the time.monotonic() at which the alert's sensor event was generated."""
+        value = self.serialize_alert({column: alert[column] for column in ALERT_COLUMNS}, self.alert_context)
+        self._produce(self.alerts_topic, alert["line_number"], value,
+                      lambda err, msg: self._alert_delivered(err, generated))
+
+    def _produce(self, topic, key, value, on_delivery):
+        while True:
+            try:
+                self.producer.produce(topic, key=key, value=value, on_delivery=on_delivery)
+                break
+            except BufferError:
+                # Local queue full: serve delivery reports until there is room.
+                self.producer.poll(0.05)
+        self.producer.poll(0)
+
+    def _delivered(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            if self.failed == 1:
+                print(f"[ERROR] ❌ Failed to deliver sensor event: {err}")
+            return
+        self.written += 1
+        # Seconds from produce() to the broker's ack
+        latency = msg.latency()
+        if latency is not None:
+            self.latency.add(latency)
+
+    def _alert_delivered(self, err, generated):
+        if err is not None:
+            self.alerts_failed += 1
+            if self.alerts_failed == 1:
+                print(f"[ERROR] ❌ Failed to deliver equipment-health alert: {err}")
+            return
+        self.alerts_written += 1
+        self.alert_latency.add(time.monotonic() - generated)
+
+    def flush_if_due(self):
+        """librdkafka sends partial batches after linger.ms itself; this only serves delivery reports."""
+        self.producer.poll(0)
+
+    def flush(self):
+        self.producer.flush()
+
+    def add_work_orders(self, work_orders):
+        """Inserts work orders into Postgres right away, before any event referencing them is produced."""
+        if self.conn is None or self.conn.closed:
+            self.conn = get_connection()
+        insert_work_orders(self.conn, work_orders)
+
+    def close(self):
+        try:
+            self.flush()
+            if self.failed:
+                print(f"[ERROR] ❌ {self.failed} sensor events were not delivered to {self.topic}.")
+            if self.alerts_failed:
+                print(f"[ERROR] ❌ {self.alerts_failed} alerts were not delivered to {self.alerts_topic}.")
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+def open_writer():
+    if SINK == "kafka":
+        return KafkaSensorEventWriter()
+    if SINK == "postgres":
+        return SensorEventWriter()
+    raise ValueError(f"SINK must be 'postgres' or 'kafka', not {SINK!r}")
+
+def run_worker(worker_id, lines, total_events):
+    """
+    Simulates `lines` ({line_number: work orders}) on this process's own writer,
+    stopping after total_events events (0 = never). In unbounded mode a line that
+    finishes its work orders gets a freshly generated one.
+    """
+    tag = f"[W{worker_id}] " if WORKERS > 1 else ""
+    if SIM_SEED:
+        random.seed(int(SIM_SEED) + worker_id)
+    else:
+        random.seed()  # forked workers would otherwise share the parent's sequence
+    writer = open_writer()
+    work_order_counts = {line: len(work_orders) for line, work_orders in lines.items()}
+
+    def next_work_order(line_name):
+        work_order_counts[line_name] += 1
+        row = generate_work_order(line_name, work_order_counts[line_name], datetime.now(timezone.utc))
+        writer.add_work_orders([row])
+        print(f"{tag}[INFO] {line_name} starting {row[0]} ({row[3]} units).")
+        return row[0], row[3]
+
+    floor = ShopFloor(
+        lines,
+        takt_seconds=TAKT_SECONDS,
+        rng=random.Random(int(SIM_SEED) + worker_id) if SIM_SEED else None,
+        work_order_source=next_work_order if total_events == 0 else None,
+    )
+
+    # Watches every event as it is generated; see equipment_health.py
+    health = EquipmentHealth(list(lines)) if EQUIPMENT_HEALTH else None
+
+    started = time.monotonic()
+    report_every = max(100, int(len(lines) * 2 * max(SIM_SPEED, 1)) * 10)  # ~10 s of output
+    try:
+        for i, (sim_seconds, event) in enumerate(floor.events(), start=1):
+            # Pace simulated time against the wall clock (absolute deadlines, so time
+            # spent generating and flushing is not added on top).
+            if SIM_SPEED > 0:
+                delay = started + sim_seconds / SIM_SPEED - time.monotonic()
+                if delay > 0:
+                    writer.flush_if_due()
+                    time.sleep(max(0.0, started + sim_seconds / SIM_SPEED - time.monotonic()))
+            generated = time.monotonic()
+            writer.write(event)
+            if health is not None:
+                for alert in health.observe(sim_seconds, event):
+                    writer.write_alert(alert, generated)
+                    print(f"{tag}{format_alert(alert)}")
+            if i % report_every == 0:
+                elapsed = time.monotonic() - started
+                print(f"{tag}[{i}] Item: {event['item_id']} | {event['line_number']} {event['routing_stage']} "
+                      f"| Defective: {event['is_defective']} | {floor.active_items()} items on the floor "
+                      f"| {writer.written / elapsed:,.0f} events/sec written, {writer.latency.summary()}")
+                if health is not None:
+                    print(f"{tag}[{i}] Equipment health: {health.summary()}, {writer.alerts_written} alerts written, "
+                          f"event-to-alert {writer.alert_latency.summary()}")
+            if i == total_events:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+    for workorder_id, sim_seconds in floor.completed_work_orders:
+        print(f"{tag}[INFO] {workorder_id} completed at {sim_seconds / 3600:.1f} simulated hours.")
+    elapsed = time.monotonic() - started
+    print(f"{tag}[INFO] ✅ Wrote {writer.written} events in {elapsed:.1f}s ({writer.written / elapsed:,.0f} events/sec, "
+          f"write {writer.latency.summary()}).")
+    if health is not None:
+        print(f"{tag}[INFO] Equipment health: {health.summary()}, {writer.alerts_written} alerts written, "
+              f"event-to-alert {writer.alert_latency.summary()}")
 
 if __name__ == "__main__":
     print("[INFO] Starting Discrete Manufacturing Simulator...")
@@ -162,13 +527,29 @@ if __name__ == "__main__":
     reset_tables()
 
     # 2. Create Metadata
-    workorder_ids = create_sample_work_orders()
-
-    # 3. Stream Data
-    print(f"[INFO] Streaming {TOTAL_EVENTS} item events...")
-    for i in range(1, TOTAL_EVENTS + 1):
-        event = generate_sensor_event(workorder_ids)
-        insert_sensor_event(event)
-        if i % 100 == 0:
-            print(f"[{i}] Item: {event['item_id']} | Defective: {event['is_defective']}")
-        time.sleep(EVENT_INTERVAL)
\ No newline at end of file
+    lines = line_names()
+    plan = create_work_orders(lines)
+
+    # 3. Simulate the shop floor, lines split round-robin over the worker processes
+    num_workers = max(1, min(WORKERS, len(lines), TOTAL_EVENTS or len(lines)))
+    speed = f"{SIM_SPEED:g}x real time" if SIM_SPEED > 0 else "unpaced"
+    sink = f"Kafka topic {SENSOR_EVENTS_TOPIC}, {COMPRESSION}" if SINK == "kafka" else f"Postgres {WRITE_METHOD}"
+    print(f"[INFO] Simulating {PLANTS} plant(s) x {LINES_PER_PLANT} line(s) over {num_workers} worker(s), "
+          f"{TOTAL_EVENTS or 'unlimited'} item events, {speed} "
+          f"({sink}, batches of {BATCH_SIZE}, flush every {FLUSH_INTERVAL * 1000:g} ms)...")
+    shares = [(TOTAL_EVENTS * (w + 1) // num_workers - TOTAL_EVENTS * w // num_workers) for w in range(num_workers)]
+    partitions = [{line: plan[line] for line in lines[w::num_workers]} for w in range(num_workers)]
+    if num_workers == 1:
+        run_worker(0, partitions[0], shares[0])
+    else:
+        workers = [multiprocessing.Process(target=run_worker, args=(w, partitions[w], shares[w]))
+                   for w in range(num_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            print("[INFO] Stopping workers...")
+            for worker in workers:
+                worker.join(timeout=30)
@@ -0,0 +1,246 @@
+# Discrete-event model of the shop floor behind manufacturing_data_simulator.py.
+#
+# Every item is released onto a line and flows through the six ROUTING_STAGES in
+# order; each (line, stage) is one station with a queue, a cycle time and its own
+# machine state:
+#   - warm-up: a "heat" level that climbs towards operating temperature while the
+#     station is busy and cools off while it idles (cold machines run low on
+#     temperature and pressure and misalign more parts),
+#   - thermal drift: a slow mean-reverting random walk on top of that,
+#   - tool wear: grows with every part, pushing pressure up and making it noisier
+#     until the tool is changed (the station is down for TOOL_CHANGE_SECONDS).
+# Sensor readings and defects come out of that state, so defects cluster on cold,
+# hot or worn stations instead of being i.i.d. A defective item is scrapped at the
+# stage that caught it; a line keeps releasing items until its work order has
+# planned_quantity good units through Packing, then moves on to its next one.
+#
+# Nothing sleeps here: a heap of (time, seq, action) is popped in time order and
+# events() yields (simulated seconds, sensor event) as fast as they are computed.
+# The caller decides how simulated time maps onto the wall clock.
+
+import heapq
+import itertools
+import math
+import random
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+# (routing_stage, mean cycle time s, operating temperature °C, nominal pressure)
+STAGE_PROFILES = (
+    ("Material Receipt", 0.8, 70.0, 110.0),
+    ("Pre-Processing", 1.5, 80.0, 115.0),
+    ("Fabrication", 2.4, 92.0, 130.0),
+    ("Assembly", 2.0, 82.0, 125.0),
+    ("Quality Inspection", 1.2, 75.0, 115.0),
+    ("Packing", 0.6, 70.0, 110.0),
+)
+TAKT_SECONDS = 3.0          # mean time between item releases per line
+CYCLE_TIME_CV = 0.25        # spread of cycle times around the stage mean
+AMBIENT_TEMPERATURE = 22.0
+WARM_UP_TAU = 600.0         # s for a busy station to close ~63% of the gap to operating temperature
+COOL_DOWN_TAU = 1800.0      # s for an idle station to lose ~63% of its heat
+IDLE_GRACE_SECONDS = 60.0   # gaps between parts shorter than this don't cool a station down
+DRIFT_TAU = 900.0           # mean-reversion time of the thermal drift
+DRIFT_SD = 10.0             # stationary standard deviation of the drift, °C
+TOOL_LIFE_ITEMS = 2000      # mean parts per tool before it's changed
+TOOL_CHANGE_SECONDS = 120.0
+ITEMS_PER_BATCH = 100
+SHIFT_SECONDS = 8 * 3600
+
+DEFECT_REASONS = ["Alignment Error", "Material Fracture", "Software Glitch"]
+
+
+class Station:
+    __slots__ = ("stage", "mean_cycle", "op_temperature", "nominal_pressure", "queue", "item",
+                 "heat", "drift", "wear", "tool_life", "down", "updated_at")
+
+    def __init__(self, stage_profile, rng):
+        self.stage, self.mean_cycle, self.op_temperature, self.nominal_pressure = stage_profile
+        self.queue = deque()
+        self.item = None        # item being worked on
+        self.heat = 0.0         # 0 = ambient, 1 = operating temperature
+        self.drift = 0.0
+        self.wear = rng.random() * 0.5  # tools start part-worn, so changes don't all line up
+        self.tool_life = rng.gauss(TOOL_LIFE_ITEMS, TOOL_LIFE_ITEMS * 0.15)
+        self.down = False
+        self.updated_at = 0.0
+
+    def advance(self, now, rng):
+        """Moves heat and drift forward to `now` given whether the station was busy since the last update."""
+        dt = now - self.updated_at
+        if dt <= 0:
+            return
+        # Busy, or idle for less than the grace period: still heating up.
+        running = dt if self.item is not None else min(dt, IDLE_GRACE_SECONDS)
+        self.heat = 1.0 + (self.heat - 1.0) * math.exp(-running / WARM_UP_TAU)
+        if dt > running:
+            self.heat *= math.exp(-(dt - running) / COOL_DOWN_TAU)
+        decay = math.exp(-dt / DRIFT_TAU)
+        self.drift = self.drift * decay + DRIFT_SD * math.sqrt(1.0 - decay * decay) * rng.gauss(0, 1)
+        self.updated_at = now
+
+    def readings(self, rng):
+        """(temperature, pressure) for the part just finished."""
+        # Drift is a property of the hot machine, so it fades with the heat.
+        temperature = (AMBIENT_TEMPERATURE + (self.op_temperature - AMBIENT_TEMPERATURE + self.drift) * self.heat
+                       + rng.gauss(0, 2.5))
+        pressure = (self.nominal_pressure * (0.85 + 0.15 * self.heat) + 20.0 * self.wear
+                    + rng.gauss(0, 5.0 + 20.0 * self.wear ** 2))
+        return round(temperature, 2), round(pressure, 2)
+
+
+class Line:
+    def __init__(self, index, name, work_orders, rng, work_order_source=None):
+        self.index = index
+        self.name = name
+        self.stations = [Station(profile, rng) for profile in STAGE_PROFILES]
+        self.work_orders = deque(work_orders)  # (workorder_id, planned_quantity)
+        self.work_order_source = work_order_source
+        self.work_order = None
+        self.released = self.good = self.in_progress = 0
+        self.next_work_order()
+
+    def next_work_order(self):
+        if self.work_orders:
+            self.work_order = self.work_orders.popleft()
+        elif self.work_order_source is not None:
+            self.work_order = self.work_order_source(self.name)
+        else:
+            self.work_order = None
+        self.released = self.good = self.in_progress = 0
+
+    def wants_item(self):
+        # Release until good + still-in-flight items cover the plan; scrap reopens the gap.
+        return self.work_order is not None and self.good + self.in_progress < self.work_order[1]
+
+
+class ShopFloor:
+    """
+    lines: {line_number: [(workorder_id, planned_quantity), ...]} -- each line works
+    through its own work orders in order. Once a line's list runs out it asks
+    work_order_source(line_number) for the next one, if given (None stops the line),
+    so with a source the floor runs indefinitely.
+    """
+
+    def __init__(self, lines, takt_seconds=TAKT_SECONDS, start_time=None, rng=None, work_order_source=None):
+        self.rng = rng or random.Random()
+        self.takt = takt_seconds
+        self.start_time = start_time or datetime.now(timezone.utc)
+        self.lines = [Line(i, name, work_orders, self.rng, work_order_source)
+                      for i, (name, work_orders) in enumerate(lines.items())]
+        self.completed_work_orders = []
+        self._heap = []
+        self._seq = itertools.count()
+        self._out = []
+
+    def events(self):
+        """Yields (simulated seconds, sensor event) in time order until every line runs out of work."""
+        for line in self.lines:
+            self._at(self.rng.uniform(0, self.takt), self._release, line)
+        heap, out = self._heap, self._out
+        while heap:
+            now, _seq, action, args = heapq.heappop(heap)
+            action(now, *args)
+            if out:
+                for event in out:
+                    yield now, event
+                out.clear()
+
+    def active_items(self):
+        return sum(line.in_progress for line in self.lines)
+
+    def _at(self, when, action, *args):
+        heapq.heappush(self._heap, (when, next(self._seq), action, args))
+
+    # --- actions -----------------------------------------------------------
+
+    def _release(self, now, line):
+        if not line.wants_item():
+            if line.work_order is None:
+                return  # out of work orders: the line stops releasing
+            # Plan covered by items still in flight; check again next takt.
+        else:
+            item = {
+                "item_id": str(uuid.UUID(int=self.rng.getrandbits(128), version=4)),
+                "workorder_id": line.work_order[0],
+                "batch_number": f"BATCH-{line.released // ITEMS_PER_BATCH + 1:02d}",
+            }
+            line.released += 1
+            line.in_progress += 1
+            self._enqueue(now, line, 0, item)
+        self._at(now + self.takt * self.rng.uniform(0.8, 1.2), self._release, line)
+
+    def _enqueue(self, now, line, stage_idx, item):
+        station = line.stations[stage_idx]
+        if station.item is None and not station.down:
+            self._start(now, line, stage_idx, item)
+        else:
+            station.queue.append(item)
+
+    def _start(self, now, line, stage_idx, item):
+        station = line.stations[stage_idx]
+        station.advance(now, self.rng)
+        station.item = item
+        cycle = station.mean_cycle * self.rng.lognormvariate(0, CYCLE_TIME_CV)
+        self._at(now + cycle, self._finish, line, stage_idx)
+
+    def _finish(self, now, line, stage_idx):
+        rng = self.rng
+        station = line.stations[stage_idx]
+        station.advance(now, rng)
+        item, station.item = station.item, None
+        temperature, pressure = station.readings(rng)
+        station.wear += 1.0 / station.tool_life
+
+        # Same classification the dashboard's thresholds are built around.
+        defect_reason = None
+        if temperature > 110:
+            defect_reason = "Thermal Issue"
+        elif pressure > 160 or pressure < 80:
+            defect_reason = "Pressure Variance"
+        elif rng.random() < 0.01 + 0.06 * station.wear ** 3 + 0.04 * (1.0 - station.heat):
+            defect_reason = rng.choice(DEFECT_REASONS)
+
+        shift = int(now // SHIFT_SECONDS)
+        self._out.append({
+            "workorder_id": item["workorder_id"],
+            "item_id": item["item_id"],
+            "batch_number": item["batch_number"],
+            "line_number": line.name,
+            "routing_stage": station.stage,
+            "temperature": temperature,
+            "pressure": pressure,
+            "is_defective": defect_reason is not None,
+            "defect_reason": defect_reason,
+            "operator_id": f"OP{100 + (3 * line.index + stage_idx + 7 * shift) % 21}",
+            "sensor_timestamp": self.start_time + timedelta(seconds=now),
+        })
+
+        # good + in_progress never exceeds the plan, so when the last good unit is
+        # packed nothing of this work order is left in flight.
+        if defect_reason is not None:
+            line.in_progress -= 1  # scrapped where it was caught
+        elif stage_idx + 1 < len(line.stations):
+            self._enqueue(now, line, stage_idx + 1, item)
+        else:
+            line.in_progress -= 1
+            line.good += 1
+            if line.good >= line.work_order[1]:
+                self.completed_work_orders.append((line.work_order[0], now))
+                line.next_work_order()
+
+        if station.wear >= 1.0:
+            station.down = True
+            self._at(now + TOOL_CHANGE_SECONDS, self._tool_changed, line, stage_idx)
+        elif station.queue:
+            self._start(now, line, stage_idx, station.queue.popleft())
+
+    def _tool_changed(self, now, line, stage_idx):
+        station = line.stations[stage_idx]
+        station.advance(now, self.rng)
+        station.down = False
+        station.wear = 0.0
+        station.tool_life = self.rng.gauss(TOOL_LIFE_ITEMS, TOOL_LIFE_ITEMS * 0.15)
+        if station.queue:
+            self._start(now, line, stage_idx, station.queue.popleft())
@@ -0,0 +1,46 @@
+# Equipment-health alerts from the data generator's detector
+# (data_generator/equipment_health.py). They go wherever the sensor events go:
+# the equipment_health_alerts table (created by postgres-initial.sql) with
+# sensor_events_sink = "postgres", or this topic with sensor_events_sink = "kafka",
+# as Avro records from data_generator/equipment_health_alert.avsc keyed by
+# line_number. The topic and schema reuse the Schema Registry key created for
+# the sensor events in sensor_events_topic.tf.
+resource "confluent_kafka_topic" "equipment_health_alerts" {
+  count = local.direct_sensor_events ? 1 : 0
+
+  kafka_cluster { id = confluent_kafka_cluster.main.id }
+  topic_name       = var.equipment_health_alerts_topic
+  partitions_count = 1
+  rest_endpoint    = local.kafka_rest_endpoint
+
+  credentials {
+    key    = confluent_api_key.kafka_admin.id
+    secret = confluent_api_key.kafka_admin.secret
+  }
+}
+
+resource "confluent_role_binding" "connect_sa_equipment_health_alerts_subject" {
+  count = local.direct_sensor_events ? 1 : 0
+
+  principal   = "User:${confluent_service_account.connect_sa.id}"
+  role_name   = "DeveloperWrite"
+  crn_pattern = "${data.confluent_schema_registry_cluster.essentials.resource_name}/subject=${var.equipment_health_alerts_topic}-value"
+}
+
+resource "confluent_schema" "equipment_health_alerts_value" {
+  count = local.direct_sensor_events ? 1 : 0
+
+  schema_registry_cluster {
+    id = data.confluent_schema_registry_cluster.essentials.id
+  }
+  rest_endpoint = data.confluent_schema_registry_cluster.essentials.rest_endpoint
+  subject_name  = "${confluent_kafka_topic.equipment_health_alerts[0].topic_name}-value"
+  format        = "AVRO"
+  schema        = file("${path.module}/data_generator/equipment_health_alert.avsc")
+
+  credentials {
+    key    = confluent_api_key.schema_registry[0].id
+    secret = confluent_api_key.schema_registry[0].secret
+  }
+  depends_on = [confluent_role_binding.connect_sa_equipment_health_alerts_subject]
+}
@@ -72,7 +72,7 @@ SELECT
     AVG(s.temperature) AS avg_temperature,
     AVG(s.pressure) AS avg_pressure,
     CURRENT_TIMESTAMP AS last_updated
-FROM `mf.public.sensor_events` s
+FROM `${local.sensor_events_table}` s
 JOIN `mf.public.work_orders` w
   ON s.workorder_id = w.workorder_id
 GROUP BY
@@ -187,7 +187,7 @@ FROM (
         SUM(CASE WHEN is_defective = false THEN 1 ELSE 0 END) OVER w AS ok_count,
         SUM(CASE WHEN is_defective = true THEN 1 ELSE 0 END) OVER w AS defect_count,
         COUNT(*) OVER w                                         AS total_count
-    FROM `mf.public.sensor_events`
+    FROM `${local.sensor_events_table}`
     WINDOW w AS (
         PARTITION BY workorder_id, line_number
         ORDER BY $rowtime
@@ -227,7 +227,7 @@ resource "confluent_flink_statement" "alter_sensor_events_wm" {
   principal    { id = confluent_service_account.flink_sa.id }
 
   statement = <<EOT
-ALTER TABLE `mf.public.sensor_events`
+ALTER TABLE `${local.sensor_events_table}`
 MODIFY WATERMARK FOR $rowtime AS $rowtime - INTERVAL '5' SECOND;
 EOT
 
@@ -250,6 +250,7 @@ EOT
     confluent_role_binding.flink_sa_developer,
     confluent_role_binding.flink_sa_flink_admin,
     confluent_role_binding.flink_assigner,
-    confluent_connector.postgres_cdc_v2
+    confluent_connector.postgres_cdc_v2,
+    confluent_schema.sensor_events_value
   ]
 }
\ No newline at end of file
@@ -23,6 +23,22 @@
         operator_id VARCHAR(20),
         sensor_timestamp TIMESTAMP
     );
+
+    -- Equipment Health Alerts (written by the data generator's detector)
+    CREATE TABLE IF NOT EXISTS equipment_health_alerts (
+        alert_id SERIAL PRIMARY KEY,
+        kind VARCHAR(10),              -- risk / trend / shift = early warning, breach = limit crossed
+        line_number VARCHAR(50),
+        routing_stage VARCHAR(50),
+        signal VARCHAR(20),            -- temperature or pressure
+        limit_value FLOAT,
+        value FLOAT,                   -- the reading that raised the alert
+        level FLOAT,                   -- smoothed level at the time
+        slope_per_min FLOAT,
+        lead_seconds FLOAT,            -- breaches: simulated seconds since the warning, if any
+        sensor_timestamp TIMESTAMP,
+        alert_timestamp TIMESTAMP
+    );
     -- Insert a dummy work order so we don't violate FK constraints
         INSERT INTO work_orders (workorder_id, product_category, product_code, planned_quantity, start_date, end_date)
         VALUES ('INIT-000', 'Initialization', 'INIT-CODE', 10, NOW(), NOW())
@@ -0,0 +1,73 @@
+# Direct-to-Kafka ingestion (sensor_events_sink = "kafka"): the data generator
+# produces sensor events to their own topic instead of inserting them into
+# Postgres for the CDC connector. Work orders still come through CDC.
+#
+# The topic and its Avro value schema are created here, before the Flink
+# statements run, because Flink infers the table's columns from the registered
+# schema. The generator serializes with the same sensor_event.avsc, so it
+# resolves to this schema id instead of registering a new version.
+locals {
+  direct_sensor_events = var.sensor_events_sink == "kafka"
+  sensor_events_table  = local.direct_sensor_events ? var.sensor_events_topic : "${var.cdc_topic_prefix}.public.sensor_events"
+}
+
+resource "confluent_kafka_topic" "sensor_events" {
+  count = local.direct_sensor_events ? 1 : 0
+
+  kafka_cluster { id = confluent_kafka_cluster.main.id }
+  topic_name       = var.sensor_events_topic
+  partitions_count = 6
+  rest_endpoint    = local.kafka_rest_endpoint
+
+  credentials {
+    key    = confluent_api_key.kafka_admin.id
+    secret = confluent_api_key.kafka_admin.secret
+  }
+}
+
+resource "confluent_role_binding" "connect_sa_sensor_events_subject" {
+  count = local.direct_sensor_events ? 1 : 0
+
+  principal   = "User:${confluent_service_account.connect_sa.id}"
+  role_name   = "DeveloperWrite"
+  crn_pattern = "${data.confluent_schema_registry_cluster.essentials.resource_name}/subject=${var.sensor_events_topic}-value"
+}
+
+resource "confluent_api_key" "schema_registry" {
+  count = local.direct_sensor_events ? 1 : 0
+
+  display_name = "${var.project_name}-schema-registry-key"
+
+  owner {
+    id          = confluent_service_account.connect_sa.id
+    api_version = confluent_service_account.connect_sa.api_version
+    kind        = confluent_service_account.connect_sa.kind
+  }
+
+  managed_resource {
+    id          = data.confluent_schema_registry_cluster.essentials.id
+    api_version = data.confluent_schema_registry_cluster.essentials.api_version
+    kind        = data.confluent_schema_registry_cluster.essentials.kind
+    environment {
+      id = confluent_environment.confluent_project_env.id
+    }
+  }
+  depends_on = [confluent_role_binding.connect_sa_sensor_events_subject]
+}
+
+resource "confluent_schema" "sensor_events_value" {
+  count = local.direct_sensor_events ? 1 : 0
+
+  schema_registry_cluster {
+    id = data.confluent_schema_registry_cluster.essentials.id
+  }
+  rest_endpoint = data.confluent_schema_registry_cluster.essentials.rest_endpoint
+  subject_name  = "${confluent_kafka_topic.sensor_events[0].topic_name}-value"
+  format        = "AVRO"
+  schema        = file("${path.module}/data_generator/sensor_event.avsc")
+
+  credentials {
+    key    = confluent_api_key.schema_registry[0].id
+    secret = confluent_api_key.schema_registry[0].secret
+  }
+}
@@ -0,0 +1,39 @@
+# Server-side downsampling for the dashboard's trend charts.
+#
+# px.line over raw rows sends every reading to the browser, so the figure JSON
+# grows with the time range on screen. min_max_downsample keeps, for each series
+# (line_number), the lowest and highest reading in each of `buckets` equal time
+# slices -- at most two points per horizontal pixel when buckets is the chart
+# width / 2. A line drawn through those points covers the same pixels as the raw
+# series, and every excursion past a warning line stays visible (an average or
+# LTTB would keep the shape but can drop single spikes). It is vectorized per
+# series: one lexsort instead of a Python loop per bucket.
+
+import numpy as np
+
+
+def min_max_downsample(df, x, y, group, buckets):
+    """
+    Rows of `df` (sorted by x) that are the min and max of y in each of `buckets`
+    time slices per `group` value. Series with at most 2 * buckets points are kept
+    whole, and rows with a missing y are dropped.
+    """
+    df = df[df[y].notna()]
+    if len(df) <= 2 * buckets:
+        return df
+    keep = []
+    for positions in df.groupby(group, sort=False).indices.values():
+        if len(positions) <= 2 * buckets:
+            keep.append(positions)
+            continue
+        xs = df[x].to_numpy()[positions].astype("datetime64[ns]").astype(np.int64)
+        ys = df[y].to_numpy(dtype=np.float64)[positions]
+        span = xs[-1] - xs[0] + 1
+        slot = ((xs - xs[0]) * buckets // span) if span > 0 else np.zeros(len(xs), dtype=np.int64)
+        # Sorted by (slot, y): the first row of each slot is its min, the last its max.
+        order = np.lexsort((ys, slot))
+        slot_sorted = slot[order]
+        starts = np.flatnonzero(np.r_[True, slot_sorted[1:] != slot_sorted[:-1]])
+        ends = np.r_[starts[1:], len(order)] - 1
+        keep.append(positions[np.unique(np.r_[order[starts], order[ends]])])
+    return df.iloc[np.sort(np.concatenate(keep))]
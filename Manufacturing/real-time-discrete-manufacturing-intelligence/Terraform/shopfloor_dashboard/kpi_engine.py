@@ -0,0 +1,195 @@
+# Incrementally maintained KPIs for the dashboard.
+#
+# update_dashboard used to recompute everything from the raw rows on every
+# refresh and for every filter combination: nunique over item_id, threshold
+# filters, and groupbys per line, stage and defect reason. KpiEngine folds each
+# batch of new rows into one Cell per (line_number, routing_stage, workorder_id,
+# BUCKET_SECONDS bucket of ts), holding
+#   - row count and temperature sum (averages),
+#   - HyperLogLog sketches of the item_ids seen and of those above
+#     TEMP_WARNING_THRESHOLD (distinct counts that merge across cells),
+#   - the number of readings above TEMP_CRITICAL_THRESHOLD,
+#   - rejected items per defect_reason (a defective item is scrapped at the stage
+#     that caught it, so it has one row with a defect_reason),
+#   - the latest yield_percent / defect_rate reported.
+# A filtered view is answered by merging the matching cells, so its cost depends
+# on the number of lines, stages and work orders on screen, not on the rows
+# behind them. Buckets older than the window are dropped as the watermark moves.
+
+import threading
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+BUCKET_SECONDS = 60
+HLL_PRECISION = 11  # 2048 one-byte registers per sketch, ~2.3% standard error
+
+
+class HyperLogLog:
+    __slots__ = ("registers",)
+
+    def __init__(self, registers=None):
+        self.registers = np.zeros(1 << HLL_PRECISION, dtype=np.uint8) if registers is None else registers
+
+    @staticmethod
+    def hashes(values):
+        """64-bit hashes of a Series, stable across processes (unlike hash())."""
+        return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+    def add_hashes(self, hashes):
+        index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.intp)
+        # Rank = position of the first 1 bit in the remaining 64 - p bits. The
+        # lowest bit is forced to 1 so an all-zero remainder is bounded too.
+        rest = (hashes << np.uint64(HLL_PRECISION)) | np.uint64(1)
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        with np.errstate(divide="ignore"):
+            leading_zeros = np.where(high > 0, 31 - np.floor(np.log2(high)), 63 - np.floor(np.log2(low)))
+        np.maximum.at(self.registers, index, (leading_zeros + 1).astype(np.uint8))
+
+    @staticmethod
+    def estimate(sketches):
+        """Distinct count of the union of `sketches`."""
+        if not sketches:
+            return 0
+        registers = sketches[0].registers if len(sketches) == 1 else \
+            np.maximum.reduce([sketch.registers for sketch in sketches])
+        m = registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.ldexp(1.0, -registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))  # linear counting for small sets
+        return int(round(raw))
+
+
+class Cell:
+    __slots__ = ("rows", "temperature_sum", "items", "hot_items", "critical_readings",
+                 "rejects", "latest_ts", "latest_yield", "latest_defect_rate")
+
+    def __init__(self):
+        self.rows = 0
+        self.temperature_sum = 0.0
+        self.items = HyperLogLog()
+        self.hot_items = None   # allocated on the first reading above the warning threshold
+        self.critical_readings = 0
+        self.rejects = defaultdict(int)
+        self.latest_ts = None
+        self.latest_yield = None
+        self.latest_defect_rate = None
+
+
+class KpiEngine:
+    def __init__(self, window, warning_threshold, critical_threshold, bucket_seconds=BUCKET_SECONDS):
+        self.window = window
+        self.warning_threshold = warning_threshold
+        self.critical_threshold = critical_threshold
+        self.bucket = pd.Timedelta(seconds=bucket_seconds)
+        self.cells = {}     # (line_number, routing_stage, workorder_id, bucket start) -> Cell
+        self._lock = threading.Lock()
+
+    # --- MetricsWindow listener -------------------------------------------------
+
+    def add(self, rows, watermark):
+        """Folds newly fetched rows into their cells, then drops buckets that left the window."""
+        keys = rows.assign(bucket=rows["ts"].dt.floor(self.bucket))
+        groups = keys.groupby(["line_number", "routing_stage", "workorder_id", "bucket"], sort=False, dropna=False).indices
+        ts = rows["ts"].to_numpy()
+        temperature = rows["temperature"].to_numpy(dtype=np.float64, na_value=np.nan)
+        hashes = HyperLogLog.hashes(rows["item_id"].fillna(""))
+        hot = temperature > self.warning_threshold
+        critical = temperature > self.critical_threshold
+        defect_reason = rows["defect_reason"].to_numpy()
+        defective = rows["defect_reason"].notna().to_numpy()
+        yield_percent = rows["yield_percent"].to_numpy()
+        defect_rate = rows["defect_rate"].to_numpy()
+
+        with self._lock:
+            for key, positions in groups.items():
+                cell = self.cells.get(key)
+                if cell is None:
+                    cell = self.cells[key] = Cell()
+                cell.rows += len(positions)
+                cell.temperature_sum += float(np.nansum(temperature[positions]))
+                cell.items.add_hashes(hashes[positions])
+                hot_positions = positions[hot[positions]]
+                if len(hot_positions):
+                    if cell.hot_items is None:
+                        cell.hot_items = HyperLogLog()
+                    cell.hot_items.add_hashes(hashes[hot_positions])
+                cell.critical_readings += int(np.count_nonzero(critical[positions]))
+                for position in positions[defective[positions]]:
+                    cell.rejects[defect_reason[position]] += 1
+                last = positions[-1]    # rows arrive sorted by ts
+                if cell.latest_ts is None or ts[last] >= cell.latest_ts:
+                    cell.latest_ts = ts[last]
+                    cell.latest_yield = yield_percent[last]
+                    cell.latest_defect_rate = defect_rate[last]
+
+            oldest = (watermark - self.window).floor(self.bucket)
+            for key in [key for key in self.cells if key[3] < oldest]:
+                del self.cells[key]
+
+    def clear(self):
+        with self._lock:
+            self.cells = {}
+
+    # --- queries -----------------------------------------------------------------
+
+    def options(self):
+        """Sorted (lines, stages, work orders) present in the window."""
+        with self._lock:
+            keys = list(self.cells)
+        return tuple(sorted({key[i] for key in keys if key[i] is not None}) for i in range(3))
+
+    def kpis(self, lines=None, stages=None, wos=None, since=None):
+        """
+        KPIs over the cells matching the filters (None/empty = all) whose bucket
+        overlaps [since, now], or None when nothing matches.
+        """
+        lines, stages, wos = (set(f) if f else None for f in (lines, stages, wos))
+        first_bucket = since.floor(self.bucket) if since is not None else None
+        with self._lock:
+            cells = [(line, stage, cell) for (line, stage, wo, bucket), cell in self.cells.items()
+                     if (lines is None or line in lines)
+                     and (stages is None or stage in stages)
+                     and (wos is None or wo in wos)
+                     and (first_bucket is None or bucket >= first_bucket)]
+            if not cells:
+                return None
+
+            rows = temperature_sum = 0
+            line_temperature = defaultdict(lambda: [0.0, 0])
+            rejects_by_stage = defaultdict(int)
+            rejects_by_reason = defaultdict(int)
+            critical_lines = set()
+            latest = None
+            for line, stage, cell in cells:
+                rows += cell.rows
+                temperature_sum += cell.temperature_sum
+                if line is not None:
+                    line_temperature[line][0] += cell.temperature_sum
+                    line_temperature[line][1] += cell.rows
+                    if cell.critical_readings:
+                        critical_lines.add(line)
+                for reason, count in cell.rejects.items():
+                    rejects_by_stage[stage] += count
+                    rejects_by_reason[reason] += count
+                if latest is None or cell.latest_ts > latest.latest_ts:
+                    latest = cell
+            total_items = HyperLogLog.estimate([cell.items for _line, _stage, cell in cells])
+            warning_items = HyperLogLog.estimate([cell.hot_items for _line, _stage, cell in cells
+                                                  if cell.hot_items is not None])
+
+        return {
+            "total_items": total_items,
+            "yield_percent": latest.latest_yield,
+            "defect_rate": latest.latest_defect_rate,
+            "avg_temperature": temperature_sum / rows,
+            "warning_items": warning_items,
+            "critical_lines": sorted(critical_lines),
+            "avg_temperature_by_line": {line: s / n for line, (s, n) in sorted(line_temperature.items())},
+            "rejects_by_stage": dict(rejects_by_stage),
+            "rejects_by_reason": dict(rejects_by_reason),
+        }
@@ -0,0 +1,128 @@
+# Push-based refresh for the dashboard.
+#
+# With a 15 s dcc.Interval every open browser polled, and rebuilt all seven
+# outputs, whether or not anything had arrived. ChangeFeed inverts that:
+#   - a statement-level trigger on production_metrics_history sends
+#     NOTIFY production_metrics whenever the sink connector commits rows (one
+#     notification per INSERT statement, not per row),
+#   - one background thread LISTENs on a dedicated connection. On a
+#     notification it refreshes the shared MetricsWindow, and if that found new
+#     rows it bumps the data version and wakes every subscriber,
+#   - /events streams the version to each browser as Server-Sent Events. The
+#     page's EventSource writes it into a dcc.Store, and the callbacks hang off
+#     that Store instead of a timer.
+# Notifications are coalesced to one refresh per MIN_PUSH_INTERVAL_SECONDS. If
+# the trigger can't be installed yet (the sink connector creates the table on
+# its first write), the thread falls back to refreshing every POLL_SECONDS
+# until it can. That is still one query for the whole server, not one per
+# browser.
+
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+CHANNEL = "production_metrics"
+MIN_PUSH_INTERVAL_SECONDS = 0.5
+POLL_SECONDS = 5.0
+IDLE_POLL_SECONDS = 60.0    # safety net once LISTEN works
+HEARTBEAT_SECONDS = 15.0    # keeps proxies from closing an idle stream
+RECONNECT_SECONDS = 5.0
+
+INSTALL_TRIGGER = f"""
+    CREATE OR REPLACE FUNCTION notify_production_metrics() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('{CHANNEL}', '');
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER production_metrics_history_notify
+        AFTER INSERT ON production_metrics_history
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_production_metrics();
+"""
+
+
+class ChangeFeed:
+    def __init__(self, db_config, window):
+        self.db_config = db_config
+        self.window = window
+        self.version = 0
+        self.running = False
+        self._changed = threading.Condition()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Starts the listener thread once; later calls do nothing."""
+        with self._start_lock:
+            if not self.running:
+                self.running = True
+                threading.Thread(target=self._run, name="change-feed", daemon=True).start()
+
+    def wait(self, version, timeout):
+        """Blocks until the data version differs from `version` or `timeout` passes; returns the current one."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def stream(self):
+        """Server-Sent Events: the current data version on connect, then each new one."""
+        self.start()
+        version = self.version
+        yield f"retry: {int(RECONNECT_SECONDS * 1000)}\ndata: {version}\n\n"
+        while True:
+            latest = self.wait(version, HEARTBEAT_SECONDS)
+            if latest == version:
+                yield ": heartbeat\n\n"
+            else:
+                version = latest
+                yield f"data: {version}\n\n"
+
+    # --- listener thread ---------------------------------------------------------
+
+    def _publish_if_changed(self):
+        before = self.window.version
+        self.window.refresh()
+        if self.window.version != before:
+            with self._changed:
+                self.version += 1
+                self._changed.notify_all()
+
+    def _listen(self):
+        """Connection LISTENing on CHANNEL, or None while the trigger can't be installed."""
+        conn = psycopg2.connect(**self.db_config)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(INSTALL_TRIGGER)
+                cur.execute(f"LISTEN {CHANNEL};")
+            return conn
+        except psycopg2.errors.UndefinedTable:
+            conn.close()
+            return None
+
+    def _run(self):
+        conn = None
+        while True:
+            try:
+                if conn is None or conn.closed:
+                    conn = self._listen()
+                if conn is None:
+                    self._publish_if_changed()
+                    time.sleep(POLL_SECONDS)
+                    continue
+                # Wake on a notification, or after IDLE_POLL_SECONDS just in case one was missed
+                select.select([conn], [], [], IDLE_POLL_SECONDS)
+                conn.poll()
+                conn.notifies.clear()
+                self._publish_if_changed()
+                # Coalesce the notifications that keep arriving while rows stream in
+                time.sleep(MIN_PUSH_INTERVAL_SECONDS)
+            except Exception as e:
+                print(f"Change feed error: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+                time.sleep(RECONNECT_SECONDS)
@@ -0,0 +1,177 @@
+# In-memory rolling window over production_metrics_history for the dashboard.
+#
+# Every callback used to open its own connection and re-read the latest 5000
+# rows; on each tick that happened twice, once for the filter options and once
+# for the dashboard. MetricsWindow keeps the last WINDOW_MINUTES of rows (by
+# event_ts) in one DataFrame that every callback and session shares:
+#   - a refresh reads only rows newer than the watermark (the latest event_ts
+#     held), over a pooled connection, so each tick costs what arrived since the
+#     last one, not what is on screen,
+#   - the query re-reads REFRESH_OVERLAP_SECONDS behind the watermark because
+#     the sink connector can commit rows with the same or a slightly older
+#     event_ts after rows it already committed; rows already held are dropped by
+#     (ts, item_id, routing_stage), which is one row per sensor event,
+#   - rows are kept sorted by ts and older ones are trimmed off the front,
+#   - refreshes are rate-limited to one per MIN_REFRESH_SECONDS and serialized by
+#     a lock; callbacks arriving in the meantime get the current frame.
+# The frame returned by snapshot() is never modified in place. A refresh builds
+# a new frame and swaps it in, so callers can filter it without copying.
+# Subscribers (see kpi_engine.py) get each batch of new rows as it is merged in,
+# so that they can maintain their own incremental state.
+
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+from psycopg2 import pool, OperationalError, InterfaceError, errors
+
+COLUMNS = [
+    "ts", "workorder_id", "product_category", "line_number", "routing_stage",
+    "temperature", "pressure", "yield_percent", "defect_rate", "ok_count",
+    "defect_count", "total_count", "defect_reason", "item_id",
+]
+SELECT = """
+    SELECT
+        event_ts AS ts, workorder_id, product_category, line_number, routing_stage,
+        temperature, pressure, yield_percent, defect_rate, ok_count,
+        defect_count, total_count, defect_reason, item_id
+    FROM production_metrics_history
+"""
+ROW_KEY = ["ts", "item_id", "routing_stage"]
+REFRESH_OVERLAP_SECONDS = 5
+MIN_REFRESH_SECONDS = 2.0
+POOL_SIZE = 4
+
+
+class MetricsWindow:
+    def __init__(self, db_config, window_minutes=15, min_refresh_seconds=MIN_REFRESH_SECONDS):
+        self.db_config = db_config
+        self.window = timedelta(minutes=window_minutes)
+        self.min_refresh_seconds = min_refresh_seconds
+        self.frame = pd.DataFrame(columns=COLUMNS)
+        self.watermark = None       # latest ts held, None until the first rows arrive
+        self.version = 0            # bumped every time the frame changes
+        self.refreshed_at = 0.0
+        self._pool = None
+        self._lock = threading.Lock()
+        self._indexed = False
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """listener.add(new_rows, watermark) after every refresh that found rows; listener.clear() on a reset."""
+        self._listeners.append(listener)
+
+    def snapshot(self, refresh=True):
+        """
+        The current window, sorted by ts; refreshed first if the last refresh is old
+        enough. Pass refresh=False when something else keeps it current (see
+        live_updates.py).
+        """
+        if refresh and time.monotonic() - self.refreshed_at >= self.min_refresh_seconds:
+            with self._lock:
+                # Whoever waited on the lock finds the refresh already done.
+                if time.monotonic() - self.refreshed_at >= self.min_refresh_seconds:
+                    self._refresh_logged()
+        return self.frame
+
+    def refresh(self):
+        """Fetches new rows now, regardless of when the last refresh ran."""
+        with self._lock:
+            self._refresh_logged()
+
+    # --- fetching ------------------------------------------------------------
+
+    def _refresh_logged(self):
+        try:
+            self._refresh()
+        except Exception as e:
+            print(f"Error reading from DB: {e}")
+        self.refreshed_at = time.monotonic()
+
+    def _query(self, query, params=()):
+        if self._pool is None:
+            self._pool = pool.ThreadedConnectionPool(1, POOL_SIZE, **self.db_config)
+        conn = self._pool.getconn()
+        broken = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                rows = cur.fetchall()
+            conn.commit()
+            return rows
+        except (OperationalError, InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn, close=broken)
+
+    def _ensure_index(self):
+        # The sink connector auto-creates the table without indexes. Without one on
+        # event_ts, every incremental read would scan the whole history.
+        if self._indexed:
+            return
+        try:
+            # ANALYZE so the planner knows how few rows lie past the watermark,
+            # instead of guessing and scanning the table anyway.
+            self._query("CREATE INDEX IF NOT EXISTS production_metrics_history_event_ts_idx "
+                        "ON production_metrics_history (event_ts); "
+                        "ANALYZE production_metrics_history; SELECT 1")
+            self._indexed = True
+        except errors.UndefinedTable:
+            pass  # not created by the sink connector yet
+
+    def _refresh(self):
+        self._ensure_index()
+        if self.watermark is None:
+            rows = self._query(
+                SELECT + "WHERE event_ts >= (SELECT max(event_ts) FROM production_metrics_history) - %s "
+                         "ORDER BY event_ts",
+                (self.window,))
+        else:
+            rows = self._query(SELECT + "WHERE event_ts >= %s ORDER BY event_ts",
+                               (self.watermark - timedelta(seconds=REFRESH_OVERLAP_SECONDS),))
+            if not rows:
+                self._check_reset()
+                return
+        if not rows:
+            return
+
+        new = pd.DataFrame.from_records(rows, columns=COLUMNS)
+        new["ts"] = pd.to_datetime(new["ts"])
+        frame = self.frame
+        if not frame.empty:
+            # Drop the overlap rows that are already held
+            since = new["ts"].iloc[0]
+            held = frame.loc[frame["ts"] >= since, ROW_KEY]
+            if not held.empty:
+                seen = pd.MultiIndex.from_frame(held)
+                new = new[~pd.MultiIndex.from_frame(new[ROW_KEY]).isin(seen)]
+                if new.empty:
+                    return
+            frame = pd.concat([frame, new], ignore_index=True)
+            if new["ts"].iloc[0] < self.watermark:
+                frame = frame.sort_values("ts", kind="stable", ignore_index=True)
+        else:
+            frame = new
+
+        self.watermark = frame["ts"].iloc[-1]
+        start = frame["ts"].searchsorted(self.watermark - self.window)
+        self.frame = frame.iloc[start:].reset_index(drop=True)
+        for listener in self._listeners:
+            listener.add(new, self.watermark)
+        self.version += 1
+
+    def _check_reset(self):
+        # The simulator truncates the history when it restarts; start over once
+        # the table holds nothing up to the watermark.
+        (latest,), = self._query("SELECT max(event_ts) FROM production_metrics_history")
+        if latest is None or pd.Timestamp(latest) < self.watermark - timedelta(seconds=REFRESH_OVERLAP_SECONDS):
+            self.frame = pd.DataFrame(columns=COLUMNS)
+            self.watermark = None
+            for listener in self._listeners:
+                listener.clear()
+            self.version += 1
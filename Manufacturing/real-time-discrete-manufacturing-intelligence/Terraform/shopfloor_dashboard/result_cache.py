@@ -0,0 +1,80 @@
+# Shared cache of rendered dashboard outputs.
+#
+# Every page that is open re-runs update_dashboard on each data version. Ten
+# operators watching the same line would build the same KPIs and Plotly figures
+# ten times. ResultCache keeps the serialized outputs of each view, keyed by the
+# view (filters, time range, chart width) and valid for one data version
+# (MetricsWindow.version, bumped whenever new rows are merged in):
+#   - entries are evicted least-recently-used beyond max_entries,
+#   - a newer version drops every entry at once; nothing expires in between, so
+#     an unchanged view costs nothing until new rows arrive. A caller still on an
+#     older version gets its result built but not cached,
+#   - concurrent misses for the same key are single-flight: the first caller
+#     builds, the rest wait for its result instead of building it again.
+# Values are stored as JSON-ready structures (plus their digests, so callers can
+# tell which outputs changed). They are shared between sessions, so callers must
+# not modify them.
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from plotly.io.json import from_json_plotly, to_json_plotly
+
+MAX_ENTRIES = 256
+
+
+def serialize(outputs):
+    """(JSON-ready copies of `outputs`, an md5 digest of each)."""
+    texts = [to_json_plotly(output) for output in outputs]
+    return [from_json_plotly(text) for text in texts], [hashlib.md5(text.encode()).hexdigest() for text in texts]
+
+
+class ResultCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.version = 0
+        self.entries = OrderedDict()    # key -> value, least recently used first
+        self.hits = self.misses = 0
+        self._building = {}             # key -> Event set when its build finishes
+        self._lock = threading.Lock()
+
+    def get(self, version, key, build):
+        """The value cached for `key` at `version`, calling build() once if there is none."""
+        while True:
+            with self._lock:
+                if version < self.version:
+                    self.misses += 1
+                    stale = True
+                    break
+                stale = False
+                if version != self.version:
+                    self.version = version
+                    self.entries.clear()
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return self.entries[key]
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Someone else is building this view; use their result (or, if it
+            # failed or was already superseded, build it ourselves next time round)
+            building.wait()
+
+        if stale:
+            return build()
+        try:
+            value = build()
+            with self._lock:
+                if version == self.version:
+                    self.entries[key] = value
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                del self._building[key]
+            building.set()
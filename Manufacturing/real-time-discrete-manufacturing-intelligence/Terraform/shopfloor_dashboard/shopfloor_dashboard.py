@@ -5,15 +5,20 @@
 # python3 shopfloor_dashboard.py
 
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State
+from flask import Response
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-import psycopg2
 from datetime import datetime
 import numpy as np
 from dotenv import load_dotenv
 import os
+from metrics_window import MetricsWindow
+from kpi_engine import KpiEngine
+from downsample import min_max_downsample
+from live_updates import ChangeFeed
+from result_cache import ResultCache, serialize
 
 # -----------------------------
 # Configuration
@@ -26,6 +31,19 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD")
 }
 
+WINDOW_MINUTES = int(os.getenv("WINDOW_MINUTES", "60"))   # history held in memory, the longest selectable range
+
+# Selectable time ranges in minutes; those beyond WINDOW_MINUTES are not offered
+TIME_RANGES = [5, 15, 30, 60, 120, 240, 480, 720]
+DEFAULT_TIME_RANGE = 15
+# Trend charts keep at most a min and a max point per horizontal pixel and line.
+# The pixel width is derived from the browser width reported by the client.
+DEFAULT_VIEWPORT_WIDTH = 1600
+MAX_POINTS_PER_LINE = 4000
+# Browser widths are rounded down to this step so that pages of similar width
+# share cached figures (see result_cache.py)
+VIEWPORT_WIDTH_STEP = 160
+
 TEMP_WARNING_THRESHOLD = 110 # For the Red Alert KPI
 TEMP_CRITICAL_THRESHOLD = 125 # For Advanced Notification
 
@@ -49,40 +67,27 @@ PASTEL_STAGE_COLORS = {
 # -----------------------------
 # Helper: Read Latest Data
 # -----------------------------
+# One rolling window shared by every callback and browser session; it only
+# fetches rows newer than what it already holds (see metrics_window.py).
+metrics = MetricsWindow(DB_CONFIG, window_minutes=WINDOW_MINUTES)
+# KPI cards, stage rejections and defect reasons come from counters and sketches
+# kept up to date as rows arrive (see kpi_engine.py), not from the raw rows.
+kpi_engine = KpiEngine(metrics.window, TEMP_WARNING_THRESHOLD, TEMP_CRITICAL_THRESHOLD)
+metrics.subscribe(kpi_engine)
+# Refreshes the window when Postgres reports new rows and pushes the new data
+# version to every open page (see live_updates.py), instead of each page polling.
+live = ChangeFeed(DB_CONFIG, metrics)
+# Rendered outputs per view and data version, shared by every page showing that view
+results = ResultCache()
+
 def get_data():
-    conn = psycopg2.connect(**DB_CONFIG)
-    # Ensure item_id is fetched for unique counting and Red Alert
-    query = """
-        SELECT
-            event_ts AS ts,
-            workorder_id,
-            product_category,
-            line_number,
-            routing_stage,
-            temperature,
-            pressure,
-            yield_percent,
-            defect_rate,
-            ok_count,
-            defect_count,
-            total_count,
-            defect_reason,
-            item_id
-        FROM production_metrics_history
-        ORDER BY ts DESC LIMIT 5000;
-    """
-    try:
-        df = pd.read_sql(query, conn)
-    except Exception as e:
-        print(f"Error reading from DB: {e}")
-        df = pd.DataFrame()
-    finally:
-        conn.close()
-
-    if not df.empty:
-        df['ts'] = pd.to_datetime(df['ts'])
-        df = df.sort_values('ts')
-    return df
+    """Rows of the last WINDOW_MINUTES, sorted by ts. Shared: filter it, don't modify it."""
+    return metrics.snapshot(refresh=not live.running)
+
+def get_version():
+    """Refreshes the window if due; returns the data version the current rows are at least as new as."""
+    get_data()
+    return metrics.version
 
 # -----------------------------
 # App UI
@@ -90,6 +95,12 @@ def get_data():
 app = dash.Dash(__name__)
 app.title = "Shopfloor Intelligence Dashboard"
 
+@app.server.route("/events")
+def events():
+    """Server-Sent Events stream of the data version; each new one triggers a redraw."""
+    return Response(live.stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 app.layout = html.Div([
     html.H1("🏭 Real-Time Discrete Manufacturing Intelligence",
             style={'textAlign': 'center', 'marginBottom': '20px', 'fontFamily': 'Arial', 'color': '#333'}),
@@ -109,7 +120,19 @@ app.layout = html.Div([
         html.Div([
             html.Label("Work Order:", style={'fontWeight': 'bold'}),
             dcc.Dropdown(id='wo-filter', multi=True, placeholder="All Workorders")
-        ], style={'flex': '1'}),
+        ], style={'flex': '1', 'marginRight': '10px'}),
+
+        html.Div([
+            html.Label("Time Range:", style={'fontWeight': 'bold'}),
+            dcc.Dropdown(
+                id='range-filter',
+                options=[{'label': f"Last {m} min" if m < 60 else f"Last {m // 60} h", 'value': m}
+                         for m in TIME_RANGES if m <= WINDOW_MINUTES] or
+                        [{'label': f"Last {WINDOW_MINUTES} min", 'value': WINDOW_MINUTES}],
+                value=min(DEFAULT_TIME_RANGE, WINDOW_MINUTES),
+                clearable=False
+            )
+        ], style={'flex': '0.6'}),
     ], style={'display': 'flex', 'width': '95%', 'margin': 'auto', 'marginBottom': '20px', 'backgroundColor': '#f9f9f9', 'padding': '15px', 'borderRadius': '5px'}),
 
     # --- KPI Cards Row 1 (Overall Metrics - RE-ADDED TOTAL ITEMS) ---
@@ -143,23 +166,64 @@ app.layout = html.Div([
         html.Div([dcc.Graph(id='defect-pie')], style={'width': '49%', 'display': 'inline-block', 'float':'right', 'verticalAlign': 'top'})
     ], style={'width': '95%', 'margin': 'auto', 'marginBottom': '20px'}),
 
-    dcc.Interval(id='interval-component', interval=15*1000, n_intervals=0)
+    dcc.Store(id='viewport-width'),
+    dcc.Store(id='data-version'),       # set by the /events stream whenever new rows arrive
+    dcc.Store(id='live-connection'),
+    dcc.Store(id='sent-digests', data={})
 ])
 
+# Subscribe to /events once the page loads; every version it pushes updates the
+# data-version store, which triggers the callbacks below. EventSource reconnects
+# on its own if the connection drops.
+app.clientside_callback(
+    """
+    function(id) {
+        if (!window.shopfloorEvents) {
+            window.shopfloorEvents = new EventSource('/events');
+            window.shopfloorEvents.onmessage = function(e) {
+                dash_clientside.set_props('data-version', {data: e.data});
+            };
+        }
+        return true;
+    }
+    """,
+    Output('live-connection', 'data'),
+    Input('live-connection', 'id')
+)
+
+# Browser width, so the trend charts can be downsampled to their pixel width
+app.clientside_callback(
+    "function(version) { return window.innerWidth; }",
+    Output('viewport-width', 'data'),
+    Input('data-version', 'data')
+)
+
+def only_changed(outputs, digests, sent):
+    """
+    The outputs with those identical to what this page last received replaced by
+    no_update, and the digests to remember for next time.
+    """
+    sent = sent or {}
+    changed = [dash.no_update if sent.get(str(i)) == digest else output
+               for i, (output, digest) in enumerate(zip(outputs, digests))]
+    return changed, {str(i): digest for i, digest in enumerate(digests)}
+
 # -----------------------------
 # Callbacks for Filters (UNCHANGED)
 # -----------------------------
 @app.callback(
     [Output('line-filter', 'options'), Output('stage-filter', 'options'), Output('wo-filter', 'options')],
-    [Input('interval-component', 'n_intervals')]
+    [Input('data-version', 'data')]
 )
-def update_filter_options(n):
-    df = get_data()
-    if df.empty: return [], [], []
+def update_filter_options(version):
+    return results.get(get_version(), ('filter-options',), build_filter_options)
+
+def build_filter_options():
+    line_options, stage_options, wo_options = kpi_engine.options()
     return (
-        [{'label': i, 'value': i} for i in sorted(df['line_number'].dropna().unique())],
-        [{'label': i, 'value': i} for i in sorted(df['routing_stage'].dropna().unique())],
-        [{'label': i, 'value': i} for i in sorted(df['workorder_id'].dropna().unique())]
+        [{'label': i, 'value': i} for i in line_options],
+        [{'label': i, 'value': i} for i in stage_options],
+        [{'label': i, 'value': i} for i in wo_options]
     )
 
 # -----------------------------
@@ -172,13 +236,31 @@ def update_filter_options(n):
      Output('reject-by-stage', 'figure'),
      Output('defect-pie', 'figure'),
      Output('temp-trend', 'figure'),
-     Output('pressure-trend', 'figure')],
-    [Input('interval-component', 'n_intervals'),
+     Output('pressure-trend', 'figure'),
+     Output('sent-digests', 'data')],
+    [Input('data-version', 'data'),
      Input('line-filter', 'value'),
      Input('stage-filter', 'value'),
-     Input('wo-filter', 'value')]
+     Input('wo-filter', 'value'),
+     Input('range-filter', 'value'),
+     Input('viewport-width', 'data')],
+    [State('sent-digests', 'data')]
 )
-def update_dashboard(n, lines, stages, wos):
+def update_dashboard(version, lines, stages, wos, range_minutes, viewport_width, sent_digests):
+    # Every page showing the same view at the same data version gets the same
+    # serialized outputs, built once.
+    viewport_width = max(VIEWPORT_WIDTH_STEP,
+                         (viewport_width or DEFAULT_VIEWPORT_WIDTH) // VIEWPORT_WIDTH_STEP * VIEWPORT_WIDTH_STEP)
+    view = (tuple(sorted(lines or ())), tuple(sorted(stages or ())), tuple(sorted(wos or ())),
+            range_minutes, viewport_width)
+    outputs, digests = results.get(get_version(), view,
+                                   lambda: serialize(build_dashboard(lines, stages, wos, range_minutes, viewport_width)))
+    # Only send the outputs that differ from what this page already shows; a
+    # new version often leaves the filter's cards or pie unchanged.
+    outputs, digests = only_changed(outputs, digests, sent_digests)
+    return (*outputs, digests)
+
+def build_dashboard(lines, stages, wos, range_minutes, viewport_width):
     df = get_data()
 
     # Adjusted width to 16% to accommodate 6 KPI cards in one row
@@ -188,33 +270,34 @@ def update_dashboard(n, lines, stages, wos):
         empty_kpi = [html.Div("Waiting for data stream...", style=kpi_style)]
         return empty_kpi, [], {}, {}, {}, {}, {}
 
-    # --- Filtering ---
-    df_filtered = df.copy()
-    if lines: df_filtered = df_filtered[df_filtered['line_number'].isin(lines)]
-    if stages: df_filtered = df_filtered[df_filtered['routing_stage'].isin(stages)]
-    if wos: df_filtered = df_filtered[df_filtered['workorder_id'].isin(wos)]
-
-    if df_filtered.empty:
+    # --- KPI Calculations (pre-aggregated, see kpi_engine.py) ---
+    since = df['ts'].iloc[-1] - pd.Timedelta(minutes=range_minutes or DEFAULT_TIME_RANGE)
+    kpis = kpi_engine.kpis(lines, stages, wos, since=since)
+    if kpis is None:
         empty_kpi = [html.Div("No data for selected filters", style=kpi_style)]
         return empty_kpi, [], {}, {}, {}, {}, {}
 
-    # --- KPI Calculations ---
-    # Current Yield/Defect Rate: Use the last reported value after filtering
-    latest_row = df_filtered.iloc[-1]
-    avg_yield = latest_row['yield_percent'] if not pd.isna(latest_row['yield_percent']) else 0
-    avg_defect_rate = latest_row['defect_rate'] if not pd.isna(latest_row['defect_rate']) else 0
+    # Current Yield/Defect Rate: the last reported value after filtering
+    avg_yield = kpis['yield_percent'] if not pd.isna(kpis['yield_percent']) else 0
+    avg_defect_rate = kpis['defect_rate'] if not pd.isna(kpis['defect_rate']) else 0
 
-    # Overall Metrics
-    total_items = df_filtered['item_id'].nunique() # Re-using this calculated variable
-    overall_avg_temp = df_filtered['temperature'].mean()
+    # Overall Metrics (distinct item counts are HyperLogLog estimates)
+    total_items = kpis['total_items']
+    overall_avg_temp = kpis['avg_temperature']
 
     # Temp > 110°C Alerts (Warning)
-    warning_alert_count = df_filtered[df_filtered['temperature'] > TEMP_WARNING_THRESHOLD]['item_id'].nunique()
+    warning_alert_count = kpis['warning_items']
 
     # Advanced Notification (Critical)
-    critical_lines = df_filtered[df_filtered['temperature'] > TEMP_CRITICAL_THRESHOLD]['line_number'].unique()
-    critical_lines_str = ', '.join(critical_lines) if critical_lines.size > 0 else 'None'
-    critical_lines_color = 'red' if critical_lines.size > 0 else 'green'
+    critical_lines = kpis['critical_lines']
+    critical_lines_str = ', '.join(critical_lines) if critical_lines else 'None'
+    critical_lines_color = 'red' if critical_lines else 'green'
+
+    # --- Filtering (raw rows, for the trend charts) ---
+    df_filtered = df.iloc[df['ts'].searchsorted(since):]
+    if lines: df_filtered = df_filtered[df_filtered['line_number'].isin(lines)]
+    if stages: df_filtered = df_filtered[df_filtered['routing_stage'].isin(stages)]
+    if wos: df_filtered = df_filtered[df_filtered['workorder_id'].isin(wos)]
 
 
     # --- KPI Cards Display (Now 6 cards) ---
@@ -231,7 +314,8 @@ def update_dashboard(n, lines, stages, wos):
     ]
 
     # --- KPI Cards per Line ---
-    avg_temp_by_line = df_filtered.groupby('line_number')['temperature'].mean().round(1).reset_index()
+    avg_temp_by_line = pd.DataFrame(list(kpis['avg_temperature_by_line'].items()),
+                                    columns=['line_number', 'temperature']).round(1)
     line_kpi_cards = []
     line_kpi_style = {'border': '1px solid #ddd', 'padding': '10px', 'width': '15%', 'textAlign': 'center', 'borderRadius': '5px', 'boxShadow': '1px 1px 3px rgba(0,0,0,0.05)', 'marginRight': '10px', 'marginBottom': '10px'}
 
@@ -253,16 +337,21 @@ def update_dashboard(n, lines, stages, wos):
     # --- Charts ---
 
     # 1. Yield Trend (Stabilized & Y-Axis fixed 0-100)
-    df_filtered_yield = df_filtered[df_filtered['total_count'] > 50]
+    # Downsampled per line to about one point per pixel: the full-width yield chart
+    # and the half-width temperature/pressure charts sit in a 95%-wide container.
+    chart_width = viewport_width * 0.95
+    full_buckets = min(MAX_POINTS_PER_LINE, int(chart_width)) // 2
+    half_buckets = min(MAX_POINTS_PER_LINE, int(chart_width * 0.49)) // 2
+
+    df_filtered_yield = min_max_downsample(df_filtered[df_filtered['total_count'] > 50],
+                                           'ts', 'yield_percent', 'line_number', full_buckets)
     yield_fig = px.line(df_filtered_yield, x='ts', y='yield_percent', color='line_number',
                         title="Real-Time Yield by Assembly Line (Stabilized Trend)",
                         labels={'ts': 'Time', 'yield_percent': 'Yield %', 'line_number': 'Line'})
     yield_fig.update_yaxes(range=[0, 100])
 
     # 2. Rejection by Stage (Fixed Order & Custom Pastel Colors)
-    stage_rejection_data = df_filtered[df_filtered['defect_reason'].notnull()]
-    stage_rejection_count = stage_rejection_data.groupby('routing_stage')['item_id'].nunique().reset_index()
-    stage_rejection_count.columns = ['Stage', 'Rejected_Items']
+    stage_rejection_count = pd.DataFrame(list(kpis['rejects_by_stage'].items()), columns=['Stage', 'Rejected_Items'])
 
     # Sort the data frame by the fixed order before plotting
     stage_rejection_count['Stage'] = pd.Categorical(
@@ -284,10 +373,8 @@ def update_dashboard(n, lines, stages, wos):
     )
 
     # 3. Defect Reason Pie Chart
-    defect_data = df_filtered[df_filtered['defect_reason'].notnull()]
-    if not defect_data.empty:
-        reason_count = defect_data.groupby('defect_reason')['item_id'].nunique().reset_index()
-        reason_count.columns = ['Reason', 'Count']
+    if kpis['rejects_by_reason']:
+        reason_count = pd.DataFrame(list(kpis['rejects_by_reason'].items()), columns=['Reason', 'Count'])
         defect_pie_fig = px.pie(reason_count, values='Count', names='Reason',
                                 title="Defect Root Cause Distribution",
                                 hole=.3)
@@ -295,14 +382,16 @@ def update_dashboard(n, lines, stages, wos):
         defect_pie_fig = px.pie(title="No Defects Reported")
 
     # 4. Temperature Trend (Line Chart)
-    temp_fig = px.line(df_filtered, x='ts', y='temperature', color='line_number',
+    temp_fig = px.line(min_max_downsample(df_filtered, 'ts', 'temperature', 'line_number', half_buckets),
+                       x='ts', y='temperature', color='line_number',
                        title="Temperature Telemetry (Line Trend)",
                        labels={'ts': 'Time', 'temperature': 'Temperature (°C)'})
     temp_fig.add_hline(y=TEMP_WARNING_THRESHOLD, line_dash="dash", annotation_text=f"Warning ({TEMP_WARNING_THRESHOLD}°C)", annotation_position="top left", line_color="orange")
     temp_fig.add_hline(y=TEMP_CRITICAL_THRESHOLD, line_dash="dot", annotation_text=f"Critical ({TEMP_CRITICAL_THRESHOLD}°C)", annotation_position="top left", line_color="red")
 
     # 5. Pressure Trend (Line Chart)
-    pressure_fig = px.line(df_filtered, x='ts', y='pressure', color='line_number',
+    pressure_fig = px.line(min_max_downsample(df_filtered, 'ts', 'pressure', 'line_number', half_buckets),
+                           x='ts', y='pressure', color='line_number',
                            title="Pressure Telemetry (Line Trend)",
                            labels={'ts': 'Time', 'pressure': 'Pressure (psi)'})
     pressure_fig.add_hline(y=160, line_dash="dot", annotation_text="Max Pressure", line_color="red")
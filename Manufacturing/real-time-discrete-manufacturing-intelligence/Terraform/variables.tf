@@ -130,3 +130,26 @@ variable "flink_max_cfu"   {
   type = number
   default = 5
 }
+
+variable "sensor_events_sink" {
+  description = "Where the data generator writes sensor events: \"postgres\" (captured by the CDC connector) or \"kafka\" (produced straight to sensor_events_topic)"
+  type        = string
+  default     = "postgres"
+
+  validation {
+    condition     = contains(["postgres", "kafka"], var.sensor_events_sink)
+    error_message = "sensor_events_sink must be \"postgres\" or \"kafka\"."
+  }
+}
+
+variable "sensor_events_topic" {
+  description = "Topic the data generator produces sensor events to when sensor_events_sink = \"kafka\""
+  type        = string
+  default     = "sensor_events"
+}
+
+variable "equipment_health_alerts_topic" {
+  description = "Topic the data generator produces equipment-health alerts to when sensor_events_sink = \"kafka\" (with \"postgres\" they go to the equipment_health_alerts table)"
+  type        = string
+  default     = "equipment_health_alerts"
+}
@@ -20,22 +20,44 @@ stations against the CSV's own (reliable) distance-from-line-start column --
 see validate() below, which re-runs that same check on the final output so
 future CSV updates get flagged automatically instead of requiring another
 manual eyeball pass.
+
+Besides stations.json, every build also writes stations_coords.npy: the same
+coordinates as a flat NumPy structured array (name, lat, lng) in sorted-name
+order, which server.py memory-maps instead of re-deriving arrays from the
+JSON dict. It and stations.build-hash are build outputs, not checked in: the
+Docker image builds them, and server.py builds them on first start if they're
+missing. Both outputs are skipped entirely when nothing that feeds them
+(including this script) has changed -- see build_hash() -- so re-running this
+after every metro_network.py edit is free unless the station lists actually
+moved; pass --force to rebuild regardless. Interpolation and validate()'s haversine checks run as NumPy array
+operations over whole lines at once, so the same build scales to much larger
+synthetic networks than the 9 real lines.
 """
+import argparse
 import csv
+import hashlib
 import json
-import math
 import os
 import re
 import sys
 
+import numpy as np
+
 HERE = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(HERE, ".."))
 from metro_network import METRO_LINES, LINE_DISTANCES_KM  # noqa: E402
 
-# Same cleanup applied when the station lists in metro_network.py were built.
-_CONN_BRACKET_RE = re.compile(r'\[Conn:[^\]]*\]')
-_CONN_BARE_RE = re.compile(r'Conn:\w+')
-_FIRST_LAST_RE = re.compile(r'\((First|Last)[^)]*\)', re.I)
+CSV_PATH = os.path.join(HERE, "vendor", "dmrc_network.csv")
+STATIONS_JSON_PATH = os.path.join(HERE, "stations.json")
+COORDS_INDEX_PATH = os.path.join(HERE, "stations_coords.npy")
+BUILD_HASH_PATH = os.path.join(HERE, "stations.build-hash")
+
+# Same cleanup applied when the station lists in metro_network.py were built:
+# "[Conn: X]" and bare "Conn:X" interchange annotations, and "(First/Last
+# Station)" terminus annotations -- one alternation, so each raw name is
+# scanned once instead of once per pattern.
+_ANNOTATION_RE = re.compile(r'\[Conn:[^\]]*\]|Conn:\w+|(?i:\((First|Last)[^)]*\))')
+_WHITESPACE_RE = re.compile(r'\s+')
 
 RENAME = {
     'Shyam park': 'Shyam Park',
@@ -94,21 +116,27 @@ DISCARD_BAD_CSV_COORDS = {
 
 
 def clean_name(name):
-    name = _CONN_BRACKET_RE.sub('', name)
-    name = _CONN_BARE_RE.sub('', name)
-    name = _FIRST_LAST_RE.sub('', name)
-    name = re.sub(r'\s+', ' ', name).strip()
+    name = _ANNOTATION_RE.sub('', name)
+    name = _WHITESPACE_RE.sub(' ', name).strip()
     return RENAME.get(name, name)
 
 
+def clean_names(names):
+    """clean_name() over a whole column, running the regexes once per distinct raw name."""
+    cleaned = {raw: clean_name(raw) for raw in set(names)}
+    return [cleaned[raw] for raw in names]
+
+
 def load_coords_by_name():
-    with open(os.path.join(HERE, "vendor", "dmrc_network.csv")) as f:
-        rows = list(csv.DictReader(f))
-    by_name = {}
-    for row in rows:
-        name = clean_name(row["Station Name"])
-        by_name[name] = (float(row["Latitude"]), float(row["Longitude"]))
-    return by_name
+    with open(CSV_PATH, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        name_col = header.index("Station Name")
+        lat_col = header.index("Latitude")
+        lng_col = header.index("Longitude")
+        rows = [(row[name_col], row[lat_col], row[lng_col]) for row in reader]
+    names = clean_names([name for name, _lat, _lng in rows])
+    return {name: (float(lat), float(lng)) for name, (_raw, lat, lng) in zip(names, rows)}
 
 
 def resolve(name, coords_by_name):
@@ -125,37 +153,29 @@ def resolve(name, coords_by_name):
 
 def build_line_coords(stations, coords_by_name):
     resolved = [resolve(s, coords_by_name) for s in stations]
+    known = [i for i, r in enumerate(resolved) if r is not None]
     missing = [i for i, r in enumerate(resolved) if r is None]
-    if missing:
-        # Interpolate each run of missing stations between its resolved neighbors.
-        i = 0
-        while i < len(resolved):
-            if resolved[i] is None:
-                start = i - 1
-                end = i
-                while resolved[end] is None:
-                    end += 1
-                lat0, lng0 = resolved[start]
-                lat1, lng1 = resolved[end]
-                span = end - start
-                for k in range(start + 1, end):
-                    frac = (k - start) / span
-                    resolved[k] = (lat0 + (lat1 - lat0) * frac, lng0 + (lng1 - lng0) * frac)
-                i = end
-            else:
-                i += 1
+    if missing and known:
+        # Interpolate each run of missing stations between its resolved
+        # neighbors -- np.interp over station position does every run on the
+        # line in one pass.
+        known_lat = [resolved[i][0] for i in known]
+        known_lng = [resolved[i][1] for i in known]
+        lats = np.interp(missing, known, known_lat)
+        lngs = np.interp(missing, known, known_lng)
+        for i, lat, lng in zip(missing, lats, lngs):
+            resolved[i] = (float(lat), float(lng))
     return resolved
 
 
-def haversine_km(a, b):
-    lat1, lng1 = a
-    lat2, lng2 = b
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; works elementwise on NumPy arrays."""
     r = 6371.0
-    p1, p2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlmb = math.radians(lng2 - lng1)
-    x = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlmb / 2) ** 2
-    return 2 * r * math.asin(math.sqrt(x))
+    p1, p2 = np.radians(lat1), np.radians(lat2)
+    dphi = p2 - p1
+    dlmb = np.radians(np.asarray(lng2) - np.asarray(lng1))
+    x = np.sin(dphi / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dlmb / 2) ** 2
+    return 2 * r * np.arcsin(np.sqrt(x))
 
 
 def validate(stations):
@@ -170,22 +190,71 @@ def validate(stations):
     """
     problems = []
     for line, names in METRO_LINES.items():
-        dist_km = LINE_DISTANCES_KM[line]
-        for i in range(len(names) - 1):
-            a, b = names[i], names[i + 1]
-            if a not in stations or b not in stations:
-                continue
-            expected = dist_km[i + 1] - dist_km[i]
-            actual = haversine_km(
-                (stations[a]["lat"], stations[a]["lng"]),
-                (stations[b]["lat"], stations[b]["lng"]),
+        # Only gaps where both ends made it into the output are checked.
+        pairs = [
+            i for i in range(len(names) - 1)
+            if names[i] in stations and names[i + 1] in stations
+        ]
+        if not pairs:
+            continue
+        lat = np.array([stations[n]["lat"] for n in names if n in stations])
+        lng = np.array([stations[n]["lng"] for n in names if n in stations])
+        pos = {n: k for k, n in enumerate(n for n in names if n in stations)}
+        a = np.array([pos[names[i]] for i in pairs])
+        b = np.array([pos[names[i + 1]] for i in pairs])
+        dist_km = np.asarray(LINE_DISTANCES_KM[line])
+        expected = dist_km[np.array(pairs) + 1] - dist_km[np.array(pairs)]
+        actual = haversine_km(lat[a], lng[a], lat[b], lng[b])
+        for k in np.flatnonzero(actual > np.maximum(3.0, expected * 2.5)):
+            i = pairs[k]
+            problems.append(
+                (line, names[i], names[i + 1], round(float(expected[k]), 1), round(float(actual[k]), 1))
             )
-            if actual > max(3.0, expected * 2.5):
-                problems.append((line, a, b, round(expected, 1), round(actual, 1)))
     return problems
 
 
-def main():
+def build_hash():
+    """
+    Fingerprint of everything the outputs depend on: the CSV bytes, the
+    network's station lists and distances, this file's own override tables
+    (a RENAME/MANUAL_COORDS edit changes the output just as much), and this
+    file's source, so a change to the build logic itself forces a rebuild.
+    """
+    h = hashlib.sha256()
+    for path in (CSV_PATH, os.path.abspath(__file__)):
+        with open(path, "rb") as f:
+            h.update(f.read())
+    h.update(json.dumps(
+        [METRO_LINES, LINE_DISTANCES_KM, RENAME, MANUAL_COORDS, sorted(DISCARD_BAD_CSV_COORDS)],
+        sort_keys=True,
+    ).encode())
+    return h.hexdigest()
+
+
+def is_up_to_date(digest):
+    if not all(os.path.exists(p) for p in (STATIONS_JSON_PATH, COORDS_INDEX_PATH, BUILD_HASH_PATH)):
+        return False
+    with open(BUILD_HASH_PATH) as f:
+        return f.read().strip() == digest
+
+
+def write_coords_index(stations):
+    """stations_coords.npy: (name, lat, lng) records in sorted-name order, for np.load(mmap_mode="r")."""
+    names = sorted(stations)
+    width = max((len(n) for n in names), default=1)
+    index = np.zeros(len(names), dtype=[("name", f"U{width}"), ("lat", "<f8"), ("lng", "<f8")])
+    index["name"] = names
+    index["lat"] = [stations[n]["lat"] for n in names]
+    index["lng"] = [stations[n]["lng"] for n in names]
+    np.save(COORDS_INDEX_PATH, index)
+
+
+def main(force=False):
+    digest = build_hash()
+    if not force and is_up_to_date(digest):
+        print(f"{STATIONS_JSON_PATH} is up to date (build hash {digest[:12]}); pass --force to rebuild.")
+        return
+
     coords_by_name = load_coords_by_name()
     stations = {}
     all_missing = []
@@ -201,9 +270,10 @@ def main():
             if line_name not in entry["lines"]:
                 entry["lines"].append(line_name)
 
-    out_path = os.path.join(HERE, "stations.json")
+    out_path = STATIONS_JSON_PATH
     with open(out_path, "w") as f:
         json.dump(stations, f, indent=2, sort_keys=True)
+    write_coords_index(stations)
 
     all_names = {name for stations_ in METRO_LINES.values() for name in stations_}
     print(f"Wrote {out_path}: {len(stations)} unique stations ({len(all_names)} expected across all lines).")
@@ -220,6 +290,12 @@ def main():
     else:
         print("No suspicious gaps -- every consecutive-station distance is consistent with the real track distance.")
 
+    # Written last, so an interrupted build never looks up to date.
+    with open(BUILD_HASH_PATH, "w") as f:
+        f.write(digest + "\n")
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="rebuild even if the inputs are unchanged")
+    main(force=parser.parse_args().force)
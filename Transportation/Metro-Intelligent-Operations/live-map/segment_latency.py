@@ -0,0 +1,136 @@
+"""
+Learns real per-segment travel times from the departure stream, instead of
+relying only on metro_network.py's scheduled SEGMENT_TIMES. Two consecutive
+departures of the same train_id on the same line and direction, where the
+second leaves from the station the first was heading to, bracket exactly one
+segment; the gap between their event timestamps is that segment's observed
+departure-to-departure time (travel plus dwell, including any hold-ups from
+the producer's disruption simulation).
+
+Every (line, direction, segment) gets a fixed row in preallocated arrays, so
+an observation is a dict lookup plus arithmetic on one row -- O(1) per event,
+no matter how long the server has been running:
+
+- a histogram over NUM_BINS log-spaced bins (MIN_SECONDS..MAX_SECONDS), for
+  p50/p95 without keeping individual samples;
+- its total weight, and a weighted sum for the mean.
+
+Both decay exponentially with HALF_LIFE_SECONDS of event time, applied
+lazily to a row only when that row is next touched, so old conditions fade
+out (a cleared signal fault stops dominating the estimate) without a
+periodic sweep over every segment.
+
+Not thread-safe on its own: server.py only calls it while holding its
+state_lock.
+"""
+import math
+
+import numpy as np
+
+from metro_network import METRO_LINES, SEGMENT_TIMES, build_route
+
+NUM_BINS = 48
+MIN_SECONDS = 10.0
+MAX_SECONDS = 3600.0
+HALF_LIFE_SECONDS = 30 * 60
+# Below this much (decayed) evidence, expected_seconds() keeps returning the
+# scheduled time rather than trusting one or two observations.
+MIN_WEIGHT_FOR_PREDICTION = 3.0
+
+
+class SegmentLatencyTracker:
+    def __init__(self, half_life_seconds=HALF_LIFE_SECONDS):
+        self.segments = []  # (metro_line, direction, current_station, next_station)
+        self._index = {}
+        scheduled = []
+        for line, stations in METRO_LINES.items():
+            for direction in ("UP", "DOWN"):
+                for leg in build_route(stations, SEGMENT_TIMES[line], direction):
+                    key = (line, direction, leg["station"], leg["next_station"])
+                    self._index[key] = len(self.segments)
+                    self.segments.append(key)
+                    scheduled.append(leg["travel_seconds"])
+
+        n = len(self.segments)
+        self.scheduled = np.array(scheduled, dtype=float)
+        self.hist = np.zeros((n, NUM_BINS))
+        self.weight = np.zeros(n)
+        self.weighted_sum = np.zeros(n)
+        self.last_update = np.zeros(n)
+        # Cached per-row median, refreshed on each observation, so snapshot
+        # building can ask for every active train's expected hop for free.
+        self.p50 = self.scheduled.copy()
+
+        self._decay_rate = math.log(2) / half_life_seconds
+        self._log_min = math.log(MIN_SECONDS)
+        self._log_step = (math.log(MAX_SECONDS) - self._log_min) / NUM_BINS
+        self._last_departure = {}  # train_id -> (segment index, departed_at)
+
+    def observe_departure(self, train_id, line, direction, station, next_station, departed_at):
+        """
+        Records a departure (departed_at in epoch seconds). If it directly
+        follows this train's previous departure, the segment in between gets
+        one observation.
+        """
+        prev = self._last_departure.get(train_id)
+        seg = self._index.get((line, direction, station, next_station))
+        self._last_departure[train_id] = (seg, departed_at)
+        if prev is None or prev[0] is None:
+            return
+        prev_seg, prev_departed_at = prev
+        p_line, p_direction, _p_station, p_next = self.segments[prev_seg]
+        # A reversal at a terminus, or a missed departure, doesn't bracket a
+        # single known segment.
+        if (p_line, p_direction, p_next) != (line, direction, station):
+            return
+        elapsed = departed_at - prev_departed_at
+        if elapsed <= 0:
+            return
+        self._add(prev_seg, elapsed, departed_at)
+
+    def _add(self, i, seconds, now):
+        factor = math.exp(-self._decay_rate * max(0.0, now - self.last_update[i]))
+        self.hist[i] *= factor
+        self.weight[i] = self.weight[i] * factor + 1.0
+        self.weighted_sum[i] = self.weighted_sum[i] * factor + seconds
+        self.last_update[i] = now
+        b = int((math.log(min(max(seconds, MIN_SECONDS), MAX_SECONDS)) - self._log_min) / self._log_step)
+        self.hist[i, min(b, NUM_BINS - 1)] += 1.0
+        self.p50[i] = self._percentile(i, 0.5)
+
+    def _percentile(self, i, q):
+        # Decay scales a whole row uniformly, so it never changes a percentile.
+        cum = np.cumsum(self.hist[i])
+        target = q * cum[-1]
+        b = int(np.searchsorted(cum, target))
+        below = cum[b - 1] if b > 0 else 0.0
+        frac = (target - below) / self.hist[i, b] if self.hist[i, b] > 0 else 0.5
+        return math.exp(self._log_min + (b + frac) * self._log_step)
+
+    def expected_seconds(self, line, direction, station, next_station):
+        """Learned median hop time once there's enough evidence, else the scheduled time."""
+        i = self._index.get((line, direction, station, next_station))
+        if i is None:
+            return None
+        if self.weight[i] < MIN_WEIGHT_FOR_PREDICTION:
+            return float(self.scheduled[i])
+        return self.p50[i]
+
+    def summary(self, now):
+        """Every segment observed at least once, with its decayed sample weight and p50/p95."""
+        rows = []
+        for i in np.flatnonzero(self.weight > 0):
+            line, direction, station, next_station = self.segments[i]
+            decayed = self.weight[i] * math.exp(-self._decay_rate * max(0.0, now - self.last_update[i]))
+            rows.append({
+                "metro_line": line,
+                "direction": direction,
+                "current_station": station,
+                "next_station": next_station,
+                "scheduled_seconds": int(self.scheduled[i]),
+                "samples": round(decayed, 2),
+                "mean_seconds": round(self.weighted_sum[i] / self.weight[i], 1),
+                "p50_seconds": round(self.p50[i], 1),
+                "p95_seconds": round(self._percentile(i, 0.95), 1),
+            })
+        return rows
@@ -24,9 +24,11 @@ import sys
 import threading
 import time
 from collections import defaultdict
+from datetime import datetime
 
+import numpy as np
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from confluent_kafka import Consumer
 
@@ -37,10 +39,28 @@ load_dotenv(os.path.join(HERE, "..", ".env"))
 # clients) -- safe to import here without needing any producer credentials.
 sys.path.insert(0, os.path.join(HERE, ".."))
 from metro_network import METRO_LINES, LINE_COLORS, SEGMENT_TIMES  # noqa: E402
+from metro_routing import build_routing_table, plan_route  # noqa: E402
+from segment_latency import SegmentLatencyTracker  # noqa: E402
+from spatial_index import StationIndex  # noqa: E402
 
 with open(os.path.join(HERE, "stations.json")) as f:
     STATIONS = json.load(f)
 
+# The same coordinates as a flat (name, lat, lng) structured array, written by
+# build_stations.py alongside stations.json -- memory-mapped so array-based
+# geographic lookups don't have to rebuild arrays from the dict above. It's a
+# build output (not checked in), so build it here when running from a fresh
+# checkout without the Docker image.
+COORDS_PATH = os.path.join(HERE, "stations_coords.npy")
+if not os.path.exists(COORDS_PATH):
+    import build_stations  # noqa: E402
+    build_stations.main()
+STATION_COORDS = np.load(COORDS_PATH, mmap_mode="r")
+
+# 2-d tree over STATION_COORDS for nearest-station and bbox (viewport) queries,
+# so neither scans every station -- see spatial_index.py.
+STATION_INDEX = StationIndex(STATION_COORDS["name"], STATION_COORDS["lat"], STATION_COORDS["lng"])
+
 # Average real hop duration per line -- matches metro_network.py's own
 # calibration (LINE_TOTAL_RUN_SECONDS / segment count), used by the frontend
 # to animate a train's position between current_station and next_station.
@@ -49,6 +69,11 @@ LINE_AVG_HOP_SECONDS = {
     for line, times in SEGMENT_TIMES.items()
 }
 
+# All-pairs journey times over the interchange-aware network graph, built once
+# at import (tens of milliseconds) so /api/route is a matrix lookup plus a
+# short path walk -- see ../metro_routing.py.
+ROUTING_TABLE = build_routing_table()
+
 TOPIC = os.environ.get("TOPIC", "metro-camera-events")
 # A train is dropped from the live view if we haven't seen a new departure
 # event for it in this long (producer stopped, or the train reached a terminus
@@ -76,6 +101,9 @@ CONSUMER_CONFIG = {
 state_lock = threading.Lock()
 trains = {}  # train_id -> live state dict
 surges = {}  # (metro_line, direction, current_station) -> live state dict
+# Observed per-segment travel times, learned from consecutive departures of
+# the same train (see segment_latency.py); guarded by state_lock like the rest.
+segment_latency = SegmentLatencyTracker()
 
 
 def decode_json_schema_message(value_bytes):
@@ -92,7 +120,13 @@ def handle_event(payload):
     with state_lock:
         existing = trains.get(train_id)
         if existing is None or existing["timestamp"] != timestamp:
-            # First coach seen for this departure: reset the running sum.
+            # First coach seen for this departure: reset the running sum, and
+            # let this departure close out the train's previous segment.
+            segment_latency.observe_departure(
+                train_id, meta["metro_line"], meta["direction"],
+                loc["current_station"], loc["next_station"],
+                datetime.fromisoformat(timestamp).timestamp(),
+            )
             trains[train_id] = {
                 "train_id": train_id,
                 "metro_line": meta["metro_line"],
@@ -103,6 +137,13 @@ def handle_event(payload):
                 "headcount": telem["headcount"],
                 "coach_count": 1,
                 "received_at": time.time(),
+                # Learned median for this exact segment once there's enough
+                # evidence (scheduled time until then) -- what the frontend
+                # animates this hop against.
+                "hop_seconds": segment_latency.expected_seconds(
+                    meta["metro_line"], meta["direction"],
+                    loc["current_station"], loc["next_station"],
+                ),
             }
         else:
             existing["headcount"] += telem["headcount"]
@@ -196,6 +237,26 @@ def get_stations():
     return STATIONS
 
 
+@app.get("/api/stations/nearest")
+def get_nearest_stations(lat: float, lng: float, k: int = Query(5, ge=1, le=100)):
+    return [
+        {"name": name, **STATIONS[name], "distance_km": round(distance_km, 3)}
+        for name, distance_km in STATION_INDEX.nearest(lat, lng, k)
+    ]
+
+
+@app.get("/api/stations/within")
+def get_stations_within(bbox: str):
+    # Same "west,south,east,north" order as Leaflet's LatLngBounds.toBBoxString(),
+    # so the frontend can pass map.getBounds() straight through.
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    names = STATION_INDEX.within(min_lat, min_lng, max_lat, max_lng)
+    return {name: STATIONS[name] for name in sorted(names)}
+
+
 @app.get("/api/lines")
 def get_lines():
     return {
@@ -205,6 +266,20 @@ def get_lines():
     }
 
 
+@app.get("/api/route")
+def get_route(origin: str = Query(alias="from"), destination: str = Query(alias="to")):
+    for name in (origin, destination):
+        if name not in ROUTING_TABLE["station_index"]:
+            raise HTTPException(status_code=404, detail=f"Unknown station: {name}")
+    return plan_route(ROUTING_TABLE, origin, destination)
+
+
+@app.get("/api/segments/latency")
+def get_segment_latency():
+    with state_lock:
+        return {"segments": segment_latency.summary(time.time())}
+
+
 @app.websocket("/ws")
 async def ws_endpoint(websocket: WebSocket):
     await websocket.accept()
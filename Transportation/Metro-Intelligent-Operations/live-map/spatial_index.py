@@ -0,0 +1,119 @@
+"""
+Static 2-d tree over station coordinates, backing the live map's geographic
+queries: the k stations nearest a point, and every station inside a
+viewport bounding box. Built once at startup from build_stations.py's
+stations_coords.npy; both queries visit O(log n) tree nodes for typical
+inputs rather than scanning every station, so they stay fast on synthetic
+networks two orders of magnitude larger than the real 223-station one.
+
+Coordinates are projected to a local equirectangular plane (km east/north,
+using the network's mean latitude for the longitude scale) before building
+the tree. At city scale that projection is accurate to well under 1%, and
+because x depends only on longitude and y only on latitude, a lat/lng bbox
+maps to an exact axis-aligned rectangle in tree space. Distances returned to
+callers are always true great-circle (haversine) distances.
+
+The tree is implicit: the node for the index range [lo, hi) of self._order
+is the point at mid = (lo + hi) // 2, split on x at even depths and y at odd
+ones -- no node objects, just one permutation array and two coordinate lists.
+"""
+import heapq
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dphi = p2 - p1
+    dlmb = math.radians(lng2 - lng1)
+    x = math.sin(dphi / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(x))
+
+
+class StationIndex:
+    def __init__(self, names, lats, lngs):
+        self.names = [str(n) for n in names]
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        n = len(self.names)
+        self._x_scale = _KM_PER_DEGREE * math.cos(math.radians(float(self.lats.mean()))) if n else 0.0
+
+        xy = np.column_stack(self._project(self.lats, self.lngs)) if n else np.zeros((0, 2))
+        order = np.arange(n)
+        stack = [(0, n, 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 1:
+                continue
+            mid = (lo + hi) // 2
+            span = order[lo:hi]
+            order[lo:hi] = span[np.argpartition(xy[span, depth & 1], mid - lo)]
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+
+        self._order = order.tolist()
+        # Plain Python floats: the query loops below touch them one at a time,
+        # where NumPy scalar indexing would be several times slower.
+        self._x = xy[order, 0].tolist()
+        self._y = xy[order, 1].tolist()
+
+    def _project(self, lat, lng):
+        return np.asarray(lng) * self._x_scale, np.asarray(lat) * _KM_PER_DEGREE
+
+    def nearest(self, lat, lng, k=1):
+        """[(name, distance_km), ...] for the k closest stations, closest first."""
+        if not self.names or k <= 0:
+            return []
+        qx, qy = lng * self._x_scale, lat * _KM_PER_DEGREE
+        xs, ys = self._x, self._y
+        best = []  # max-heap of (-squared distance, tree position), size <= k
+        stack = [(0, len(xs), 0, 0.0)]
+        while stack:
+            lo, hi, depth, plane_d2 = stack.pop()
+            if lo >= hi or (len(best) == k and plane_d2 >= -best[0][0]):
+                continue
+            mid = (lo + hi) // 2
+            dx, dy = qx - xs[mid], qy - ys[mid]
+            d2 = dx * dx + dy * dy
+            if len(best) < k:
+                heapq.heappush(best, (-d2, mid))
+            elif d2 < -best[0][0]:
+                heapq.heapreplace(best, (-d2, mid))
+            diff = dx if depth & 1 == 0 else dy
+            near, far = ((mid + 1, hi), (lo, mid)) if diff > 0 else ((lo, mid), (mid + 1, hi))
+            # Far side first so the near side is popped (and tightens the
+            # bound) before the far side's plane distance is re-checked.
+            stack.append((far[0], far[1], depth + 1, diff * diff))
+            stack.append((near[0], near[1], depth + 1, 0.0))
+
+        results = []
+        for _neg_d2, pos in sorted(best, reverse=True):
+            i = self._order[pos]
+            results.append((self.names[i], haversine_km(lat, lng, self.lats[i], self.lngs[i])))
+        return results
+
+    def within(self, min_lat, min_lng, max_lat, max_lng):
+        """Names of every station inside the bbox (inclusive), in no particular order."""
+        x0, y0 = min_lng * self._x_scale, min_lat * _KM_PER_DEGREE
+        x1, y1 = max_lng * self._x_scale, max_lat * _KM_PER_DEGREE
+        xs, ys = self._x, self._y
+        found = []
+        stack = [(0, len(xs), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            x, y = xs[mid], ys[mid]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                found.append(self.names[self._order[mid]])
+            split, low, high = (x, x0, x1) if depth & 1 == 0 else (y, y0, y1)
+            if low <= split:
+                stack.append((lo, mid, depth + 1))
+            if split <= high:
+                stack.append((mid + 1, hi, depth + 1))
+        return found
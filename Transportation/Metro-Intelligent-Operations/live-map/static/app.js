@@ -262,7 +262,9 @@ function handleSnapshot(snapshot, opts) {
     if (!fromLL || !toLL) continue;
     seenTrainIds.add(t.train_id);
 
-    const hopSeconds = HOP_SECONDS[t.metro_line] || 130;
+    // Per-segment learned (or scheduled) hop time from server.py when it has
+    // one, falling back to the line-wide average.
+    const hopSeconds = t.hop_seconds || HOP_SECONDS[t.metro_line] || 130;
     const elapsedAtReceipt = Math.max(0, snapshot.server_time - t.received_at);
 
     let entry = trainMarkers[t.train_id];
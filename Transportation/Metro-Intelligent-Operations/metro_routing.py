@@ -0,0 +1,163 @@
+"""
+Journey planning on top of metro_network.py: an interchange-aware graph of
+the 9 lines and an all-pairs travel-time table derived from it. Lives in its
+own module rather than in metro_network.py because it needs NumPy, and
+metro_network.py is deliberately dependency-free (python-producer.py imports
+it and has no use for any of this).
+
+Graph nodes are (station, line) platforms rather than bare station names, so
+riding *through* an interchange costs nothing extra while changing lines
+there costs INTERCHANGE_PENALTY_SECONDS -- with bare stations as nodes,
+Rajiv Chowk would look like a free hop between the Yellow and Blue Lines.
+Track edges reuse SEGMENT_TIMES (the same real-distance calibration the
+producer moves trains with), in both directions.
+
+The all-pairs table is built once with a vectorized Floyd-Warshall (one
+n x n NumPy relaxation per intermediate platform -- ~240 platforms, so some
+tens of milliseconds) and then collapsed to a station x station float32
+matrix, so travel-time lookups are a single array index afterwards.
+"""
+import numpy as np
+
+from metro_network import METRO_LINES, SEGMENT_TIMES
+
+# Walking between platforms plus the average wait for the connecting line's
+# next train -- a flat figure, not modeled per station.
+INTERCHANGE_PENALTY_SECONDS = 5 * 60
+
+
+def build_platform_graph(interchange_penalty=INTERCHANGE_PENALTY_SECONDS):
+    """
+    Adjacency list {(station, line): [((station, line), seconds), ...]}: one
+    edge each way per real segment, plus an interchange edge between every
+    pair of platforms that share a station name.
+    """
+    graph = {}
+    for line, stations in METRO_LINES.items():
+        for station in stations:
+            graph.setdefault((station, line), [])
+        for i, seconds in enumerate(SEGMENT_TIMES[line]):
+            a, b = (stations[i], line), (stations[i + 1], line)
+            graph[a].append((b, seconds))
+            graph[b].append((a, seconds))
+
+    lines_at = {}
+    for station, line in graph:
+        lines_at.setdefault(station, []).append(line)
+    for station, lines in lines_at.items():
+        for a in lines:
+            for b in lines:
+                if a != b:
+                    graph[(station, a)].append(((station, b), interchange_penalty))
+    return graph
+
+
+def build_routing_table(interchange_penalty=INTERCHANGE_PENALTY_SECONDS):
+    """
+    All-pairs shortest travel times over build_platform_graph(). Returns a
+    plain dict so callers can keep it as a module-level constant:
+      stations / station_index  -- station names and their matrix row/column
+      travel_seconds            -- station x station float32 matrix
+      platforms / platforms_of  -- (station, line) nodes, per-station node indices
+      platform_seconds          -- platform x platform float32 matrix
+      next_hop                  -- first platform on the best path from i to j
+    """
+    graph = build_platform_graph(interchange_penalty)
+    platforms = sorted(graph)
+    platform_index = {p: i for i, p in enumerate(platforms)}
+    n = len(platforms)
+
+    dist = np.full((n, n), np.inf)
+    np.fill_diagonal(dist, 0.0)
+    next_hop = np.full((n, n), -1, dtype=np.int32)
+    for platform, edges in graph.items():
+        i = platform_index[platform]
+        next_hop[i, i] = i
+        for neighbor, seconds in edges:
+            j = platform_index[neighbor]
+            if seconds < dist[i, j]:
+                dist[i, j] = seconds
+                next_hop[i, j] = j
+
+    for k in range(n):
+        via = dist[:, k:k + 1] + dist[k:k + 1, :]
+        better = via < dist
+        dist = np.where(better, via, dist)
+        next_hop = np.where(better, next_hop[:, k:k + 1], next_hop)
+
+    stations = sorted({station for station, _line in platforms})
+    station_index = {name: i for i, name in enumerate(stations)}
+    platform_station = np.array([station_index[station] for station, _line in platforms])
+
+    # Collapse platforms to stations: best origin platform, then best
+    # destination platform.
+    by_origin = np.full((len(stations), n), np.inf)
+    np.minimum.at(by_origin, platform_station, dist)
+    travel_seconds = np.full((len(stations), len(stations)), np.inf)
+    np.minimum.at(travel_seconds.T, platform_station, by_origin.T)
+
+    platforms_of = {}
+    for i, (station, _line) in enumerate(platforms):
+        platforms_of.setdefault(station, []).append(i)
+
+    return {
+        "stations": stations,
+        "station_index": station_index,
+        "travel_seconds": travel_seconds.astype(np.float32),
+        "platforms": platforms,
+        "platforms_of": platforms_of,
+        "platform_seconds": dist.astype(np.float32),
+        "next_hop": next_hop.astype(np.int16 if n < 2 ** 15 else np.int32),
+    }
+
+
+def travel_time(table, origin, destination):
+    """Shortest door-to-door travel time in seconds -- a single matrix lookup."""
+    index = table["station_index"]
+    return float(table["travel_seconds"][index[origin], index[destination]])
+
+
+def plan_route(table, origin, destination):
+    """
+    Best journey between two station names, as the legs a passenger would
+    actually ride: [{metro_line, from_station, to_station, stops,
+    travel_seconds}, ...], with an interchange between consecutive legs.
+    """
+    seconds = table["platform_seconds"]
+    next_hop = table["next_hop"]
+    platforms = table["platforms"]
+
+    origins = table["platforms_of"][origin]
+    destinations = table["platforms_of"][destination]
+    block = seconds[np.ix_(origins, destinations)]
+    best = np.unravel_index(np.argmin(block), block.shape)
+    src, dst = origins[best[0]], destinations[best[1]]
+
+    path = [src]
+    while path[-1] != dst:
+        path.append(int(next_hop[path[-1], dst]))
+
+    legs = []
+    for a, b in zip(path, path[1:]):
+        (station_a, line_a), (station_b, line_b) = platforms[a], platforms[b]
+        if line_a != line_b:
+            continue  # interchange -- the next track edge starts a new leg
+        if legs and legs[-1]["metro_line"] == line_a and legs[-1]["to_station"] == station_a:
+            leg = legs[-1]
+        else:
+            leg = {
+                "metro_line": line_a, "from_station": station_a, "to_station": station_a,
+                "stops": 0, "travel_seconds": 0,
+            }
+            legs.append(leg)
+        leg["to_station"] = station_b
+        leg["stops"] += 1
+        leg["travel_seconds"] += int(seconds[a, b])
+
+    return {
+        "from": origin,
+        "to": destination,
+        "travel_seconds": travel_time(table, origin, destination),
+        "interchanges": max(0, len(legs) - 1),
+        "legs": legs,
+    }
@@ -3,6 +3,7 @@ import random
 import sys
 import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta, timezone
 
 from dotenv import load_dotenv
@@ -70,6 +71,21 @@ SURGE_BOOST = float(os.environ.get('SURGE_BOOST', 4.0))
 # not several.
 SURGE_DURATION_SECONDS = int(os.environ.get('SURGE_DURATION_SECONDS', TRAIN_HEADWAY_SECONDS))
 
+# Service-disruption simulation. Off by default so the baseline demo keeps its
+# perfectly regular headway; when enabled, a background injector periodically
+# raises a signal fault that holds one real (line, direction, segment) closed,
+# and any departure can overrun its dwell time. Neither delay is applied to a
+# train directly -- both go through the segment occupancy model below (a train
+# can't enter a segment until the train ahead of it has cleared it), which is
+# what turns one late train into realistic bunching behind it and a gap ahead.
+# Unlike the surge window, hold/overrun durations ARE scaled by TIME_SCALE:
+# they're part of train movement, not something Flink's windows key off.
+ENABLE_DISRUPTION_INJECTION = os.environ.get('ENABLE_DISRUPTION_INJECTION', 'false').lower() == 'true'
+DISRUPTION_INTERVAL_SECONDS = int(os.environ.get('DISRUPTION_INTERVAL_SECONDS', 900))
+SIGNAL_FAULT_SECONDS = int(os.environ.get('SIGNAL_FAULT_SECONDS', 480))
+DWELL_OVERRUN_PROBABILITY = float(os.environ.get('DWELL_OVERRUN_PROBABILITY', 0.02))
+DWELL_OVERRUN_MAX_SECONDS = int(os.environ.get('DWELL_OVERRUN_MAX_SECONDS', 180))
+
 # JSON Schema for the payload, registered against Schema Registry so Flink SQL
 # ('value.format' = 'json-registry') can deserialize these records natively.
 # Single source of truth shared with terraform/schema.tf (which registers this
@@ -170,6 +186,102 @@ def surge_multiplier(line, direction, station):
         return SURGE_BOOST
 
 
+# Per-(line, direction) segment occupancy, indexed by leg number within that
+# direction's route: segment_clear_at[key][i] is when (time.monotonic()) the
+# last train to enter leg i reaches the far end of it, segment_held_until[key][i]
+# when an active signal fault on it lifts. Plain fixed-length lists rather than
+# per-train bookkeeping, so every departure is an O(1) check no matter how many
+# trains are currently delayed.
+#
+# platform_queue[key][i] is the order trains arrived at the platform leg i
+# starts from; only the train at its head may depart. A train keeps its place
+# through a dwell overrun, and trains held by a signal fault leave one by one in
+# arrival order once it lifts, so a follower can never overtake the train ahead
+# of it. Legs are exclusive, so arrival order at the next platform is departure
+# order from this one, and the order holds along the whole line.
+occupancy_lock = threading.Condition()
+segment_clear_at = {
+    (line, direction): [0.0] * (len(stations) - 1)
+    for line, stations in METRO_LINES.items()
+    for direction in ("UP", "DOWN")
+}
+segment_held_until = {key: list(legs) for key, legs in segment_clear_at.items()}
+platform_queue = {key: [deque() for _ in legs] for key, legs in segment_clear_at.items()}
+
+
+def join_platform_queue(train):
+    """Puts the train at the back of the departure order for its current platform."""
+    with occupancy_lock:
+        platform_queue[(train["metro_line"], train["direction"])][train["leg_idx"]].append(train["train_id"])
+
+
+def reserve_segment(train, travel_seconds):
+    """
+    Claims the train's next leg if it's first in line and the leg is clear, and
+    returns 0; otherwise returns how many real seconds until it's worth checking
+    again (None: wait for the train ahead to depart). Must hold occupancy_lock,
+    so two trains can never enter the same leg at once.
+    """
+    key = (train["metro_line"], train["direction"])
+    leg_idx = train["leg_idx"]
+    queue = platform_queue[key][leg_idx]
+    if queue[0] != train["train_id"]:
+        return None
+    now = time.monotonic()
+    blocked_until = max(segment_clear_at[key][leg_idx], segment_held_until[key][leg_idx])
+    if blocked_until > now:
+        return blocked_until - now
+    segment_clear_at[key][leg_idx] = now + travel_seconds * TIME_SCALE
+    queue.popleft()
+    occupancy_lock.notify_all()  # the next train in line may go once the leg clears
+    return 0.0
+
+
+def wait_for_clear_segment(train, travel_seconds, stop_event):
+    """Holds the train at its platform until it's first in line and its next leg is free. False if stopped meanwhile."""
+    arrived = time.monotonic()
+    with occupancy_lock:
+        while True:
+            wait = reserve_segment(train, travel_seconds)
+            if wait == 0:
+                break
+            if stop_event.is_set():
+                return False
+            # Woken early by a departure or a new fault; capped so a stop is noticed
+            occupancy_lock.wait(1.0 if wait is None else min(wait, 1.0))
+    held = time.monotonic() - arrived
+    if held > 0.5 * TIME_SCALE:
+        leg = train["route"][train["leg_idx"]]
+        print(
+            f"[disruption] {train['train_id']} ({train['metro_line']} {train['direction']}) "
+            f"held at {leg['station']} for {round(held / TIME_SCALE)}s: segment ahead occupied or train ahead still in platform"
+        )
+    return True
+
+
+def disruption_injector(stop_event):
+    """
+    Every DISRUPTION_INTERVAL_SECONDS of real wall-clock time (same cadence
+    model as surge_injector), raises a signal fault on one random real
+    segment, holding it closed for SIGNAL_FAULT_SECONDS of simulated time.
+    Trains reaching that segment queue behind it via reserve_segment().
+    """
+    while not stop_event.wait(DISRUPTION_INTERVAL_SECONDS):
+        line = random.choice(list(METRO_LINES))
+        direction = random.choice(("UP", "DOWN"))
+        route = build_route(METRO_LINES[line], SEGMENT_TIMES[line], direction)
+        leg_idx = random.randrange(len(route))
+        with occupancy_lock:
+            segment_held_until[(line, direction)][leg_idx] = (
+                time.monotonic() + SIGNAL_FAULT_SECONDS * TIME_SCALE
+            )
+        print(
+            f"[disruption-injector] {line} {direction}: signal fault between "
+            f"{route[leg_idx]['station']} and {route[leg_idx]['next_station']} "
+            f"for {SIGNAL_FAULT_SECONDS}s"
+        )
+
+
 def generate_departure_event(train):
     """
     Fires one payload per coach for this train, only at the moment doors lock
@@ -235,6 +347,19 @@ def train_worker(train, stop_event):
     segment_times = SEGMENT_TIMES[train["metro_line"]]
     while not stop_event.is_set():
         travel_seconds = train["route"][train["leg_idx"]]["travel_seconds"]
+        if ENABLE_DISRUPTION_INJECTION and random.random() < DWELL_OVERRUN_PROBABILITY:
+            # Dwell overrun (door obstruction, crowding, ...): the train leaves
+            # late, and whoever is behind it catches up and bunches. It keeps its
+            # place in the platform queue, so nothing behind it can leave first.
+            overrun = random.uniform(30, DWELL_OVERRUN_MAX_SECONDS)
+            print(
+                f"[disruption] {train['train_id']} dwell overrun of {round(overrun)}s "
+                f"at {train['route'][train['leg_idx']]['station']}"
+            )
+            if stop_event.wait(overrun * TIME_SCALE):
+                break
+        if not wait_for_clear_segment(train, travel_seconds, stop_event):
+            break
         generate_departure_event(train)
         if stop_event.wait(travel_seconds * TIME_SCALE):
             break
@@ -244,6 +369,7 @@ def train_worker(train, stop_event):
             train["direction"] = "DOWN" if train["direction"] == "UP" else "UP"
             train["route"] = build_route(stations, segment_times, train["direction"])
             train["leg_idx"] = 0
+        join_platform_queue(train)
 
 
 def build_fleet():
@@ -263,9 +389,10 @@ def build_fleet():
         for direction in ("UP", "DOWN"):
             route = build_route(stations, segment_times, direction)
             cum = cumulative_times([leg["travel_seconds"] for leg in route])
+            trains = []
             for i in range(num_trains):
                 offset = i * TRAIN_HEADWAY_SECONDS
-                fleet.append({
+                trains.append({
                     "train_id": f"DL-{code}-{counter:03d}",
                     "metro_line": line,
                     "direction": direction,
@@ -273,6 +400,11 @@ def build_fleet():
                     "leg_idx": leg_index_for_offset(cum, offset),
                 })
                 counter += 1
+            # Queue trains sharing a platform in running order: the one furthest
+            # along (largest offset) departs first.
+            for train in reversed(trains):
+                join_platform_queue(train)
+            fleet.extend(trains)
     return fleet
 
 
@@ -295,6 +427,12 @@ if __name__ == "__main__":
     if ENABLE_SURGE_INJECTION:
         print(f"Surge injector: every {SURGE_INTERVAL_SECONDS}s (real time), {SURGE_BOOST}x for {SURGE_DURATION_SECONDS}s")
         threads.append(threading.Thread(target=surge_injector, args=(stop_event,), daemon=True))
+    if ENABLE_DISRUPTION_INJECTION:
+        print(
+            f"Disruption injector: every {DISRUPTION_INTERVAL_SECONDS}s (real time), "
+            f"{SIGNAL_FAULT_SECONDS}s signal faults, {DWELL_OVERRUN_PROBABILITY:.0%} dwell overruns"
+        )
+        threads.append(threading.Thread(target=disruption_injector, args=(stop_event,), daemon=True))
 
     try:
         for t in threads: